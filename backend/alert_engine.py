@@ -0,0 +1,263 @@
+"""
+Streaming Alert Rule Engine - Evaluates windowed rules over scored transactions
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+def event_time(timestamp) -> float:
+    """Epoch seconds of a transaction timestamp (datetime, ISO string or epoch); now if missing or invalid"""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class SlidingWindow:
+    """
+    Time-bucketed sliding window with event count, value sum and distinct keys.
+
+    The window is a ring of ``buckets`` fixed-width time buckets, each
+    holding a count, a sum and a ``key_bits``-bit key bitmap, so memory
+    depends only on the window's bucket count, never on the event rate.
+    Buckets drop out whole: the window spans between window_seconds minus
+    one bucket width and window_seconds. Distinct keys are estimated by
+    linear counting over the OR of the live bitmaps. Events older than
+    the window (relative to the newest event seen) are ignored.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 30, key_bits: int = 1024):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self.key_bits = key_bits
+        self.latest = None           # newest bucket number seen
+        self._ids = [None] * buckets  # bucket number held by each ring slot
+        self._counts = [0] * buckets
+        self._sums = [0.0] * buckets
+        self._bits = [0] * buckets
+
+    def add(self, timestamp: float, value: float = 1.0, key=None):
+        bucket = int(timestamp // self.bucket_seconds)
+        size = len(self._ids)
+        if self.latest is not None and bucket <= self.latest - size:
+            return
+        slot = bucket % size
+        if self._ids[slot] != bucket:
+            self._ids[slot] = bucket
+            self._counts[slot] = 0
+            self._sums[slot] = 0.0
+            self._bits[slot] = 0
+        self._counts[slot] += 1
+        self._sums[slot] += value
+        if key is not None:
+            self._bits[slot] |= 1 << (self._key_hash(key) % self.key_bits)
+        if self.latest is None or bucket > self.latest:
+            self.latest = bucket
+
+    @staticmethod
+    def _key_hash(key) -> int:
+        """Stable across processes, unlike hash(), so distinct counts are reproducible"""
+        return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'little')
+
+    def _live(self):
+        oldest = self.latest - len(self._ids)
+        return [slot for slot, bucket in enumerate(self._ids) if bucket is not None and bucket > oldest]
+
+    def __len__(self):
+        return sum(self._counts[slot] for slot in self._live()) if self.latest is not None else 0
+
+    @property
+    def total(self) -> float:
+        return sum(self._sums[slot] for slot in self._live()) if self.latest is not None else 0.0
+
+    @property
+    def mean(self) -> float:
+        count = len(self)
+        return self.total / count if count else 0.0
+
+    @property
+    def distinct(self) -> int:
+        if self.latest is None:
+            return 0
+        bits = 0
+        for slot in self._live():
+            bits |= self._bits[slot]
+        empty = self.key_bits - bits.bit_count()
+        if empty == 0:
+            return self.key_bits  # Saturated; the estimate is a lower bound
+        return int(round(-self.key_bits * math.log(empty / self.key_bits)))
+
+
+class DeviceBlockBurstRule:
+    """Fires when one device accumulates too many high-risk decisions in a window"""
+
+    name = 'Device Block Burst'
+
+    # Per-device windows are many and sparse: ten buckets and a 64-bit account bitmap each
+    DEVICE_BUCKETS = 10
+    DEVICE_KEY_BITS = 64
+
+    def __init__(self, risk_threshold: float, min_blocks: int = 3,
+                 window_seconds: float = 300, max_devices: int = 100000):
+        self.risk_threshold = risk_threshold
+        self.min_blocks = min_blocks
+        self.window_seconds = window_seconds
+        self.max_devices = max_devices
+        self.windows = OrderedDict()  # device_id -> SlidingWindow (LRU bounded)
+        self.last_fired = {}
+
+    def evaluate(self, event: Dict, now: float) -> Optional[Dict]:
+        device_id = event.get('device_id')
+        if not device_id:
+            return None
+        if event['recommendation'] != 'BLOCK' and event['risk_score'] < self.risk_threshold:
+            return None
+
+        window = self.windows.get(device_id)
+        if window is None:
+            window = self.windows[device_id] = SlidingWindow(self.window_seconds, self.DEVICE_BUCKETS,
+                                                             self.DEVICE_KEY_BITS)
+            if len(self.windows) > self.max_devices:
+                evicted, _ = self.windows.popitem(last=False)
+                self.last_fired.pop(evicted, None)
+        else:
+            self.windows.move_to_end(device_id)
+        window.add(now, 1.0, event.get('user_id'))
+
+        # Fire once per window per device
+        if len(window) < self.min_blocks:
+            return None
+        if now - self.last_fired.get(device_id, float('-inf')) < self.window_seconds:
+            return None
+        self.last_fired[device_id] = now
+
+        return {
+            'severity': 'CRITICAL' if len(window) >= 2 * self.min_blocks else 'HIGH',
+            'type': self.name,
+            'message': (
+                f'{len(window)} high-risk decisions from device {device_id} '
+                f'in the last {int(self.window_seconds // 60)} minutes'
+            ),
+            'affected_accounts': window.distinct,
+            'device_id': device_id
+        }
+
+
+class CategoryRiskSpikeRule:
+    """Fires when a merchant category's windowed risk spikes above its own baseline"""
+
+    name = 'Merchant Category Risk Spike'
+
+    def __init__(self, risk_threshold: float, spike_margin: float = 0.2,
+                 window_seconds: float = 300, min_events: int = 5,
+                 baseline_alpha: float = 0.01, high_risk_threshold: float = 0.8):
+        self.risk_threshold = risk_threshold
+        self.spike_margin = spike_margin
+        self.window_seconds = window_seconds
+        self.min_events = min_events
+        self.baseline_alpha = baseline_alpha
+        self.high_risk_threshold = high_risk_threshold
+        self.windows = {}
+        self.baselines = {}  # category -> EWMA of risk score
+        self.last_fired = {}
+
+    def evaluate(self, event: Dict, now: float) -> Optional[Dict]:
+        category = event.get('merchant_category') or 'unknown'
+        risk = event['risk_score']
+
+        window = self.windows.get(category)
+        if window is None:
+            window = self.windows[category] = SlidingWindow(self.window_seconds)
+        window.add(now, risk, event.get('user_id'))
+
+        baseline = self.baselines.get(category, risk)
+        self.baselines[category] = baseline + self.baseline_alpha * (risk - baseline)
+
+        window_mean = window.mean
+        if len(window) < self.min_events or window_mean < self.risk_threshold:
+            return None
+        if window_mean - baseline < self.spike_margin:
+            return None
+        if now - self.last_fired.get(category, float('-inf')) < self.window_seconds:
+            return None
+        self.last_fired[category] = now
+
+        return {
+            'severity': 'CRITICAL' if window_mean >= self.high_risk_threshold else 'HIGH',
+            'type': self.name,
+            'message': (
+                f'Average risk for {category} rose to {window_mean:.2f} '
+                f'(baseline {baseline:.2f}) over {len(window)} transactions'
+            ),
+            'affected_accounts': window.distinct,
+            'merchant_category': category
+        }
+
+
+class AlertRuleEngine:
+    """
+    Runs every scored transaction through the windowed rules.
+
+    Rules are windowed by event time, so a historical batch is evaluated as
+    the events happened. A timestamp more than ``max_clock_skew`` seconds
+    ahead of the server clock is clamped to that bound: windows only move
+    forward, and one future-dated event would otherwise make every live
+    event look too old to count.
+    """
+
+    def __init__(self, rules: List, max_active: int = 100,
+                 on_alert: Optional[Callable[[Dict], None]] = None, max_clock_skew: float = 60):
+        self.rules = rules
+        self.max_clock_skew = max_clock_skew
+        self.active_alerts = deque(maxlen=max_active)
+        self.on_alert = on_alert
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def process(self, transaction: Dict, result: Dict) -> List[Dict]:
+        """Evaluate all rules for one scored transaction and return new alerts"""
+        event = {
+            'device_id': transaction.get('device_id'),
+            'user_id': transaction.get('user_id'),
+            'merchant_category': transaction.get('merchant_category'),
+            'risk_score': float(result.get('risk_score', 0.0)),
+            'recommendation': result.get('recommendation', 'APPROVE')
+        }
+        # Event time, so a bulk historical batch is windowed as the events happened
+        now = min(event_time(transaction.get('timestamp')), time.time() + self.max_clock_skew)
+
+        new_alerts = []
+        with self._lock:
+            for rule in self.rules:
+                alert = rule.evaluate(event, now)
+                if alert is None:
+                    continue
+                self._sequence += 1
+                alert = {
+                    'id': f'ALT-{self._sequence:06d}',
+                    'timestamp': datetime.fromtimestamp(now).isoformat(),
+                    **alert
+                }
+                self.active_alerts.append(alert)
+                new_alerts.append(alert)
+
+        if self.on_alert:
+            for alert in new_alerts:
+                self.on_alert(alert)
+        return new_alerts
+
+    def get_active_alerts(self) -> List[Dict]:
+        """Get active alerts, newest first"""
+        with self._lock:
+            return list(reversed(self.active_alerts))
@@ -0,0 +1,53 @@
+"""
+Batch Scoring - Chunk-level scoring shared by the API, bulk jobs and offline tools
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def recommend(risk_score: float) -> str:
+    """Map a risk score to the action recommendation"""
+    return 'BLOCK' if risk_score > 0.8 else 'REVIEW' if risk_score > 0.5 else 'APPROVE'
+
+
+def score_chunk(detector, processor, transactions: List[Dict], return_features: bool = False) -> Dict:
+    """
+    Score a chunk of transactions as one feature matrix
+
+    Returns columns: transaction_id, is_fraud, risk_score, recommendation
+    and model_probabilities (n_rows x n_models, in detector.models order),
+    plus the feature matrix as 'features' if return_features is set.
+    """
+    X = processor.extract_features_batch(transactions)
+    probabilities = detector.predict_proba_matrix(X)
+    risk_scores = detector.get_risk_scores(X, probabilities)
+
+    scores = {
+        'transaction_id': [t.get('transaction_id') for t in transactions],
+        'is_fraud': detector.predict_batch(X).astype(bool),
+        'risk_score': risk_scores,
+        'recommendation': [recommend(score) for score in risk_scores],
+        'model_probabilities': probabilities
+    }
+    if return_features:
+        scores['features'] = X
+    return scores
+
+
+def result_rows(scores: Dict, model_names: List[str], include_models: bool = False) -> List[Dict]:
+    """Convert columnar chunk scores into per-transaction result dicts"""
+    rows = []
+    for i, transaction_id in enumerate(scores['transaction_id']):
+        row = {
+            'transaction_id': transaction_id,
+            'is_fraud': bool(scores['is_fraud'][i]),
+            'risk_score': float(scores['risk_score'][i]),
+            'recommendation': scores['recommendation'][i]
+        }
+        if include_models:
+            row['model_probabilities'] = dict(
+                zip(model_names, np.asarray(scores['model_probabilities'][i]).tolist())
+            )
+        rows.append(row)
+    return rows
@@ -2,15 +2,43 @@
 Behavioral Biometrics Module - Analyzes user behavior patterns
 """
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 import hashlib
 
+from biometric_features import keystroke_features, pointer_features
+from biometric_profiles import BiometricProfileStore, PROFILE_FEATURES, profile_vector
+from device_registry import DeviceRegistry
+
+# Raw event arrays accepted alongside (or instead of) precomputed aggregates
+RAW_TYPING_FIELDS = ('key_down', 'key_up')
+RAW_POINTER_FIELDS = ('x', 'y', 't')
+
+# Share of the final score taken by deviation from the user's own baseline, once one exists
+PROFILE_WEIGHT = 0.35
+
+# Columnar batch input: '<section>_<field>' columns, e.g. typing_avg_time, mouse_speed
+SECTION_PREFIXES = {
+    'typing_data': 'typing',
+    'mouse_data': 'mouse',
+    'device_data': 'device',
+    'session_data': 'session'
+}
+BATCH_COLUMNS = {
+    'typing': ['avg_time', 'variance', 'rhythm_score', 'dwell_mean', 'flight_mean'],
+    'mouse': ['speed', 'curvature', 'pauses'],
+    'device': ['vpn_detected', 'tor_detected', 'emulator_detected'],
+    'session': ['duration', 'pages_visited', 'direct_to_payment', 'failed_logins']
+}
+
 class BiometricAnalyzer:
     """Analyzes behavioral biometrics for fraud detection"""
     
-    def __init__(self):
-        self.user_profiles = {}  # Store behavioral profiles
+    def __init__(self, user_profiles: Optional[BiometricProfileStore] = None,
+                 device_registry: Optional[DeviceRegistry] = None):
+        # Per-user baselines and server-side device history
+        self.user_profiles = user_profiles if user_profiles is not None else BiometricProfileStore()
+        self.device_registry = device_registry if device_registry is not None else DeviceRegistry()
         
     def analyze_behavioral_patterns(self, biometric_data: Dict) -> Dict:
         """
@@ -23,14 +51,26 @@ class BiometricAnalyzer:
         - Device fingerprinting
         - Navigation patterns
         - Session behavior
+        
+        Scoring leaves the user's baseline and known devices alone;
+        record_verified_session updates them once the session is verified
+        server-side
         """
         user_id = biometric_data.get('user_id', 'anonymous')
+        typing_data = self._resolve_typing_data(biometric_data.get('typing_data', {}))
+        mouse_data = self._resolve_mouse_data(biometric_data.get('mouse_data', {}))
+        session_data = biometric_data.get('session_data', {})
+        device_data = biometric_data.get('device_data', {})
+        fingerprint = self._generate_device_fingerprint(device_data)
+        device_check = self._check_device(user_id, fingerprint, device_data)
+        vector = profile_vector({'typing_data': typing_data, 'mouse_data': mouse_data, 'session_data': session_data})
+        profile = self.user_profiles.deviation(user_id, vector) if user_id != 'anonymous' else None
         
         # Calculate biometric risk score
-        typing_score = self._analyze_typing_pattern(biometric_data.get('typing_data', {}))
-        mouse_score = self._analyze_mouse_behavior(biometric_data.get('mouse_data', {}))
-        device_score = self._analyze_device_fingerprint(biometric_data.get('device_data', {}))
-        session_score = self._analyze_session_behavior(biometric_data.get('session_data', {}))
+        typing_score = self._analyze_typing_pattern(typing_data)
+        mouse_score = self._analyze_mouse_behavior(mouse_data)
+        device_score = self._analyze_device_fingerprint(device_data, device_check)
+        session_score = self._analyze_session_behavior(session_data)
         
         # Combined biometric score
         biometric_risk = (
@@ -40,38 +80,236 @@ class BiometricAnalyzer:
             session_score * 0.20
         )
         
+        # Blend in how far this session is from the user's own baseline
+        if profile is not None:
+            biometric_risk = (1 - PROFILE_WEIGHT) * biometric_risk + PROFILE_WEIGHT * profile['score']
+        
         analysis = {
             'biometric_risk_score': biometric_risk,
             'risk_level': self._categorize_risk(biometric_risk),
             'typing_analysis': {
                 'score': typing_score,
-                'avg_keystroke_time': biometric_data.get('typing_data', {}).get('avg_time', 0),
+                'avg_keystroke_time': typing_data.get('avg_time', 0),
                 'pattern_match': 1 - typing_score,
-                'anomalies': self._detect_typing_anomalies(biometric_data.get('typing_data', {}))
+                'anomalies': self._detect_typing_anomalies(typing_data)
             },
             'mouse_analysis': {
                 'score': mouse_score,
-                'movement_speed': biometric_data.get('mouse_data', {}).get('speed', 0),
+                'movement_speed': mouse_data.get('speed', 0),
                 'pattern_match': 1 - mouse_score,
-                'anomalies': self._detect_mouse_anomalies(biometric_data.get('mouse_data', {}))
+                'anomalies': self._detect_mouse_anomalies(mouse_data)
             },
             'device_analysis': {
                 'score': device_score,
-                'fingerprint': self._generate_device_fingerprint(biometric_data.get('device_data', {})),
-                'is_known_device': device_score < 0.3,
-                'device_attributes': self._extract_device_attributes(biometric_data.get('device_data', {}))
+                'fingerprint': fingerprint,
+                'is_known_device': device_check['is_known_device'],
+                'distinct_users': device_check['distinct_users'],
+                'device_farm': device_check['device_farm'],
+                'device_attributes': self._extract_device_attributes(device_data)
             },
             'session_analysis': {
                 'score': session_score,
                 'pattern_match': 1 - session_score,
-                'anomalies': self._detect_session_anomalies(biometric_data.get('session_data', {}))
+                'anomalies': self._detect_session_anomalies(session_data)
             },
+            'profile_analysis': profile or {'score': None, 'sessions': self.user_profiles.sessions(user_id)},
             'confidence': self._calculate_confidence(typing_score, mouse_score, device_score, session_score),
             'recommendation': self._generate_recommendation(biometric_risk)
         }
+        if 'features' in typing_data:
+            analysis['typing_analysis']['features'] = typing_data['features']
+        if 'features' in mouse_data:
+            analysis['mouse_analysis']['features'] = mouse_data['features']
         
         return analysis
     
+    def record_verified_session(self, biometric_data: Dict) -> Optional[Dict]:
+        """Fold a session verified after the fact (e.g. a passed 2FA challenge) into the user's baseline"""
+        user_id = biometric_data.get('user_id')
+        if not user_id or user_id == 'anonymous':
+            raise ValueError('user_id is required to update a biometric profile')
+        
+        vector = profile_vector({
+            'typing_data': self._resolve_typing_data(biometric_data.get('typing_data', {})),
+            'mouse_data': self._resolve_mouse_data(biometric_data.get('mouse_data', {})),
+            'session_data': biometric_data.get('session_data', {})
+        })
+        self.user_profiles.update(user_id, vector)
+        
+        device_data = biometric_data.get('device_data', {})
+        if device_data:
+            fingerprint = self._generate_device_fingerprint(device_data)
+            self.device_registry.observe(user_id, fingerprint)
+            self.device_registry.remember(user_id, fingerprint)
+        return self.user_profiles.profile(user_id)
+    
+    def analyze_batch(self, columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        Score many sessions from columnar data with array operations
+        
+        ``columns`` holds equal-length arrays named '<section>_<field>' (see
+        BATCH_COLUMNS) plus 'user_id' and 'device_fingerprint'; missing values
+        are None/NaN. A section counts as present when any of its columns has
+        a value, or per an explicit 'has_<section>' column. Results equal
+        analyze_behavioral_patterns on the same sessions. Device counts are
+        taken after every row is observed, which matches sessions that were
+        already scored once; profiles are read but not updated.
+        """
+        n = len(next(iter(columns.values())))
+        
+        def column(section: str, field: str) -> np.ndarray:
+            values = columns.get(f'{section}_{field}')
+            if values is None:
+                return np.full(n, np.nan)
+            return np.asarray(values, dtype=np.float64)
+        
+        def present(section: str) -> np.ndarray:
+            if f'has_{section}' in columns:
+                return np.asarray(columns[f'has_{section}'], dtype=bool)
+            found = np.zeros(n, dtype=bool)
+            for field in BATCH_COLUMNS[section]:
+                found |= ~np.isnan(column(section, field))
+            if section == 'device' and 'device_fingerprint' in columns:
+                found |= np.array([bool(fp) for fp in columns['device_fingerprint']])
+            return found
+        
+        def flag(section: str, field: str) -> np.ndarray:
+            values = column(section, field)
+            return ~np.isnan(values) & (values != 0)
+        
+        def value(section: str, field: str, default: float) -> np.ndarray:
+            values = column(section, field)
+            return np.where(np.isnan(values), default, values)
+        
+        user_ids = [u if u else 'anonymous' for u in columns.get('user_id', ['anonymous'] * n)]
+        
+        # Typing (same rules as _analyze_typing_pattern)
+        avg_keystroke = value('typing', 'avg_time', 150)
+        rhythm = column('typing', 'rhythm_score')
+        typing_score = np.zeros(n)
+        typing_score += np.where(avg_keystroke < 50, 0.4, 0.0)
+        typing_score += np.where(avg_keystroke > 300, 0.3, 0.0)
+        typing_score += np.where(value('typing', 'variance', 20) > 50, 0.2, 0.0)
+        typing_score += np.where(~np.isnan(rhythm) & (rhythm < 0.5), 0.3, 0.0)
+        typing_score = np.where(present('typing'), np.minimum(typing_score, 1.0), 0.5)
+        
+        # Mouse
+        pauses = value('mouse', 'pauses', 5)
+        mouse_score = np.zeros(n)
+        mouse_score += np.where((value('mouse', 'curvature', 0.5) < 0.1) & (pauses < 2), 0.5, 0.0)
+        mouse_score += np.where(value('mouse', 'speed', 1000) > 3000, 0.3, 0.0)
+        mouse_score += np.where(pauses > 20, 0.2, 0.0)
+        mouse_score = np.where(present('mouse'), np.minimum(mouse_score, 1.0), 0.5)
+        
+        # Device, checked against the registry for rows that have device data
+        has_device = present('device')
+        default_fingerprint = self._generate_device_fingerprint({})
+        fingerprints = list(columns.get('device_fingerprint') or [None] * n)
+        fingerprints = [fp or default_fingerprint for fp in fingerprints]
+        is_known = np.zeros(n, dtype=bool)
+        distinct_users = np.zeros(n, dtype=np.int64)
+        device_farm = np.zeros(n, dtype=bool)
+        rows = np.flatnonzero(has_device)
+        if len(rows):
+            checked = self.device_registry.check_batch([user_ids[i] for i in rows], [fingerprints[i] for i in rows])
+            is_known[rows] = checked['is_known_device']
+            distinct_users[rows] = checked['distinct_users']
+            device_farm[rows] = checked['device_farm']
+        device_score = np.where(is_known, 0.1, 0.6)
+        device_score += np.where(device_farm, 0.5, 0.0)
+        device_score += np.where(flag('device', 'vpn_detected'), 0.2, 0.0)
+        device_score += np.where(flag('device', 'tor_detected'), 0.3, 0.0)
+        device_score += np.where(flag('device', 'emulator_detected'), 0.4, 0.0)
+        device_score = np.where(has_device, np.minimum(device_score, 1.0), 0.6)
+        
+        # Session
+        session_score = np.zeros(n)
+        session_score += np.where((value('session', 'duration', 0) < 10) & (value('session', 'pages_visited', 0) > 3),
+                                  0.5, 0.0)
+        session_score += np.where(flag('session', 'direct_to_payment'), 0.3, 0.0)
+        session_score += np.where(value('session', 'failed_logins', 0) > 2, 0.4, 0.0)
+        session_score = np.where(present('session'), np.minimum(session_score, 1.0), 0.5)
+        
+        biometric_risk = (
+            typing_score * 0.30 +
+            mouse_score * 0.25 +
+            device_score * 0.25 +
+            session_score * 0.20
+        )
+        
+        # Profile deviation for named users with a baseline
+        vectors = np.column_stack([
+            np.where(present(SECTION_PREFIXES[section]), column(SECTION_PREFIXES[section], field), np.nan)
+            for section, field in PROFILE_FEATURES
+        ]).astype(np.float32)
+        profile_score = np.full(n, np.nan)
+        named = np.array([u != 'anonymous' for u in user_ids], dtype=bool)
+        if named.any():
+            profile_score[named] = self.user_profiles.deviation_batch(
+                [u for u, ok in zip(user_ids, named) if ok], vectors[named]
+            )
+        has_profile = ~np.isnan(profile_score)
+        biometric_risk = np.where(
+            has_profile,
+            (1 - PROFILE_WEIGHT) * biometric_risk + PROFILE_WEIGHT * np.where(has_profile, profile_score, 0.0),
+            biometric_risk
+        )
+        
+        # Confidence, as in _calculate_confidence
+        variance = np.var(np.column_stack([typing_score, mouse_score, device_score, session_score]), axis=1)
+        confidence = 1.0 - np.minimum(variance * 2, 0.5)
+        
+        return {
+            'biometric_risk_score': biometric_risk,
+            'risk_level': np.select([biometric_risk < 0.3, biometric_risk < 0.6, biometric_risk < 0.8],
+                                    ['LOW', 'MEDIUM', 'HIGH'], 'CRITICAL'),
+            'typing_score': typing_score,
+            'mouse_score': mouse_score,
+            'device_score': device_score,
+            'session_score': session_score,
+            'profile_score': profile_score,
+            'is_known_device': is_known,
+            'distinct_users': distinct_users,
+            'device_farm': device_farm,
+            'confidence': confidence
+        }
+    
+    def _check_device(self, user_id: str, fingerprint: str, device_data: Dict) -> Dict:
+        """Known-device lookup and distinct-user count from the server-side registry"""
+        if not device_data:
+            return {'is_known_device': False, 'distinct_users': 0, 'device_farm': False}
+        return self.device_registry.check(user_id, fingerprint)
+    
+    def _resolve_typing_data(self, typing_data: Dict) -> Dict:
+        """Derive typing aggregates from raw key events when they are supplied"""
+        if not typing_data or 'key_down' not in typing_data:
+            return typing_data
+        features = keystroke_features(typing_data['key_down'], typing_data.get('key_up'))
+        resolved = {k: v for k, v in typing_data.items() if k not in RAW_TYPING_FIELDS}
+        if features['keystrokes'] < 2:
+            return resolved  # No intervals yet; the rules fall back to their defaults
+        resolved.update(
+            avg_time=features['avg_time'],
+            variance=features['variance'],
+            rhythm_score=features['rhythm_score'],
+            features=features
+        )
+        return resolved
+    
+    def _resolve_mouse_data(self, mouse_data: Dict) -> Dict:
+        """Derive mouse aggregates from raw pointer samples when they are supplied"""
+        if not mouse_data or not all(field in mouse_data for field in RAW_POINTER_FIELDS):
+            return mouse_data
+        features = pointer_features(mouse_data['x'], mouse_data['y'], mouse_data['t'])
+        resolved = {k: v for k, v in mouse_data.items() if k not in RAW_POINTER_FIELDS}
+        resolved.update(
+            speed=features['speed'],
+            curvature=features['curvature'],
+            pauses=features['pauses'],
+            features=features
+        )
+        return resolved
+    
     def _analyze_typing_pattern(self, typing_data: Dict) -> float:
         """Analyze typing rhythm and patterns"""
         if not typing_data:
@@ -127,19 +365,20 @@ class BiometricAnalyzer:
         
         return min(risk_score, 1.0)
     
-    def _analyze_device_fingerprint(self, device_data: Dict) -> float:
+    def _analyze_device_fingerprint(self, device_data: Dict, device_check: Dict) -> float:
         """Analyze device fingerprint for anomalies"""
         if not device_data:
             return 0.6
         
-        fingerprint = self._generate_device_fingerprint(device_data)
-        
-        # Check if device is known
-        is_new_device = device_data.get('is_new', True)
-        if is_new_device:
-            risk_score = 0.6
-        else:
+        # Check if device is known (from the registry, not a client-sent flag)
+        if device_check['is_known_device']:
             risk_score = 0.1
+        else:
+            risk_score = 0.6
+        
+        # One device fronting many accounts
+        if device_check['device_farm']:
+            risk_score += 0.5
         
         # Check for suspicious attributes
         if device_data.get('vpn_detected', False):
@@ -0,0 +1,151 @@
+"""
+Biometric Features - Vectorized features from raw keystroke and pointer event streams
+Timestamps are in milliseconds; pointer coordinates in pixels
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# A gap between events longer than this counts as a pause
+TYPING_PAUSE_MS = 1000.0
+POINTER_PAUSE_MS = 200.0
+PERCENTILES = np.array([10, 50, 90])
+
+
+def _percentiles(values: np.ndarray) -> np.ndarray:
+    """
+    Same result as np.percentile(values, PERCENTILES) with linear interpolation.
+    One SIMD sort is several times faster than a multi-kth partition at 100k rows.
+    """
+    ordered = np.sort(values)
+    position = PERCENTILES / 100.0 * (ordered.size - 1)
+    lo = position.astype(np.intp)
+    hi = np.minimum(lo + 1, ordered.size - 1)
+    weight = position - lo
+    return ordered[lo] * (1.0 - weight) + ordered[hi] * weight
+
+
+def _diff32(values: np.ndarray) -> np.ndarray:
+    """np.diff computed in the input precision, stored as float32"""
+    return np.subtract(values[1:], values[:-1], out=np.empty(values.size - 1, dtype=np.float32),
+                       casting='same_kind')
+
+
+def _distribution(values: np.ndarray, prefix: str) -> Dict[str, float]:
+    """Mean, std and percentiles of a 1-D array under a common prefix"""
+    if values.size == 0:
+        return {f'{prefix}_{name}': 0.0 for name in ('mean', 'std', 'p10', 'p50', 'p90')}
+    p10, p50, p90 = _percentiles(values)
+    return {
+        f'{prefix}_mean': float(values.mean(dtype=np.float64)),
+        f'{prefix}_std': float(values.std(dtype=np.float64)),
+        f'{prefix}_p10': float(p10),
+        f'{prefix}_p50': float(p50),
+        f'{prefix}_p90': float(p90)
+    }
+
+
+def keystroke_features(key_down, key_up: Optional = None) -> Dict[str, float]:
+    """
+    Dwell, flight and rhythm features from key-down/key-up timestamps
+
+    Dwell is how long each key is held (up - down); flight is the gap
+    between releasing one key and pressing the next. Also derives the
+    aggregate fields the typing rules read: avg_time (mean interval
+    between presses), variance (its standard deviation) and rhythm_score.
+    """
+    down = np.asarray(key_down, dtype=np.float64)
+    up = np.asarray(key_up, dtype=np.float64) if key_up is not None else None
+    features = {'keystrokes': int(down.size)}
+
+    intervals = np.diff(down)
+    features.update(_distribution(intervals, 'interval'))
+    if up is not None and up.size == down.size:
+        features.update(_distribution(up - down, 'dwell'))
+        features.update(_distribution(down[1:] - up[:-1], 'flight'))
+
+    pauses = intervals > TYPING_PAUSE_MS
+    active = intervals[~pauses]
+    duration = (down[-1] - down[0]) / 1000.0 if down.size > 1 else 0.0
+    features.update({
+        'pauses': int(pauses.sum()),
+        'pause_time_ms': float(intervals[pauses].sum()),
+        'keys_per_second': float(down.size / duration) if duration > 0 else 0.0,
+        'avg_time': float(active.mean()) if active.size else 0.0,
+        'variance': float(active.std()) if active.size else 0.0
+    })
+    # Human rhythm varies; a coefficient of variation near zero is machine-regular
+    cv = features['variance'] / features['avg_time'] if features['avg_time'] > 0 else 0.0
+    features['rhythm_score'] = float(min(cv / 0.25, 1.0))
+    return features
+
+
+def pointer_steps(x: np.ndarray, y: np.ndarray, t: np.ndarray):
+    """
+    Per-step dx, dy, dt, length, speed (px/s) and moving/pause masks.
+    Differences are taken in float64 (epoch-ms timestamps) and stored as float32.
+    """
+    dx, dy, dt = (_diff32(a) for a in (x, y, t))
+    step = np.sqrt(dx * dx + dy * dy)
+    pauses = dt > POINTER_PAUSE_MS
+    moving = dt > 0
+    moving &= ~pauses
+
+    speed = np.divide(step, dt, out=np.zeros_like(step), where=moving)
+    speed *= 1000.0
+    return dx, dy, dt, step, speed, moving, pauses
+
+
+def pointer_features(x, y, t) -> Dict[str, float]:
+    """
+    Velocity, acceleration, curvature and pause features from pointer samples
+
+    Also derives the aggregate fields the mouse rules read: speed (mean
+    px/s while moving), curvature (1 - straightness of the whole path)
+    and pauses.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)
+    features = {'samples': int(t.size)}
+    if t.size < 3:
+        features.update(speed=0.0, curvature=0.5, pauses=0, straightness=0.0, path_length=0.0)
+        return features
+
+    dx, dy, dt, step, speed, moving, pauses = pointer_steps(x, y, t)
+    dt_mid = dt[1:] + dt[:-1]
+    dt_mid *= 0.5
+    accel_ok = moving[1:] & moving[:-1]
+    acceleration = np.diff(speed)[accel_ok]
+    acceleration /= dt_mid[accel_ok]
+    np.abs(acceleration, out=acceleration)
+    acceleration *= 1000.0
+
+    # Heading change per pixel travelled, on steps that actually move;
+    # the angle between consecutive steps comes from their cross and dot products
+    cross = dx[:-1] * dy[1:]
+    cross -= dy[:-1] * dx[1:]
+    np.abs(cross, out=cross)
+    dot = dx[:-1] * dx[1:]
+    dot += dy[:-1] * dy[1:]
+    turn_ok = (step[1:] > 0) & (step[:-1] > 0)
+    curvature = np.arctan2(cross[turn_ok], dot[turn_ok])
+    curvature /= (step[1:][turn_ok] + step[:-1][turn_ok]) * 0.5
+
+    path_length = float(step.sum(dtype=np.float64))
+    displacement = float(np.hypot(x[-1] - x[0], y[-1] - y[0]))
+    straightness = min(displacement / path_length, 1.0) if path_length > 0 else 1.0
+
+    features.update(_distribution(speed[moving], 'speed'))
+    features.update(_distribution(acceleration, 'acceleration'))
+    features.update(_distribution(curvature, 'turn_rate'))
+    features.update({
+        'path_length': path_length,
+        'straightness': float(straightness),
+        'pauses': int(pauses.sum()),
+        'pause_time_ms': float(dt[pauses].sum(dtype=np.float64)),
+        'speed': features['speed_mean'],
+        'curvature': float(1.0 - straightness)
+    })
+    return features
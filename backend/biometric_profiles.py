@@ -0,0 +1,203 @@
+"""
+Biometric Profiles - Per-user running baselines of behavioral features
+Fixed-size arrays updated with Welford's algorithm; least recently used users are evicted
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# (section, field) pairs read from a resolved biometric payload. Fields missing
+# from a session are skipped for that session only.
+PROFILE_FEATURES = [
+    ('typing_data', 'avg_time'),
+    ('typing_data', 'variance'),
+    ('typing_data', 'rhythm_score'),
+    ('typing_data', 'dwell_mean'),
+    ('typing_data', 'flight_mean'),
+    ('mouse_data', 'speed'),
+    ('mouse_data', 'curvature'),
+    ('mouse_data', 'pauses'),
+    ('session_data', 'duration'),
+    ('session_data', 'pages_visited')
+]
+
+# A deviation of this many standard deviations counts as fully anomalous
+Z_CAP = 4.0
+
+
+class BiometricProfileStore:
+    """
+    Running mean and variance of each profile feature for up to ``max_users`` users.
+
+    Storage is preallocated (per feature: count, mean, M2), so memory is
+    fixed at roughly 12 bytes x features x max_users plus the slot map.
+    A user's baseline is only used once it has ``min_sessions`` verified
+    sessions; below that, deviation() returns None.
+    """
+
+    def __init__(self, max_users: int = 100000, min_sessions: int = 3,
+                 feature_names: Optional[Sequence[str]] = None):
+        self.max_users = max_users
+        self.min_sessions = min_sessions
+        self.feature_names = list(feature_names or [field for _, field in PROFILE_FEATURES])
+        n_features = len(self.feature_names)
+
+        self._count = np.zeros((max_users, n_features), dtype=np.int32)
+        self._mean = np.zeros((max_users, n_features), dtype=np.float32)
+        self._m2 = np.zeros((max_users, n_features), dtype=np.float32)
+        self._sessions = np.zeros(max_users, dtype=np.int32)
+        self._slots = OrderedDict()  # user_id -> row, least recently used first
+        self._free = list(range(max_users - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def update(self, user_id: str, vector: np.ndarray):
+        """Fold one verified session's feature vector (NaN = missing) into the user's baseline"""
+        vector = np.asarray(vector, dtype=np.float32)
+        present = ~np.isnan(vector)
+        with self._lock:
+            slot = self._slot(user_id, create=True)
+            count = self._count[slot]
+            mean = self._mean[slot]
+            m2 = self._m2[slot]
+
+            count[present] += 1
+            delta = vector[present] - mean[present]
+            mean[present] += delta / count[present]
+            m2[present] += delta * (vector[present] - mean[present])
+            self._sessions[slot] += 1
+
+    def sessions(self, user_id: str) -> int:
+        """Verified sessions folded into a user's baseline (0 if unknown or evicted)"""
+        with self._lock:
+            slot = self._slots.get(user_id)
+            return int(self._sessions[slot]) if slot is not None else 0
+
+    def deviation(self, user_id: str, vector: np.ndarray) -> Optional[Dict]:
+        """
+        How far a session sits from the user's own baseline, in O(features).
+
+        The score is the mean capped |z| over features with enough history,
+        scaled to 0-1. The standard deviation is floored at 10% of the mean
+        so a very consistent user is not flagged for tiny changes.
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            slot = self._slot(user_id)
+            if slot is None or self._sessions[slot] < self.min_sessions:
+                return None
+            count = self._count[slot:slot + 1].copy()
+            mean = self._mean[slot:slot + 1].copy()
+            m2 = self._m2[slot:slot + 1].copy()
+            sessions = int(self._sessions[slot])
+
+        score, z, usable = self._deviation_rows(count, mean, m2, vector)
+        usable = usable[0]
+        if not usable.any():
+            return None
+        names = [name for name, ok in zip(self.feature_names, usable) if ok]
+        z = z[0, usable]
+        return {
+            'score': float(score[0]),
+            'sessions': sessions,
+            'z_scores': {name: round(float(value), 3) for name, value in zip(names, z)},
+            'most_deviant': names[int(np.argmax(z))]
+        }
+
+    def deviation_batch(self, user_ids, vectors: np.ndarray) -> np.ndarray:
+        """Deviation scores for many sessions at once; NaN where deviation() would return None"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        with self._lock:
+            slots = np.array([self._slots.get(user_id, -1) for user_id in user_ids], dtype=np.int64)
+            known = slots >= 0
+            known[known] = self._sessions[slots[known]] >= self.min_sessions
+            rows = slots[known]
+            count, mean, m2 = self._count[rows], self._mean[rows], self._m2[rows]
+
+        scores = np.full(n, np.nan)
+        score, _, usable = self._deviation_rows(count, mean, m2, vectors[known])
+        scores[np.flatnonzero(known)] = np.where(usable.any(axis=1), score, np.nan)
+        return scores
+
+    def _deviation_rows(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray, vectors: np.ndarray):
+        """
+        Row-wise deviation score, |z| and usable-feature mask.
+        Shared by deviation() and deviation_batch() so both give identical
+        results; the cumsum keeps the summation order independent of batch size.
+        """
+        usable = (count >= self.min_sessions) & ~np.isnan(vectors)
+        variance = m2 / np.maximum(count - 1, 1)
+        std = np.maximum(np.sqrt(variance), 0.1 * np.abs(mean) + 1e-6)
+        z = np.abs(np.where(usable, vectors, mean) - mean) / std
+        capped = np.where(usable, np.minimum(z / Z_CAP, 1.0), 0.0)
+        n_usable = usable.sum(axis=1)
+        total = np.cumsum(capped, axis=1)[:, -1] if capped.shape[1] else np.zeros(len(capped))
+        return total / np.maximum(n_usable, 1), z, usable
+
+    def profile(self, user_id: str) -> Optional[Dict]:
+        """Baseline mean and standard deviation per feature"""
+        with self._lock:
+            slot = self._slot(user_id)
+            if slot is None:
+                return None
+            count = self._count[slot].copy()
+            mean = self._mean[slot].copy()
+            m2 = self._m2[slot].copy()
+            sessions = int(self._sessions[slot])
+
+        std = np.sqrt(m2 / np.maximum(count - 1, 1))
+        return {
+            'sessions': sessions,
+            'features': {
+                name: {'samples': int(n), 'mean': float(mu), 'std': float(sd)}
+                for name, n, mu, sd in zip(self.feature_names, count, mean, std) if n
+            }
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._slots),
+                'max_users': self.max_users,
+                'evictions': self.evictions,
+                'memory_bytes': self._count.nbytes + self._mean.nbytes + self._m2.nbytes + self._sessions.nbytes
+            }
+
+    def _slot(self, user_id: str, create: bool = False) -> Optional[int]:
+        """Row for a user, marking it most recently used; callers hold the lock"""
+        slot = self._slots.get(user_id)
+        if slot is not None:
+            self._slots.move_to_end(user_id)
+            return slot
+        if not create:
+            return None
+
+        if not self._free:
+            _, evicted = self._slots.popitem(last=False)
+            self._free.append(evicted)
+            self.evictions += 1
+        slot = self._free.pop()
+        self._count[slot] = 0
+        self._mean[slot] = 0
+        self._m2[slot] = 0
+        self._sessions[slot] = 0
+        self._slots[user_id] = slot
+        return slot
+
+
+def profile_vector(sections: Dict[str, Dict], features: List = PROFILE_FEATURES) -> np.ndarray:
+    """Feature vector for a session; fields may sit in a section or in its raw-event 'features'"""
+    vector = np.full(len(features), np.nan, dtype=np.float32)
+    for i, (section, field) in enumerate(features):
+        data = sections.get(section) or {}
+        value = data.get(field, (data.get('features') or {}).get(field))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            vector[i] = value
+    return vector
@@ -0,0 +1,288 @@
+"""
+Biometric Sessions - Running behavioral aggregates for sessions streamed in chunks
+Each session keeps O(1) state, so a current biometric risk is available at any moment
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from biometric_features import TYPING_PAUSE_MS, pointer_steps
+
+# Session fields a client may report; anything else in a chunk is ignored
+SESSION_FIELDS = ('pages_visited', 'direct_to_payment', 'failed_logins', 'rapid_clicks')
+TYPING_FLAGS = ('copy_paste_detected',)
+DEVICE_FIELDS = ('user_agent', 'screen_resolution', 'timezone', 'language', 'plugins', 'browser', 'os',
+                 'vpn_detected', 'tor_detected', 'emulator_detected')
+
+
+class RunningStats:
+    """Count, mean and population variance merged chunk by chunk (Chan et al.)"""
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values: np.ndarray):
+        n = values.size
+        if n == 0:
+            return
+        mean = float(values.mean(dtype=np.float64))
+        m2 = float(np.square(values - mean, dtype=np.float64).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+
+class BiometricSession:
+    """Fixed-size running state for one streamed session"""
+
+    def __init__(self, user_id: str, device_data: Optional[Dict] = None, owner: Optional[str] = None):
+        self.user_id = user_id
+        self.owner = owner
+        self.started_at = time.time()
+        self.last_seen = time.monotonic()
+        self.device_data = {k: v for k, v in (device_data or {}).items() if k in DEVICE_FIELDS}
+        self.session_data = {}
+        self.typing_flags = {}
+
+        # Typing: intervals between presses, dwell and flight
+        self.keystrokes = 0
+        self.first_down = None
+        self.last_down = None
+        self.last_up = None
+        self.intervals = RunningStats()
+        self.dwell = RunningStats()
+        self.flight = RunningStats()
+        self.typing_pauses = 0
+
+        # Pointer: last sample carries over so steps span chunk boundaries
+        self.samples = 0
+        self.first_point = None
+        self.last_point = None
+        self.speed = RunningStats()
+        self.path_length = 0.0
+        self.pointer_pauses = 0
+
+    def add_typing(self, key_down, key_up=None):
+        down = np.asarray(key_down, dtype=np.float64)
+        if down.size == 0:
+            return
+        up = np.asarray(key_up, dtype=np.float64) if key_up is not None else None
+        if up is not None and up.size != down.size:
+            up = None
+
+        presses = down if self.last_down is None else np.concatenate(([self.last_down], down))
+        intervals = np.diff(presses)
+        pauses = intervals > TYPING_PAUSE_MS
+        self.typing_pauses += int(pauses.sum())
+        self.intervals.add(intervals[~pauses])
+
+        if up is not None:
+            self.dwell.add(up - down)
+            # Flight runs from each release to the next press, across chunks too
+            if self.last_up is None:
+                self.flight.add(down[1:] - up[:-1])
+            else:
+                self.flight.add(down - np.concatenate(([self.last_up], up[:-1])))
+            self.last_up = float(up[-1])
+
+        if self.first_down is None:
+            self.first_down = float(down[0])
+        self.last_down = float(down[-1])
+        self.keystrokes += int(down.size)
+
+    def add_pointer(self, x, y, t):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        t = np.asarray(t, dtype=np.float64)
+        if t.size == 0:
+            return
+        self.samples += int(t.size)
+        if self.last_point is not None:
+            x = np.concatenate(([self.last_point[0]], x))
+            y = np.concatenate(([self.last_point[1]], y))
+            t = np.concatenate(([self.last_point[2]], t))
+        if t.size > 1:
+            _, _, _, step, speed, moving, pauses = pointer_steps(x, y, t)
+            self.speed.add(speed[moving])
+            self.path_length += float(step.sum(dtype=np.float64))
+            self.pointer_pauses += int(pauses.sum())
+
+        if self.first_point is None:
+            self.first_point = (float(x[0]), float(y[0]))
+        self.last_point = (float(x[-1]), float(y[-1]), float(t[-1]))
+
+    def biometric_data(self) -> Dict:
+        """Current aggregates as an analyze_behavioral_patterns payload"""
+        typing_data = dict(self.typing_flags)
+        if self.keystrokes >= 2:
+            avg_time = self.intervals.mean if self.intervals.count else 0.0
+            variance = self.intervals.std
+            cv = variance / avg_time if avg_time > 0 else 0.0
+            duration = (self.last_down - self.first_down) / 1000.0
+            typing_data.update(
+                avg_time=avg_time,
+                variance=variance,
+                rhythm_score=float(min(cv / 0.25, 1.0)),
+                features={
+                    'keystrokes': self.keystrokes,
+                    'pauses': self.typing_pauses,
+                    'keys_per_second': self.keystrokes / duration if duration > 0 else 0.0,
+                    'dwell_mean': self.dwell.mean,
+                    'dwell_std': self.dwell.std,
+                    'flight_mean': self.flight.mean,
+                    'flight_std': self.flight.std
+                }
+            )
+
+        mouse_data = {}
+        if self.samples >= 3:
+            displacement = float(np.hypot(self.last_point[0] - self.first_point[0],
+                                          self.last_point[1] - self.first_point[1]))
+            straightness = min(displacement / self.path_length, 1.0) if self.path_length > 0 else 1.0
+            mouse_data = {
+                'speed': self.speed.mean,
+                'curvature': 1.0 - straightness,
+                'pauses': self.pointer_pauses,
+                'features': {
+                    'samples': self.samples,
+                    'speed_mean': self.speed.mean,
+                    'speed_std': self.speed.std,
+                    'path_length': self.path_length,
+                    'straightness': straightness
+                }
+            }
+        elif self.samples:
+            mouse_data = {'speed': 0.0, 'curvature': 0.5, 'pauses': 0}
+
+        session_data = dict(self.session_data)
+        session_data['duration'] = time.time() - self.started_at
+        return {
+            'user_id': self.user_id,
+            'typing_data': typing_data,
+            'mouse_data': mouse_data,
+            'device_data': self.device_data,
+            'session_data': session_data
+        }
+
+
+class BiometricSessionTracker:
+    """
+    Live biometric sessions fed by event chunks.
+
+    Session state does not grow with the number of events. Sessions idle
+    for ``idle_seconds`` are dropped on the next sweep, and the least
+    recently active are evicted past ``max_sessions``.
+
+    Session ids are always generated here. A session started with an
+    ``owner`` (the Socket.IO sid) only accepts calls from that owner;
+    calls without one come from server-side code and are not checked.
+    """
+
+    def __init__(self, analyzer, max_sessions: int = 50000, idle_seconds: float = 600,
+                 max_chunk_events: int = 10000):
+        self.analyzer = analyzer
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_chunk_events = max_chunk_events
+        self._sessions = OrderedDict()  # session_id -> BiometricSession, least recently active first
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._stats = {'started': 0, 'ended': 0, 'expired': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def start(self, user_id: str, device_data: Optional[Dict] = None, owner: Optional[str] = None) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sweep()
+            self._sessions[session_id] = BiometricSession(user_id or 'anonymous', device_data, owner)
+            self._stats['started'] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats['evicted'] += 1
+        return session_id
+
+    def add_events(self, session_id: str, typing: Optional[Dict] = None, mouse: Optional[Dict] = None,
+                   session: Optional[Dict] = None, owner: Optional[str] = None) -> Dict:
+        """Fold one chunk of events into a session's running aggregates"""
+        typing = typing or {}
+        mouse = mouse or {}
+        events = len(typing.get('key_down') or ()) + len(mouse.get('t') or ())
+        if events > self.max_chunk_events:
+            raise ValueError(f'Chunk has {events} events; the limit is {self.max_chunk_events}')
+
+        with self._lock:
+            self._sweep()
+            state = self._touch(session_id, owner)
+            if typing.get('key_down'):
+                state.add_typing(typing['key_down'], typing.get('key_up'))
+            if mouse.get('t'):
+                state.add_pointer(mouse['x'], mouse['y'], mouse['t'])
+            state.typing_flags.update({k: v for k, v in typing.items() if k in TYPING_FLAGS})
+            state.session_data.update({k: v for k, v in (session or {}).items() if k in SESSION_FIELDS})
+            return {'session_id': session_id, 'keystrokes': state.keystrokes, 'samples': state.samples}
+
+    def score(self, session_id: str, owner: Optional[str] = None) -> Dict:
+        """Biometric analysis of the session so far; cost does not depend on events seen"""
+        with self._lock:
+            payload = self._touch(session_id, owner).biometric_data()
+        return self.analyzer.analyze_behavioral_patterns(payload)
+
+    def end(self, session_id: str, owner: Optional[str] = None) -> Dict:
+        """Final analysis; baselines only change through the analyzer's record_verified_session"""
+        with self._lock:
+            state = self._touch(session_id, owner)
+            del self._sessions[session_id]
+            self._stats['ended'] += 1
+            payload = state.biometric_data()
+        return self.analyzer.analyze_behavioral_patterns(payload)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'active': len(self._sessions), 'max_sessions': self.max_sessions,
+                    'idle_seconds': self.idle_seconds}
+
+    def expire_idle(self) -> int:
+        with self._lock:
+            return self._expire()
+
+    def _touch(self, session_id: str, owner: Optional[str] = None) -> BiometricSession:
+        state = self._sessions.get(session_id)
+        # Another connection's session looks the same as a missing one
+        if state is None or (owner is not None and state.owner is not None and state.owner != owner):
+            raise KeyError(f'Unknown or expired biometric session {session_id}')
+        state.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def _sweep(self):
+        """Expire idle sessions at most every tenth of the idle timeout"""
+        if time.monotonic() - self._last_sweep >= self.idle_seconds / 10:
+            self._expire()
+
+    def _expire(self) -> int:
+        now = time.monotonic()
+        self._last_sweep = now
+        expired = 0
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.last_seen < self.idle_seconds:
+                break
+            del self._sessions[session_id]
+            expired += 1
+        self._stats['expired'] += expired
+        return expired
@@ -0,0 +1,447 @@
+"""
+Case Index - Nearest-neighbour search over labeled historical transactions
+Scaled feature vectors live in memory-mapped column files with an IVF index
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+OUTCOMES = ['LEGITIMATE', 'CONFIRMED_FRAUD']
+
+
+class CaseIndex:
+    """
+    Append-only vector index of labeled cases.
+
+    Vectors and case metadata are flat binary columns read through
+    ``np.memmap``. ``build`` clusters the vectors with k-means and writes
+    them grouped by inverted list, so probing a list reads one contiguous
+    slice. Cases appended afterwards are assigned to their nearest centroid
+    and kept in per-list tails without a rebuild. Below ``exact_rows`` no
+    clustering is done and search is an exact scan over float32 blocks.
+
+    Appends compact the index: once an exact index reaches ``exact_rows``,
+    or the tails outgrow ``max_tail_fraction`` of the grouped rows, a
+    background thread re-clusters the rows and rewrites them grouped by
+    list, and searches use the old lists and tails until it swaps the new
+    columns in. Regrouping moves rows, so the ``arrival`` column maps the
+    i-th case ever added to its current row; ``labeled_vectors`` takes
+    these arrival numbers.
+    """
+
+    COLUMNS = {
+        'vectors': np.float32,
+        'norm': np.float32,
+        'outcome': np.int8,
+        'amount': np.float32,
+        'timestamp': np.float64,
+        'list_id': np.int32,
+        'case_id': 'S24',
+        'arrival': np.int64
+    }
+    SCAN_BLOCK_ROWS = 65536
+
+    def __init__(self, path: str = './models/case_index/', nprobe: int = 8, exact_rows: int = 50000,
+                 max_tail_fraction: float = 0.25):
+        self.path = path
+        self.nprobe = nprobe
+        self.exact_rows = exact_rows
+        self.max_tail_fraction = max_tail_fraction
+        self.dim = None
+        self.centroids = None
+        self._lock = threading.RLock()
+        self._rows = 0
+        self._sorted_rows = 0      # rows grouped by list at build time
+        self._built_rows = 0       # rows written by the last build; later cases have higher arrival numbers
+        self._offsets = None       # list j occupies [offsets[j], offsets[j + 1]) of the grouped rows
+        self._tails = []           # list j -> row ids appended since the build
+        self._columns = {}
+        self._trimmed = False
+        self._generation = 0       # bumped by build, so a compaction of the old contents is discarded
+        self._compaction = None    # background compaction thread, at most one
+        self._load()
+
+    # ==================== Building ====================
+    def build(self, vectors: np.ndarray, outcomes: np.ndarray, case_ids: Optional[List[str]] = None,
+              amounts: Optional[np.ndarray] = None, timestamps: Optional[np.ndarray] = None,
+              nlist: Optional[int] = None):
+        """Replace the index contents, clustering into inverted lists when large enough"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        columns = self._column_arrays(n, outcomes, case_ids, amounts, timestamps)
+
+        columns['arrival'] = np.arange(n)
+
+        with self._lock:
+            self.dim = vectors.shape[1]
+            if n >= self.exact_rows:
+                nlist = nlist or int(np.clip(np.sqrt(n), 16, 65536))
+                self.centroids = self._kmeans(vectors, nlist)
+                assignments = self._assign(vectors)
+                order = np.argsort(assignments, kind='stable')
+                vectors = vectors[order]
+                columns = {name: values[order] for name, values in columns.items() if name != 'arrival'}
+                columns['list_id'] = assignments[order]
+                columns['arrival'] = self._positions(order)
+                self._offsets = np.searchsorted(columns['list_id'], np.arange(nlist + 1))
+                self._sorted_rows = n
+            else:
+                self.centroids = None
+                self._offsets = None
+                self._sorted_rows = 0
+            self._tails = [[] for _ in range(self.nlist)]
+
+            self._columns = {}
+            columns['vectors'] = vectors
+            columns['norm'] = np.einsum('ij,ij->i', vectors, vectors)
+            # Replace rather than truncate: a running compaction may still be reading the old columns
+            for name, dtype in self.COLUMNS.items():
+                with open(self._column_path(name) + '.tmp', 'wb') as f:
+                    f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+                os.replace(self._column_path(name) + '.tmp', self._column_path(name))
+            if self.centroids is not None:
+                np.save(os.path.join(self.path, 'centroids.npy'), self.centroids)
+            self._rows = n
+            self._built_rows = n
+            self._trimmed = True
+            self._generation += 1
+            self._save_metadata()
+
+    def append(self, vectors: np.ndarray, outcomes: np.ndarray, case_ids: Optional[List[str]] = None,
+               amounts: Optional[np.ndarray] = None, timestamps: Optional[np.ndarray] = None):
+        """Add labeled cases; each joins its nearest inverted list, compacting when the tails grow"""
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+        n = len(vectors)
+        columns = self._column_arrays(n, outcomes, case_ids, amounts, timestamps)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f'Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}')
+            if not self._trimmed:
+                self._trim_columns()
+                self._trimmed = True
+
+            if self.centroids is not None:
+                columns['list_id'] = self._assign(vectors)
+                for offset, list_id in enumerate(columns['list_id']):
+                    self._tails[list_id].append(self._rows + offset)
+            columns['vectors'] = vectors
+            columns['norm'] = np.einsum('ij,ij->i', vectors, vectors)
+            columns['arrival'] = np.arange(self._rows, self._rows + n)
+
+            for name, dtype in self.COLUMNS.items():
+                with open(self._column_path(name), 'ab') as f:
+                    f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+            self._columns = {}
+            self._rows += n
+            self._save_metadata()
+
+            if self._needs_compaction():
+                self._start_compaction()
+
+    def _needs_compaction(self) -> bool:
+        if self.centroids is None:
+            return self._rows >= self.exact_rows
+        return self._rows - self._sorted_rows > self.max_tail_fraction * self._sorted_rows
+
+    def _start_compaction(self):
+        """Compact on a background thread unless one is already running; call with the lock held"""
+        if self._compaction is not None:
+            return
+        self._compaction = threading.Thread(target=self._compact, args=(self._rows, self._generation),
+                                            name='case-index-compaction', daemon=True)
+        self._compaction.start()
+
+    def wait_for_compaction(self, timeout: Optional[float] = None) -> bool:
+        """Block until no compaction is running; False if it is still running after ``timeout``"""
+        while True:
+            with self._lock:
+                compaction = self._compaction
+            if compaction is None:
+                return True
+            compaction.join(timeout)
+            if compaction.is_alive():
+                return False
+
+    def _compact(self, rows: int, generation: int):
+        """
+        Re-cluster the first ``rows`` rows and rewrite the columns grouped by inverted list.
+
+        Clustering and writing happen outside the lock: appends only add rows past
+        ``rows``, so searches keep using the old lists and tails meanwhile. The new
+        columns are swapped in under the lock, with cases appended in the meantime
+        copied after the grouped rows as tails of the new lists.
+        """
+        swapped = False
+        try:
+            vectors = self._map('vectors', rows)
+            nlist = int(np.clip(np.sqrt(rows), 16, 65536))
+            centroids = self._kmeans(vectors, nlist)
+            assignments = self._assign(vectors, centroids)
+            order = np.argsort(assignments, kind='stable')
+            positions = self._positions(order)
+
+            # Write every column beside the live one
+            for name, dtype in self.COLUMNS.items():
+                source = self._map(name, rows)
+                with open(self._column_path(name) + '.compact', 'wb') as f:
+                    for start in range(0, rows, self.SCAN_BLOCK_ROWS):
+                        block = slice(start, start + self.SCAN_BLOCK_ROWS)
+                        if name == 'arrival':
+                            values = positions[source[block]]
+                        elif name == 'list_id':
+                            values = assignments[order[block]]
+                        else:
+                            values = source[order[block]]
+                        f.write(np.asarray(values, dtype=dtype).tobytes())
+
+            with self._lock:
+                if generation != self._generation:
+                    # Rebuilt while compacting; these columns describe the old contents
+                    for name in self.COLUMNS:
+                        os.remove(self._column_path(name) + '.compact')
+                    return
+
+                # Later cases keep their arrival numbers, so their arrival entries carry over as-is
+                tail_lists = self._assign(self._map('vectors', self._rows)[rows:], centroids)
+                for name, dtype in self.COLUMNS.items():
+                    values = tail_lists if name == 'list_id' else self._map(name, self._rows)[rows:]
+                    with open(self._column_path(name) + '.compact', 'ab') as f:
+                        f.write(np.asarray(values, dtype=dtype).tobytes())
+                self._columns = {}
+                for name in self.COLUMNS:
+                    os.replace(self._column_path(name) + '.compact', self._column_path(name))
+
+                self.centroids = centroids
+                np.save(os.path.join(self.path, 'centroids.npy'), centroids)
+                self._offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+                self._sorted_rows = rows
+                self._tails = [[] for _ in range(nlist)]
+                for offset, list_id in enumerate(tail_lists):
+                    self._tails[list_id].append(rows + offset)
+                self._save_metadata()
+                swapped = True
+        finally:
+            with self._lock:
+                self._compaction = None
+                # Appends that outgrew the new lists while this one ran start the next compaction
+                if swapped and self._needs_compaction():
+                    self._start_compaction()
+
+    def _positions(self, order: np.ndarray) -> np.ndarray:
+        """New row of each old row after reordering rows by ``order``"""
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        return positions
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    @property
+    def built_rows(self) -> int:
+        return self._built_rows
+
+    def labeled_vectors(self, arrivals: np.ndarray):
+        """(vectors, outcomes) copies of cases by arrival number, e.g. cases added since the n-th"""
+        arrivals = np.asarray(arrivals, dtype=np.int64)
+        with self._lock:
+            if len(arrivals) == 0:
+                return np.empty((0, self.dim or 0), dtype=np.float32), np.empty(0, dtype=np.int8)
+            rows = self._open('arrival')[arrivals]
+            return np.asarray(self._open('vectors')[rows]), np.asarray(self._open('outcome')[rows])
+
+    # ==================== Search ====================
+    def search(self, query: np.ndarray, k: int = 3, nprobe: Optional[int] = None) -> List[Dict]:
+        """Top-k most similar cases to one scaled feature vector"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            if self._rows == 0:
+                return []
+            if self.centroids is None:
+                rows, distances = self._search_exact(query, k)
+            else:
+                rows, distances = self._search_ivf(query, k, nprobe or self.nprobe)
+            return self._cases(rows, distances)
+
+    def _search_exact(self, query: np.ndarray, k: int):
+        vectors = self._open('vectors')
+        norms = self._open('norm')
+        best_rows = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, self._rows, self.SCAN_BLOCK_ROWS):
+            end = min(start + self.SCAN_BLOCK_ROWS, self._rows)
+            distances = norms[start:end] - 2 * (vectors[start:end] @ query)
+            rows, distances = self._top_k(distances, k)
+            best_rows = np.concatenate([best_rows, rows + start])
+            best_distances = np.concatenate([best_distances, distances])
+        rows, distances = self._top_k(best_distances, k)
+        return best_rows[rows], distances + query @ query
+
+    def _search_ivf(self, query: np.ndarray, k: int, nprobe: int):
+        centroid_distances = np.einsum('ij,ij->i', self.centroids - query, self.centroids - query)
+        lists, _ = self._top_k(centroid_distances, min(nprobe, self.nlist))
+
+        vectors = self._open('vectors')
+        norms = self._open('norm')
+        distances, rows = [], []
+        for list_id in lists:
+            start, end = self._offsets[list_id], self._offsets[list_id + 1]
+            if end > start:
+                # Contiguous slice of the grouped rows; ||x||^2 - 2 x.q ranks like ||x - q||^2
+                distances.append(norms[start:end] - 2 * (vectors[start:end] @ query))
+                rows.append(np.arange(start, end))
+            if self._tails[list_id]:
+                tail = np.asarray(self._tails[list_id])
+                distances.append(norms[tail] - 2 * (vectors[tail] @ query))
+                rows.append(tail)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.concatenate(rows)
+        best, distances = self._top_k(np.concatenate(distances), k)
+        return rows[best], distances + query @ query
+
+    def _top_k(self, distances: np.ndarray, k: int):
+        if len(distances) > k:
+            rows = np.argpartition(distances, k - 1)[:k]
+        else:
+            rows = np.arange(len(distances))
+        rows = rows[np.argsort(distances[rows])]
+        return rows, distances[rows]
+
+    def _cases(self, rows: np.ndarray, distances: np.ndarray) -> List[Dict]:
+        outcome = self._open('outcome')
+        amount = self._open('amount')
+        timestamp = self._open('timestamp')
+        case_id = self._open('case_id')
+
+        cases = []
+        for row, distance in zip(rows, distances):
+            ts = float(timestamp[row])
+            cases.append({
+                'case_id': case_id[row].decode() or f'CASE_{row}',
+                'similarity': round(float(1 / (1 + np.sqrt(max(distance, 0)))), 4),
+                'outcome': OUTCOMES[outcome[row]],
+                'amount': None if np.isnan(amount[row]) else round(float(amount[row]), 2),
+                'date': None if np.isnan(ts) else np.datetime64(int(ts), 's').astype(str)[:10]
+            })
+        return cases
+
+    # ==================== Clustering ====================
+    def _kmeans(self, vectors: np.ndarray, nlist: int, iterations: int = 10,
+                sample_per_list: int = 64) -> np.ndarray:
+        """Lloyd's k-means on a sample of the vectors"""
+        rng = np.random.default_rng(42)
+        sample_size = min(len(vectors), nlist * sample_per_list)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = self._assign(sample, centroids)
+            counts = np.bincount(assignments, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Reseed empty lists from random sample points
+            centroids[~filled] = sample[rng.choice(sample_size, int((~filled).sum()))]
+        return centroids
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Nearest centroid per vector, in blocks to bound memory"""
+        centroids = self.centroids if centroids is None else centroids
+        centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 4096):
+            block = vectors[start:start + 4096]
+            distances = centroid_norms - 2 * block @ centroids.T
+            assignments[start:start + 4096] = np.argmin(distances, axis=1)
+        return assignments
+
+    # ==================== Storage ====================
+    def _column_arrays(self, n: int, outcomes, case_ids, amounts, timestamps) -> Dict[str, np.ndarray]:
+        return {
+            'outcome': np.asarray(outcomes, dtype=np.int8).reshape(n),
+            'amount': np.full(n, np.nan) if amounts is None else np.asarray(amounts, dtype=np.float32),
+            'timestamp': np.full(n, np.nan) if timestamps is None else np.asarray(timestamps, dtype=np.float64),
+            'list_id': np.full(n, -1, dtype=np.int32),
+            'case_id': np.array(['' if c is None else str(c)[:24] for c in case_ids] if case_ids is not None
+                                else [''] * n, dtype='S24')
+        }
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f'{name}.bin')
+
+    def _open(self, name: str) -> np.ndarray:
+        """Memory-map a column, cached until the next write"""
+        column = self._columns.get(name)
+        if column is None:
+            column = self._map(name, self._rows)
+            self._columns[name] = column
+        return column
+
+    def _map(self, name: str, rows: int) -> np.ndarray:
+        shape = (rows, self.dim) if name == 'vectors' else (rows,)
+        return np.memmap(self._column_path(name), dtype=self.COLUMNS[name], mode='r', shape=shape)
+
+    def _save_metadata(self):
+        metadata = {
+            'rows': self._rows,
+            'dim': self.dim,
+            'sorted_rows': self._sorted_rows,
+            'built_rows': self._built_rows,
+            'offsets': None if self._offsets is None else self._offsets.tolist()
+        }
+        tmp_path = os.path.join(self.path, 'metadata.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, os.path.join(self.path, 'metadata.json'))
+
+    def _load(self):
+        """Load metadata and centroids, and rebuild the per-list tails"""
+        os.makedirs(self.path, exist_ok=True)
+        metadata_path = os.path.join(self.path, 'metadata.json')
+        if not os.path.exists(metadata_path):
+            return
+
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        self._rows = metadata['rows']
+        self.dim = metadata['dim']
+        self._sorted_rows = metadata['sorted_rows']
+        self._built_rows = metadata.get('built_rows', self._sorted_rows)
+        if self._rows and not os.path.exists(self._column_path('arrival')):
+            # Written before the arrival column existed; appended rows are still in arrival order
+            with open(self._column_path('arrival'), 'wb') as f:
+                f.write(np.arange(self._rows, dtype=np.int64).tobytes())
+
+        centroids_path = os.path.join(self.path, 'centroids.npy')
+        if metadata['offsets'] is not None and os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            self._offsets = np.asarray(metadata['offsets'])
+            tail_lists = np.asarray(self._open('list_id')[self._sorted_rows:])
+            order = np.argsort(tail_lists, kind='stable')
+            bounds = np.searchsorted(tail_lists[order], np.arange(self.nlist + 1))
+            rows = order + self._sorted_rows
+            self._tails = [rows[bounds[j]:bounds[j + 1]].tolist() for j in range(self.nlist)]
+
+    def _trim_columns(self):
+        """Drop column bytes beyond the rows recorded in the metadata"""
+        for name, dtype in self.COLUMNS.items():
+            path = self._column_path(name)
+            if os.path.exists(path):
+                width = self.dim if name == 'vectors' else 1
+                size = self._rows * width * np.dtype(dtype).itemsize
+                if os.path.getsize(path) > size:
+                    with open(path, 'r+b') as f:
+                        f.truncate(size)
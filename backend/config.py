@@ -20,12 +20,80 @@ class Config:
     # ML Models
     ML_MODEL_PATH = os.getenv('ML_MODEL_PATH', './models/')
     MODEL_UPDATE_INTERVAL = int(os.getenv('MODEL_UPDATE_INTERVAL', 86400))
+    # Hyperparameter search rejects ensembles slower than this (single-row scoring, p99)
+    SCORING_P99_BUDGET_MS = float(os.getenv('SCORING_P99_BUDGET_MS', 20))
+    
+    # Continued training from labeled cases every MODEL_UPDATE_INTERVAL (0 disables)
+    MODEL_REFRESH_MIN_CASES = int(os.getenv('MODEL_REFRESH_MIN_CASES', 200))
+    MODEL_REFRESH_HOLDOUT_FRACTION = float(os.getenv('MODEL_REFRESH_HOLDOUT_FRACTION', 0.3))
+    MODEL_REFRESH_REPLAY_RATIO = float(os.getenv('MODEL_REFRESH_REPLAY_RATIO', 1.0))
+    MODEL_REFRESH_BOOST_ROUNDS = int(os.getenv('MODEL_REFRESH_BOOST_ROUNDS', 20))
+    MODEL_REFRESH_FOREST_TREES = int(os.getenv('MODEL_REFRESH_FOREST_TREES', 10))
+    MODEL_REFRESH_MAX_TREES = int(os.getenv('MODEL_REFRESH_MAX_TREES', 1000))
+    MODEL_REFRESH_MAX_METRIC_DROP = float(os.getenv('MODEL_REFRESH_MAX_METRIC_DROP', 0.005))
+    MODEL_REFRESH_THREADS = int(os.getenv('MODEL_REFRESH_THREADS', 1))
+    
+    # Similar-case index
+    CASE_INDEX_PATH = os.getenv('CASE_INDEX_PATH', './models/case_index/')
+    CASE_INDEX_NPROBE = int(os.getenv('CASE_INDEX_NPROBE', 8))
+    
+    # Counterfactual search (candidates scored per explanation)
+    COUNTERFACTUAL_BUDGET = int(os.getenv('COUNTERFACTUAL_BUDGET', 256))
+    COUNTERFACTUAL_MAX_CHANGES = int(os.getenv('COUNTERFACTUAL_MAX_CHANGES', 3))
+    
+    # Explanation cache (shared by /api/predict and /api/explain)
+    EXPLANATION_CACHE_SIZE = int(os.getenv('EXPLANATION_CACHE_SIZE', 10000))
+    EXPLANATION_CACHE_TTL = int(os.getenv('EXPLANATION_CACHE_TTL', 900))
+    EXPLANATION_CACHE_MAX_MB = int(os.getenv('EXPLANATION_CACHE_MAX_MB', 64))
+    
+    # 'inline' attaches attributions to /api/predict; 'deferred' returns a token
+    # and builds the full explanation on a background worker pool
+    EXPLANATION_MODE = os.getenv('EXPLANATION_MODE', 'inline').lower()
+    EXPLANATION_WORKERS = int(os.getenv('EXPLANATION_WORKERS', 2))
+    EXPLANATION_MAX_PENDING = int(os.getenv('EXPLANATION_MAX_PENDING', 256))
+    BATCH_EXPLAIN_BUDGET_MS = int(os.getenv('BATCH_EXPLAIN_BUDGET_MS', 5000))
+    
+    # Per-user behavioral biometric baselines
+    BIOMETRIC_PROFILE_MAX_USERS = int(os.getenv('BIOMETRIC_PROFILE_MAX_USERS', 100000))
+    BIOMETRIC_PROFILE_MIN_SESSIONS = int(os.getenv('BIOMETRIC_PROFILE_MIN_SESSIONS', 3))
+    
+    # Device fingerprint registry (fixed memory: 2^log2 bytes of registers + 10 bytes per pair)
+    DEVICE_REGISTRY_PATH = os.getenv('DEVICE_REGISTRY_PATH', './data/devices/')
+    DEVICE_REGISTRY_REGISTERS_LOG2 = int(os.getenv('DEVICE_REGISTRY_REGISTERS_LOG2', 24))
+    DEVICE_REGISTRY_MAX_PAIRS = int(os.getenv('DEVICE_REGISTRY_MAX_PAIRS', 4194304))
+    DEVICE_FARM_MIN_USERS = int(os.getenv('DEVICE_FARM_MIN_USERS', 50))
+    
+    # Streamed biometric sessions (Socket.IO)
+    BIOMETRIC_MAX_SESSIONS = int(os.getenv('BIOMETRIC_MAX_SESSIONS', 50000))
+    BIOMETRIC_SESSION_IDLE_SECONDS = int(os.getenv('BIOMETRIC_SESSION_IDLE_SECONDS', 600))
+    
+    # Precomputed /api/predict-patterns responses
+    PATTERN_FORECAST_HORIZONS = [int(d) for d in os.getenv('PATTERN_FORECAST_HORIZONS', '7,30,90').split(',')]
+    PATTERN_FORECAST_TTL_SECONDS = int(os.getenv('PATTERN_FORECAST_TTL_SECONDS', 900))
+    PATTERN_FORECAST_REFRESH_SECONDS = int(os.getenv('PATTERN_FORECAST_REFRESH_SECONDS', 60))
+    PATTERN_FORECAST_MAX_DAYS = int(os.getenv('PATTERN_FORECAST_MAX_DAYS', 365))
+    
+    # Geographic hotspots (grid memory: ~160 bytes per cell)
+    HOTSPOT_CELL_DEGREES = float(os.getenv('HOTSPOT_CELL_DEGREES', 0.5))
+    HOTSPOT_HALF_LIFE_HOURS = float(os.getenv('HOTSPOT_HALF_LIFE_HOURS', 24))
+    HOTSPOT_TREND_HALF_LIFE_HOURS = float(os.getenv('HOTSPOT_TREND_HALF_LIFE_HOURS', 3))
+    HOTSPOT_RISK_THRESHOLD = float(os.getenv('HOTSPOT_RISK_THRESHOLD', 0.75))
+    HOTSPOT_MIN_CELL_WEIGHT = float(os.getenv('HOTSPOT_MIN_CELL_WEIGHT', 3))
+    HOTSPOT_MAX_CELLS = int(os.getenv('HOTSPOT_MAX_CELLS', 65536))
     
     # Thresholds
     HIGH_RISK_THRESHOLD = float(os.getenv('HIGH_RISK_THRESHOLD', 0.8))
     MEDIUM_RISK_THRESHOLD = float(os.getenv('MEDIUM_RISK_THRESHOLD', 0.5))
     ALERT_THRESHOLD = float(os.getenv('ALERT_THRESHOLD', 0.75))
     
+    # Alert rules
+    ALERT_WINDOW_SECONDS = int(os.getenv('ALERT_WINDOW_SECONDS', 300))
+    ALERT_DEVICE_MIN_BLOCKS = int(os.getenv('ALERT_DEVICE_MIN_BLOCKS', 3))
+    ALERT_SPIKE_MARGIN = float(os.getenv('ALERT_SPIKE_MARGIN', 0.2))
+    ALERT_MAX_ACTIVE = int(os.getenv('ALERT_MAX_ACTIVE', 100))
+    # Transaction timestamps further ahead of the server clock are clamped
+    ALERT_MAX_CLOCK_SKEW_SECONDS = int(os.getenv('ALERT_MAX_CLOCK_SKEW_SECONDS', 60))
+    
     # Features
     ENABLE_REAL_TIME_MONITORING = os.getenv('ENABLE_REAL_TIME_MONITORING', 'true').lower() == 'true'
     ENABLE_BATCH_PROCESSING = os.getenv('ENABLE_BATCH_PROCESSING', 'true').lower() == 'true'
@@ -34,6 +102,19 @@ class Config:
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5000')
     
+    # Bulk ingestion
+    INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', 1000))
+    
+    # Bulk scoring jobs
+    JOBS_PATH = os.getenv('JOBS_PATH', './data/jobs/')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 0))  # 0 = one per CPU core
+    JOB_CHUNK_ROWS = int(os.getenv('JOB_CHUNK_ROWS', 10000))
+    
+    # Scored transaction store
+    SCORED_STORE_PATH = os.getenv('SCORED_STORE_PATH', './data/scored/')
+    SCORED_STORE_FLUSH_ROWS = int(os.getenv('SCORED_STORE_FLUSH_ROWS', 1024))
+    SCORED_STORE_HOURLY_RETENTION_DAYS = int(os.getenv('SCORED_STORE_HOURLY_RETENTION_DAYS', 90))
+    
     # Database
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///fraudshield.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -0,0 +1,156 @@
+"""
+Counterfactual Search - Smallest feature changes that move a decision below a threshold
+Candidates are scored against the real ensemble in one batch
+"""
+import itertools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Actionable changes: feature index -> candidate values in feature space.
+# Features derived from history or account age are not something a customer can change.
+ACTIONS = {
+    'amount': {
+        'features': [0],
+        'label': 'Reduce amount',
+        'candidates': lambda x: [[x[0] * factor] for factor in (0.75, 0.5, 0.25, 0.1)],
+        'describe': lambda values: f'${values[0] * 10000:,.2f}'
+    },
+    'merchant_category': {
+        'features': [1],
+        'label': 'Use a lower-risk merchant category',
+        'candidates': lambda x: [[risk] for risk in (0.5, 0.35, 0.2) if risk < x[1]],
+        'describe': lambda values: f'category risk {values[0]:.0%}'
+    },
+    'time_of_day': {
+        'features': [2, 14],
+        'label': 'Transact during daytime hours',
+        'candidates': lambda x: [[hour / 24.0, 0.0] for hour in (10, 14, 18)] if x[14] else [],
+        'describe': lambda values: f'{round(values[0] * 24):02d}:00'
+    },
+    'geographic_distance': {
+        'features': [7],
+        'label': 'Transact from the usual location',
+        'candidates': lambda x: [[0.0]] if x[7] > 0 else [],
+        'describe': lambda values: f'{values[0] * 180:.0f} degrees from last location'
+    },
+    'device_consistency': {
+        'features': [8],
+        'label': 'Use a recognised device',
+        'candidates': lambda x: [[0.8]] if x[8] < 0.8 else [],
+        'describe': lambda values: f'device consistency {values[0]:.0%}'
+    },
+    'mcc_code_risk': {
+        'features': [10],
+        'label': 'Use a standard merchant code',
+        'candidates': lambda x: [[0.3]] if x[10] > 0.3 else [],
+        'describe': lambda values: f'MCC risk {values[0]:.0%}'
+    }
+}
+
+# Fixed cost per changed action, so fewer changes win over many small ones
+CHANGE_PENALTY = 0.1
+
+
+class CounterfactualSearch:
+    """
+    Batched counterfactual search around one feature vector.
+
+    Every combination of up to ``max_changes`` actionable changes is
+    costed (feature-space distance plus a per-change penalty); the
+    ``budget`` cheapest are scored in a single ensemble call, and the
+    cheapest candidate under each decision threshold is returned. The
+    budget caps the batch size per row, which bounds worst-case latency.
+    """
+
+    def __init__(self, detector, budget: int = 256, max_changes: int = 3,
+                 thresholds: Optional[Dict[str, float]] = None):
+        self.detector = detector
+        self.budget = budget
+        self.max_changes = max_changes
+        self.thresholds = thresholds or {'REVIEW': 0.8, 'APPROVE': 0.5}
+
+    def search(self, features: np.ndarray, risk_score: float) -> List[Dict]:
+        """Cheapest change set reaching each threshold the current risk is above"""
+        return self.search_batch(np.atleast_2d(features), [risk_score])[0]
+
+    def search_batch(self, X: np.ndarray, risk_scores) -> List[List[Dict]]:
+        """Counterfactuals for many rows, with every row's candidates scored in one ensemble call"""
+        X = np.asarray(X, dtype=np.float64)
+        rows = []
+        for x, risk_score in zip(X, risk_scores):
+            targets = {name: t for name, t in self.thresholds.items() if risk_score > t}
+            rows.append((targets, self._candidates(x) if targets else []))
+
+        total = sum(len(candidates) for _, candidates in rows)
+        if total == 0:
+            return [[] for _ in rows]
+
+        X_candidates = np.empty((total, X.shape[1]))
+        offset = 0
+        for x, (_, candidates) in zip(X, rows):
+            X_candidates[offset:offset + len(candidates)] = x
+            for row, (_, changes) in enumerate(candidates, start=offset):
+                for name, values in changes:
+                    X_candidates[row, ACTIONS[name]['features']] = values
+            offset += len(candidates)
+        candidate_scores = self.detector.get_risk_scores(X_candidates)
+
+        results = []
+        offset = 0
+        for x, risk_score, (targets, candidates) in zip(X, risk_scores, rows):
+            scores = candidate_scores[offset:offset + len(candidates)]
+            offset += len(candidates)
+            found = []
+            for target, threshold in sorted(targets.items(), key=lambda item: -item[1]):
+                below = np.flatnonzero(scores < threshold)
+                if len(below) == 0:
+                    continue
+                row = below[0]  # Candidates are sorted by cost
+                found.append(self._describe(x, candidates[row][1], target, threshold,
+                                            float(risk_score), float(scores[row])))
+            results.append(found)
+        return results
+
+    def _candidates(self, x: np.ndarray) -> List:
+        """(cost, changes) for every change combination, cheapest first, capped at budget"""
+        options = {}
+        for name, action in ACTIONS.items():
+            values = action['candidates'](x)
+            if values:
+                options[name] = [
+                    (float(np.abs(np.asarray(v) - x[action['features']]).sum()), v) for v in values
+                ]
+
+        candidates = []
+        for size in range(1, min(self.max_changes, len(options)) + 1):
+            for names in itertools.combinations(options, size):
+                for choice in itertools.product(*(options[name] for name in names)):
+                    cost = sum(distance for distance, _ in choice) + CHANGE_PENALTY * size
+                    candidates.append((cost, [(name, v) for name, (_, v) in zip(names, choice)]))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        return candidates[:self.budget]
+
+    def _describe(self, x: np.ndarray, changes: List, target: str, threshold: float,
+                  risk_score: float, new_score: float) -> Dict:
+        details = []
+        for name, values in changes:
+            action = ACTIONS[name]
+            details.append({
+                'feature': name,
+                'action': action['label'],
+                'current': action['describe'](x[action['features']]),
+                'suggested': action['describe'](values)
+            })
+        return {
+            'target': target,
+            'threshold': threshold,
+            'change': '; '.join(f"{d['action']} ({d['current']} -> {d['suggested']})" for d in details),
+            'changes': details,
+            'current': f'Risk score {risk_score:.1%}',
+            'suggested': f'Risk score {new_score:.1%}',
+            'risk_score': round(new_score, 4),
+            'impact': f'Would reduce risk score by {(risk_score - new_score) * 100:.0f} points'
+        }
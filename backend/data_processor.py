@@ -82,6 +82,57 @@ class TransactionProcessor:
         
         return np.array(features)
     
+    def extract_features_batch(self, transactions):
+        """
+        Extract features for many transactions into an (n, 15) matrix
+        
+        Stateless features are computed column-wise; features that depend
+        on per-user history are evaluated row by row in input order so the
+        result matches calling extract_features on each transaction.
+        """
+        n = len(transactions)
+        X = np.empty((n, len(self.feature_names)), dtype=np.float64)
+        if n == 0:
+            return X
+        
+        now = datetime.now()
+        amounts = np.array([t.get('amount', 0) for t in transactions], dtype=np.float64)
+        X[:, 0] = np.clip(amounts / 10000.0, 0, 1)
+        X[:, 1] = [self._get_category_risk(t.get('merchant_category', 'unknown')) for t in transactions]
+        
+        timestamps = [self._to_datetime(t.get('timestamp', now), now) for t in transactions]
+        hours = np.array([dt.hour for dt in timestamps])
+        X[:, 2] = hours / 24.0
+        X[:, 3] = np.array([dt.weekday() for dt in timestamps]) / 7.0
+        X[:, 14] = ((hours >= 23) | (hours <= 5)).astype(np.float64)
+        
+        X[:, 6] = np.random.uniform(0, 1, n)  # Mock merchant velocity
+        X[:, [11, 12]] = np.random.uniform(0, 1, (n, 2))  # Mock velocity metrics
+        
+        account_ages = [(now - self._to_datetime(t.get('account_created', now), now)).days
+                        for t in transactions]
+        X[:, 9] = np.minimum(np.array(account_ages) / 730.0, 1.0)
+        X[:, 10] = [self._get_mcc_risk_score(t.get('mcc_code', '0000')) for t in transactions]
+        
+        # History-dependent features, in input order
+        for i, transaction in enumerate(transactions):
+            user_id = transaction.get('user_id', 'unknown')
+            X[i, 4] = self._get_transaction_frequency(user_id)
+            X[i, 5] = self._get_amount_deviation(user_id, amounts[i])
+            X[i, 7] = self._calculate_geographic_distance(
+                user_id, transaction.get('location', {'lat': 0, 'lon': 0})
+            )
+            X[i, 8] = self._get_device_consistency(user_id, transaction.get('device_id', 'unknown'))
+            X[i, 13] = self._get_amount_percentile(user_id, amounts[i])
+        
+        return X
+    
+    def _to_datetime(self, value, default):
+        """Coerce an ISO string or datetime to datetime"""
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value if isinstance(value, datetime) else default
+    
     def _normalize(self, value, min_val, max_val):
         """Normalize value between 0 and 1"""
         if max_val == min_val:
@@ -113,10 +164,8 @@ class TransactionProcessor:
         hour = dt.hour / 24.0  # Normalized hour
         day_of_week = dt.weekday() / 7.0  # Normalized day
         
-        # High-risk hours (late night, early morning)
-        high_risk_hours = 1.0 if (dt.hour >= 23 or dt.hour <= 5) else 0.0
-        
-        return [hour, day_of_week, high_risk_hours]
+        # High-risk hours are covered by late_night_flag
+        return [hour, day_of_week]
     
     def _get_transaction_frequency(self, user_id):
         """Get transaction frequency for user"""
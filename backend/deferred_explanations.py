@@ -0,0 +1,140 @@
+"""
+Deferred Explanations - Build FraudExplainer output off the decision path
+/api/predict returns a token; the explanation is computed on a worker pool
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from explanation_cache import cache_key
+
+
+class DeferredExplainer:
+    """
+    Queue explanations on a thread pool and track them by token.
+
+    Finished explanations are written to the shared ExplanationCache, so
+    /api/explain for the same transaction is a cache hit, and passed to
+    ``on_ready`` (e.g. a Socket.IO push). Token records are bounded; the
+    oldest are forgotten first. At most ``max_pending`` jobs are queued or
+    running; beyond that ``submit`` sheds the request instead of letting
+    the executor queue grow, and jobs whose token was forgotten while
+    queued are skipped.
+    """
+
+    def __init__(self, explainer, cache, max_workers: int = 2, max_tokens: int = 10000,
+                 on_ready: Optional[Callable[[Dict], None]] = None, max_pending: int = 256):
+        self.explainer = explainer
+        self.cache = cache
+        self.max_tokens = max_tokens
+        self.max_pending = max_pending
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='explain')
+        self._tokens = OrderedDict()  # token -> {'key', 'transaction_id', 'status', 'error', ...}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.shed = 0
+        self.skipped = 0
+
+    def submit(self, transaction: Dict, prediction: Dict, features) -> Optional[str]:
+        """Queue an explanation and return its token, or None if the backlog is full"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.shed += 1
+                return None
+            self._pending += 1
+
+        token = uuid.uuid4().hex
+        record = {
+            'key': cache_key(transaction),
+            'transaction_id': transaction.get('transaction_id'),
+            'status': 'pending',
+            'error': None,
+            'submitted_at': time.time(),
+            'ready_at': None
+        }
+        with self._lock:
+            self._tokens[token] = record
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+
+        self.cache.put(record['key'], features=features, prediction=prediction)
+        try:
+            self._executor.submit(self._explain, token, record, transaction, prediction, features)
+        except RuntimeError:
+            # Executor already shut down
+            with self._lock:
+                self._pending -= 1
+                self._tokens.pop(token, None)
+            return None
+        return token
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Status of a token, with the explanation once ready"""
+        with self._lock:
+            record = self._tokens.get(token)
+            if record is None:
+                return None
+            record = dict(record)
+
+        status = {
+            'token': token,
+            'transaction_id': record['transaction_id'],
+            'status': record['status'],
+            'error': record['error']
+        }
+        if record['status'] == 'ready':
+            entry = self.cache.get(record['key'])
+            if entry is None or entry['explanation'] is None:
+                # Evicted or expired since it was built
+                status.update(status='expired')
+            else:
+                status['explanation'] = entry['explanation']
+                status['latency_ms'] = round((record['ready_at'] - record['submitted_at']) * 1000, 1)
+        return status
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'shed': self.shed,
+                'skipped': self.skipped,
+                'tokens': len(self._tokens)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _explain(self, token: str, record: Dict, transaction: Dict, prediction: Dict, features):
+        with self._lock:
+            if token not in self._tokens:
+                # Forgotten while queued; nobody can fetch the result
+                self._pending -= 1
+                self.skipped += 1
+                return
+
+        try:
+            explanation = self.explainer.explain_prediction(transaction, prediction, features)
+            self.cache.put(record['key'], features=features, prediction=prediction, explanation=explanation)
+            with self._lock:
+                record.update(status='ready', ready_at=time.time())
+        except Exception as e:
+            with self._lock:
+                record.update(status='failed', error=str(e), ready_at=time.time())
+            explanation = None
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        if self.on_ready is not None:
+            self.on_ready({
+                'token': token,
+                'transaction_id': record['transaction_id'],
+                'status': record['status'],
+                'error': record['error'],
+                'explanation': explanation
+            })
@@ -0,0 +1,248 @@
+"""
+Device Registry - Server-side record of device fingerprints
+Known (user, device) pairs in a bucketed hash table and distinct users per
+fingerprint in a shared-register HyperLogLog, both in fixed memory
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+
+SLOTS_PER_BUCKET = 8
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash (unlike hash(), identical across processes and restarts)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """Murmur3 finalizer, used to derive a second independent hash"""
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xFF51AFD7ED558CCD)
+    h = h ^ (h >> np.uint64(33))
+    h = h * np.uint64(0xC4CEB9FE1A85EC53)
+    return h ^ (h >> np.uint64(33))
+
+
+def _hll_estimate(inverse_sum, zeros, m: int):
+    """HyperLogLog cardinality from sum(2^-register) and the empty-register count (scalars or arrays)"""
+    inverse_sum = np.asarray(inverse_sum, dtype=np.float64)
+    zeros = np.asarray(zeros)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / inverse_sum
+    linear = m * np.log(m / np.maximum(zeros, 1))  # Linear counting for small cardinalities
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class DeviceRegistry:
+    """
+    Fixed-memory fingerprint registry.
+
+    Known devices: (user, fingerprint) pairs hash to a bucket of
+    ``SLOTS_PER_BUCKET`` 64-bit tags, so lookup is one bucket compare. When
+    a bucket is full the least recently seen pair is overwritten, which
+    ages out stale devices instead of growing.
+
+    Distinct users per fingerprint: a virtual HyperLogLog (vHLL). Every
+    fingerprint owns ``virtual_registers`` registers drawn pseudo-randomly
+    from one shared array of 2^registers_log2 uint8 registers. The noise
+    other fingerprints add to shared registers is estimated from the whole
+    array and subtracted. Running totals over the array keep that O(1).
+
+    With ``path`` set, the tables are memory-mapped files and survive
+    restarts; otherwise they live in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, registers_log2: int = 24, virtual_registers: int = 128,
+                 max_pairs: int = 1 << 22, farm_min_users: int = 50):
+        if virtual_registers & (virtual_registers - 1) or not 16 <= virtual_registers <= 256:
+            raise ValueError('virtual_registers must be a power of two between 16 and 256')
+        self.path = path
+        self.m = 1 << registers_log2
+        self.s = virtual_registers
+        self.buckets = max(1, max_pairs // SLOTS_PER_BUCKET)
+        self.farm_min_users = farm_min_users
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+        self.registers = self._open('registers', (self.m,), np.uint8)
+        self.pair_tags = self._open('pair_tags', (self.buckets, SLOTS_PER_BUCKET), np.uint64)
+        self.pair_seen = self._open('pair_seen', (self.buckets, SLOTS_PER_BUCKET), np.uint16)
+
+        # Running totals over all registers for the global noise estimate
+        self._inverse_sum = float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        self._zeros = int(np.count_nonzero(self.registers == 0))
+
+    # ==================== Known devices ====================
+    def is_known(self, user_id: str, fingerprint: str) -> bool:
+        """Whether this user has been verified on this device before"""
+        tags, buckets = self._pair_slots(np.array([hash64(user_id)], dtype=np.uint64),
+                                         np.array([hash64(fingerprint)], dtype=np.uint64))
+        with self._lock:
+            return bool((self.pair_tags[buckets[0]] == tags[0]).any())
+
+    def remember(self, user_id: str, fingerprint: str):
+        """Record a verified (user, device) pair"""
+        tags, buckets = self._pair_slots(np.array([hash64(user_id)], dtype=np.uint64),
+                                         np.array([hash64(fingerprint)], dtype=np.uint64))
+        tag, bucket = tags[0], buckets[0]
+        day = int(time.time() // 86400) & 0xFFFF
+        with self._lock:
+            row = self.pair_tags[bucket]
+            hit = np.flatnonzero(row == tag)
+            if len(hit):
+                slot = hit[0]
+            else:
+                slot = int(np.argmin(self.pair_seen[bucket]))  # Empty slots have seen == 0
+                if row[slot] != 0:
+                    self.evictions += 1
+                row[slot] = tag
+            self.pair_seen[bucket, slot] = day
+
+    # ==================== Distinct users per device ====================
+    def observe(self, user_id: str, fingerprint: str):
+        """Count a user against a fingerprint; repeats of the same pair change nothing"""
+        self.observe_hashes(np.array([hash64(fingerprint)], dtype=np.uint64),
+                            np.array([hash64(user_id)], dtype=np.uint64))
+
+    def observe_hashes(self, fingerprint_hashes: np.ndarray, user_hashes: np.ndarray):
+        """Vectorized observe over hash64() values, e.g. for backfills"""
+        fingerprint_hashes = np.asarray(fingerprint_hashes, dtype=np.uint64)
+        user_hashes = np.asarray(user_hashes, dtype=np.uint64)
+        virtual = user_hashes & np.uint64(self.s - 1)
+        rank = self._rank(user_hashes)
+        index = self._register_index(fingerprint_hashes, virtual)
+
+        # Keep the highest rank per register, then apply only the increases
+        order = np.lexsort((rank, index))
+        index, rank = index[order], rank[order]
+        last = np.ones(len(index), dtype=bool)
+        last[:-1] = index[1:] != index[:-1]
+        index, rank = index[last], rank[last]
+
+        with self._lock:
+            old = self.registers[index]
+            raised = rank > old
+            if not raised.any():
+                return
+            index, rank, old = index[raised], rank[raised], old[raised]
+            self._inverse_sum += float(np.ldexp(1.0, -rank.astype(np.int32)).sum() -
+                                       np.ldexp(1.0, -old.astype(np.int32)).sum())
+            self._zeros -= int(np.count_nonzero(old == 0))
+            self.registers[index] = rank
+
+    def distinct_users(self, fingerprint: str) -> int:
+        """Estimated number of distinct users seen on a fingerprint"""
+        return int(self.distinct_users_hashes(np.array([hash64(fingerprint)], dtype=np.uint64))[0])
+
+    def distinct_users_hashes(self, fingerprint_hashes: np.ndarray) -> np.ndarray:
+        """
+        Vectorized distinct_users over hash64() values.
+        Register sums use cumsum so every row is summed in the same order
+        whatever the batch size, keeping single and batch lookups identical.
+        """
+        fingerprint_hashes, rows = np.unique(np.asarray(fingerprint_hashes, dtype=np.uint64), return_inverse=True)
+        index = self._register_index(fingerprint_hashes[:, None], np.arange(self.s, dtype=np.uint64)[None, :])
+        with self._lock:
+            registers = self.registers[index]
+            inverse_sum, zeros = self._inverse_sum, self._zeros
+
+        local = _hll_estimate(np.cumsum(np.ldexp(1.0, -registers.astype(np.int32)), axis=1)[:, -1],
+                              np.count_nonzero(registers == 0, axis=1), self.s)
+        noise = _hll_estimate(inverse_sum, zeros, self.m)
+        estimate = self.m * self.s / (self.m - self.s) * (local / self.s - noise / self.m)
+        return np.maximum(np.rint(estimate), 0).astype(np.int64)[rows]
+
+    def check(self, user_id: Optional[str], fingerprint: str) -> Dict:
+        """Count this user on the device, then report whether it is known and how shared it is"""
+        result = self.check_batch([user_id], [fingerprint])
+        return {name: values[0].item() for name, values in result.items()}
+
+    def check_batch(self, user_ids, fingerprints) -> Dict[str, np.ndarray]:
+        """check() for many sessions: all users are counted first, then every row is looked up"""
+        fingerprint_hash = {fp: hash64(fp) for fp in set(fingerprints)}
+        fingerprint_hashes = np.array([fingerprint_hash[fp] for fp in fingerprints], dtype=np.uint64)
+        user_hash = {u: hash64(u) for u in set(user_ids) if u}
+        user_hashes = np.array([user_hash.get(u, 0) for u in user_ids], dtype=np.uint64)
+        named = np.array([bool(u) and u != 'anonymous' for u in user_ids], dtype=bool)
+        if named.any():
+            self.observe_hashes(fingerprint_hashes[named], user_hashes[named])
+
+        tags, buckets = self._pair_slots(user_hashes, fingerprint_hashes)
+        with self._lock:
+            known = (self.pair_tags[buckets] == tags[:, None]).any(axis=1) & named
+
+        users = self.distinct_users_hashes(fingerprint_hashes)
+        return {
+            'is_known_device': known,
+            'distinct_users': users,
+            'device_farm': users >= self.farm_min_users
+        }
+
+    # ==================== Housekeeping ====================
+    def flush(self):
+        with self._lock:
+            for table in (self.registers, self.pair_tags, self.pair_seen):
+                if isinstance(table, np.memmap):
+                    table.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pairs = int(np.count_nonzero(self.pair_tags))
+            estimate = float(_hll_estimate(self._inverse_sum, self._zeros, self.m))
+        return {
+            'known_pairs': pairs,
+            'pair_capacity': self.buckets * SLOTS_PER_BUCKET,
+            'pair_evictions': self.evictions,
+            'observations_estimate': int(estimate),
+            'registers': self.m,
+            'virtual_registers': self.s,
+            'farm_min_users': self.farm_min_users,
+            'memory_bytes': self.registers.nbytes + self.pair_tags.nbytes + self.pair_seen.nbytes
+        }
+
+    def _pair_slots(self, user_hashes: np.ndarray, fingerprint_hashes: np.ndarray):
+        """64-bit tag and bucket of each (user, fingerprint) pair"""
+        pair = _mix64(fingerprint_hashes ^ _mix64(user_hashes))
+        tags = pair | np.uint64(1)  # Zero marks an empty slot
+        buckets = ((pair >> np.uint64(32)) % np.uint64(self.buckets)).astype(np.int64)
+        return tags, buckets
+
+    def _register_index(self, fingerprint_hashes: np.ndarray, virtual: np.ndarray) -> np.ndarray:
+        """Shared-array position of virtual register j of a fingerprint (double hashing)"""
+        step = _mix64(fingerprint_hashes) | np.uint64(1)
+        return (fingerprint_hashes + virtual * step) & np.uint64(self.m - 1)
+
+    def _rank(self, user_hashes: np.ndarray) -> np.ndarray:
+        """1 + leading zeros of the 56 bits left after the virtual-register bits"""
+        remaining = (user_hashes >> np.uint64(8)).astype(np.float64)
+        bit_length = np.frexp(remaining)[1]
+        return (57 - bit_length).astype(np.uint8)
+
+    def _open(self, name: str, shape, dtype) -> np.ndarray:
+        if self.path is None:
+            return np.zeros(shape, dtype=dtype)
+
+        os.makedirs(self.path, exist_ok=True)
+        file = os.path.join(self.path, f'{name}.bin')
+        meta_file = os.path.join(self.path, f'{name}.json')
+        layout = {'shape': list(shape), 'dtype': np.dtype(dtype).name}
+        existing = None
+        if os.path.exists(meta_file) and os.path.exists(file):
+            with open(meta_file) as f:
+                existing = json.load(f)
+        if existing == layout:
+            return np.memmap(file, dtype=dtype, mode='r+', shape=shape)
+
+        if existing is not None:
+            print(f"Device registry table {name} resized from {existing['shape']} to {list(shape)}; starting empty")
+        table = np.memmap(file, dtype=dtype, mode='w+', shape=shape)
+        with open(meta_file, 'w') as f:
+            json.dump(layout, f)
+        return table
@@ -1,29 +1,30 @@
 """
 AI Explainability Module - Provides detailed explanations for fraud predictions
 """
+import time
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
+from feature_attribution import top_attributions
 
 class FraudExplainer:
     """Generates human-readable explanations for fraud detection decisions"""
     
-    def __init__(self):
-        self.feature_importance = {
-            'amount_zscore': 0.18,
-            'transaction_hour': 0.12,
-            'merchant_risk_score': 0.15,
-            'days_since_last_transaction': 0.08,
-            'distance_from_home': 0.14,
-            'velocity_1h': 0.11,
-            'velocity_24h': 0.09,
-            'is_international': 0.07,
-            'unusual_time': 0.06
-        }
+    def __init__(self, detector=None, feature_names: List[str] = None, case_index=None,
+                 counterfactual_search=None):
+        self.detector = detector
+        self.feature_names = feature_names or []
+        self.case_index = case_index
+        self.counterfactual_search = counterfactual_search
     
-    def explain_prediction(self, transaction_data: Dict, prediction: Dict) -> Dict:
+    def explain_prediction(self, transaction_data: Dict, prediction: Dict, features=None,
+                           feature_impacts: Optional[Dict[str, float]] = None,
+                           counterfactuals: Optional[List[Dict]] = None) -> Dict:
         """
         Generate detailed explanation for a fraud prediction
+        `features` is the model feature vector used for per-feature attributions;
+        precomputed `feature_impacts` and `counterfactuals` (e.g. from a batch)
+        are used as given
         """
         risk_score = prediction.get('risk_score', 0)
         is_fraud = prediction.get('is_fraud', False)
@@ -35,10 +36,12 @@ class FraudExplainer:
         contributing_factors = self._get_contributing_factors(transaction_data)
         
         # Generate counterfactuals (what would make it legitimate?)
-        counterfactuals = self._generate_counterfactuals(transaction_data, is_fraud)
+        if counterfactuals is None:
+            counterfactuals = self._generate_counterfactuals(features, risk_score)
         
-        # SHAP-like values for each feature
-        feature_impacts = self._calculate_feature_impacts(transaction_data, risk_score)
+        # Per-feature contributions from the trained ensemble
+        if feature_impacts is None:
+            feature_impacts = self._calculate_feature_impacts(features)
         
         explanation = {
             'decision': 'FRAUD' if is_fraud else 'LEGITIMATE',
@@ -49,11 +52,60 @@ class FraudExplainer:
             'feature_impacts': feature_impacts,
             'counterfactuals': counterfactuals,
             'model_reasoning': self._generate_reasoning(transaction_data, risk_score),
-            'similar_cases': self._find_similar_cases(transaction_data)
+            'similar_cases': self._find_similar_cases(features)
         }
         
         return explanation
     
+    def explain_batch(self, transactions: List[Dict], predictions: List[Dict], X: np.ndarray,
+                      probabilities: Optional[np.ndarray] = None, deadline: Optional[float] = None,
+                      max_chunk_rows: int = 256) -> List[Optional[Dict]]:
+        """
+        Explain many transactions, computing attributions and counterfactuals
+        for a chunk of rows at a time
+        
+        Stops once time.monotonic() passes `deadline`; rows not reached are None.
+        Chunks start small and are sized from the measured per-row cost so the
+        last chunk finishes close to the deadline.
+        """
+        explanations = [None] * len(transactions)
+        attribute = self.detector is not None and self.detector.is_loaded()
+        chunk_rows = 8
+        start = 0
+        
+        while start < len(transactions):
+            chunk_start = time.monotonic()
+            if deadline is not None and chunk_start >= deadline:
+                break
+            end = min(start + chunk_rows, len(transactions))
+            
+            values = None
+            if attribute:
+                values = self.detector.get_feature_attributions(
+                    X[start:end], None if probabilities is None else probabilities[start:end]
+                )['values']
+            
+            counterfactuals = [[] for _ in range(start, end)]
+            if self.counterfactual_search is not None:
+                counterfactuals = self.counterfactual_search.search_batch(
+                    X[start:end], [p['risk_score'] for p in predictions[start:end]]
+                )
+            
+            for i in range(start, end):
+                impacts = top_attributions(values[i - start], self.feature_names) if attribute else {}
+                explanations[i] = self.explain_prediction(transactions[i], predictions[i], X[i],
+                                                          impacts, counterfactuals[i - start])
+            
+            per_row = (time.monotonic() - chunk_start) / (end - start)
+            start = end
+            if deadline is None:
+                chunk_rows = max_chunk_rows
+            else:
+                remaining = deadline - time.monotonic()
+                chunk_rows = int(np.clip(remaining / per_row, 1, max_chunk_rows)) if per_row > 0 else max_chunk_rows
+        
+        return explanations
+    
     def _generate_decision_path(self, data: Dict, risk_score: float) -> List[Dict]:
         """Generate the decision tree path taken"""
         path = []
@@ -161,59 +213,20 @@ class FraudExplainer:
         
         return sorted(factors, key=lambda x: x['weight'], reverse=True)
     
-    def _generate_counterfactuals(self, data: Dict, is_fraud: bool) -> List[Dict]:
-        """Generate what-if scenarios"""
-        counterfactuals = []
-        
-        if is_fraud:
-            counterfactuals.append({
-                'change': 'Reduce amount to $250',
-                'current': f"${data.get('amount', 0):.2f}",
-                'suggested': '$250.00',
-                'impact': 'Would reduce risk score by 35%'
-            })
-            
-            counterfactuals.append({
-                'change': 'Use familiar merchant',
-                'current': f"Risk score {data.get('merchant_risk_score', 0):.1%}",
-                'suggested': 'Merchant with <20% risk',
-                'impact': 'Would reduce risk score by 28%'
-            })
-            
-            if data.get('is_international', False):
-                counterfactuals.append({
-                    'change': 'Transaction from home country',
-                    'current': 'International',
-                    'suggested': 'Domestic',
-                    'impact': 'Would reduce risk score by 22%'
-                })
+    def _generate_counterfactuals(self, features, risk_score: float) -> List[Dict]:
+        """Generate what-if scenarios scored against the ensemble"""
+        if self.counterfactual_search is None or features is None:
+            return []
         
-        return counterfactuals
+        return self.counterfactual_search.search(features, risk_score)
     
-    def _calculate_feature_impacts(self, data: Dict, risk_score: float) -> Dict[str, float]:
-        """Calculate SHAP-like impact values for each feature"""
-        baseline = 0.15  # baseline risk score
-        
-        impacts = {}
-        
-        # Amount impact
-        amount_zscore = (data.get('amount', 0) - 500) / 300
-        impacts['amount'] = amount_zscore * 0.18 if amount_zscore > 0 else 0
+    def _calculate_feature_impacts(self, features) -> Dict[str, float]:
+        """Per-feature contributions to the risk score, largest magnitude first"""
+        if self.detector is None or features is None or not self.detector.is_loaded():
+            return {}
         
-        # Merchant risk impact
-        impacts['merchant_risk'] = data.get('merchant_risk_score', 0) * 0.15
-        
-        # Location impact
-        impacts['international'] = 0.14 if data.get('is_international', False) else -0.05
-        
-        # Time impact
-        hour = data.get('transaction_hour', 12)
-        impacts['unusual_time'] = 0.12 if (hour < 6 or hour > 23) else -0.03
-        
-        # Velocity impact
-        impacts['velocity'] = min(data.get('velocity_1h', 0) / 10, 0.15)
-        
-        return impacts
+        attributions = self.detector.get_feature_attributions(np.asarray(features).reshape(1, -1))
+        return top_attributions(attributions['values'][0], self.feature_names)
     
     def _generate_reasoning(self, data: Dict, risk_score: float) -> str:
         """Generate human-readable reasoning"""
@@ -238,29 +251,10 @@ class FraudExplainer:
                 f"Only {risk_score:.1%} fraud probability detected."
             )
     
-    def _find_similar_cases(self, data: Dict) -> List[Dict]:
-        """Find similar historical cases"""
-        # Simulated similar cases
-        return [
-            {
-                'case_id': 'TXN_87234',
-                'similarity': 0.94,
-                'outcome': 'CONFIRMED_FRAUD',
-                'amount': data.get('amount', 0) * 0.95,
-                'date': '2026-01-15'
-            },
-            {
-                'case_id': 'TXN_91057',
-                'similarity': 0.87,
-                'outcome': 'CONFIRMED_FRAUD',
-                'amount': data.get('amount', 0) * 1.1,
-                'date': '2026-01-12'
-            },
-            {
-                'case_id': 'TXN_76543',
-                'similarity': 0.82,
-                'outcome': 'FALSE_POSITIVE',
-                'amount': data.get('amount', 0) * 0.88,
-                'date': '2026-01-10'
-            }
-        ]
+    def _find_similar_cases(self, features, k: int = 3) -> List[Dict]:
+        """Find the most similar labeled historical cases"""
+        if self.case_index is None or self.detector is None or features is None or not len(self.case_index):
+            return []
+        
+        scaled = self.detector.scaler.transform(np.asarray(features).reshape(1, -1))
+        return self.case_index.search(scaled[0], k=k)
@@ -0,0 +1,101 @@
+"""
+Explanation Cache - LRU/TTL cache of scored results and explanations
+Lets /api/explain reuse the features and scores computed by /api/predict
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def cache_key(transaction: Dict) -> str:
+    """transaction_id plus a digest of the full payload, so edited resubmissions miss"""
+    payload = json.dumps(transaction, sort_keys=True, default=str).encode()
+    return f"{transaction.get('transaction_id')}:{hashlib.sha1(payload).hexdigest()}"
+
+
+class ExplanationCache:
+    """
+    Thread-safe LRU cache with per-entry TTL.
+
+    Each entry holds the feature vector, the scored prediction and, once
+    built, the explanation. Bounded by entry count and by an estimate of
+    the bytes held; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 900, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> {'expires', 'bytes', 'features', 'prediction', 'explanation'}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached entry for a key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] < time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key: str, **fields):
+        """Insert or update an entry's fields, refreshing its TTL"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = {'features': None, 'prediction': None, 'explanation': None}
+            else:
+                self._bytes -= entry['bytes']
+            entry.update(fields)
+            entry['expires'] = time.monotonic() + self.ttl_seconds
+            entry['bytes'] = self._estimate_bytes(entry)
+
+            self._entries[key] = entry
+            self._bytes += entry['bytes']
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the served models change"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit rate, size and memory metrics"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['bytes']
+
+    def _estimate_bytes(self, entry: Dict) -> int:
+        size = len(json.dumps([entry['prediction'], entry['explanation']], default=str))
+        if isinstance(entry['features'], np.ndarray):
+            size += entry['features'].nbytes
+        return size
@@ -1,16 +1,25 @@
 """
 Fraud Pattern Predictor - Predicts emerging fraud patterns
 """
+import hashlib
+import json
+import time
 import numpy as np
-from typing import Dict, List
-from datetime import datetime, timedelta
-import random
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
+
+from geo_hotspots import HotspotDetector
+from risk_forecaster import RiskForecaster
 
 class FraudPatternPredictor:
     """Predicts emerging fraud patterns and trends"""
     
-    def __init__(self):
-        self.historical_patterns = self._load_historical_patterns()
+    def __init__(self, store=None, forecaster: Optional[RiskForecaster] = None,
+                 hotspots: Optional[HotspotDetector] = None, top_hotspots: int = 10):
+        self.store = store
+        self.forecaster = forecaster if forecaster is not None else RiskForecaster()
+        self.hotspots = hotspots
+        self.top_hotspots = top_hotspots
         
     def predict_emerging_patterns(self, days_ahead: int = 30) -> Dict:
         """
@@ -27,11 +36,30 @@ class FraudPatternPredictor:
             'attack_vectors': self._predict_attack_vectors(),
             'geographic_hotspots': self._predict_geographic_hotspots(),
             'vulnerability_forecast': self._predict_vulnerabilities(),
-            'prevention_recommendations': self._generate_prevention_strategies()
+            'prevention_recommendations': self._generate_prevention_strategies(),
+            'forecast_model': self.forecaster.summary()
         }
         
         return predictions
     
+    def data_version(self) -> tuple:
+        """
+        Changes whenever a fresh prediction would differ materially
+        The forecaster only consumes complete hours; hotspots count as changed when their
+        ranking, extent or trend changes, not on every event that nudges a volume
+        """
+        return (int(time.time() // 3600), self._hotspot_version())
+    
+    def _hotspot_version(self) -> str:
+        """Digest of which hotspots are reported, where, and how they trend"""
+        if self.hotspots is None:
+            return ''
+        shape = [
+            (hotspot['bounds'], hotspot['cells'], hotspot['trend'], hotspot['primary_fraud_types'])
+            for hotspot in self.hotspots.hotspots(self.top_hotspots)
+        ]
+        return hashlib.sha1(json.dumps(shape).encode()).hexdigest()
+    
     def _predict_emerging_threats(self) -> List[Dict]:
         """Predict new fraud techniques that may emerge"""
         threats = [
@@ -100,45 +128,47 @@ class FraudPatternPredictor:
         return sorted(threats, key=lambda x: x['probability'], reverse=True)
     
     def _generate_risk_timeline(self, days: int) -> List[Dict]:
-        """Generate day-by-day risk forecast"""
+        """
+        Day-by-day risk forecast from the hourly seasonal/trend forecaster
+        Days start at local midnight today; peak hours are the day's forecast top fraud hours
+        """
+        self._refresh_forecaster()
+        today = datetime.combine(date.today(), datetime.min.time())
+        forecast = self.forecaster.forecast(int(today.timestamp() // 3600), days * 24)
+        risk = forecast['risk'].reshape(days, 24)
+        fraud = forecast['fraud'].reshape(days, 24)
+        volume = forecast['volume'].reshape(days, 24)
+
+        # Average risk per transaction, weighted by the expected volume of each hour
+        weights = volume + 1e-9
+        daily_risk = (risk * weights).sum(axis=1) / weights.sum(axis=1)
+        daily_fraud = fraud.sum(axis=1)
+        daily_volume = volume.sum(axis=1)
+        peak_hours = np.sort(np.argsort(-fraud, axis=1, kind='stable')[:, :7], axis=1)
+
         timeline = []
-        base_risk = 0.15
-        
         for day in range(days):
-            date = datetime.now() + timedelta(days=day)
-            
-            # Simulate risk variations
-            day_of_week = date.weekday()
-            
-            # Higher risk on weekends and holidays
-            risk_modifier = 1.0
-            if day_of_week >= 5:  # Weekend
-                risk_modifier = 1.3
-            
-            # Month-end spike
-            if date.day >= 28:
-                risk_modifier *= 1.2
-            
-            # Holiday season
-            if date.month == 12:
-                risk_modifier *= 1.4
-            
-            # Add some randomness
-            risk_modifier *= random.uniform(0.9, 1.1)
-            
-            daily_risk = min(base_risk * risk_modifier, 0.95)
-            
+            day_date = today + timedelta(days=day)
             timeline.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'day_of_week': date.strftime('%A'),
-                'risk_score': round(daily_risk, 3),
-                'risk_level': self._categorize_risk(daily_risk),
-                'expected_fraud_volume': int(1000 * daily_risk),
-                'peak_hours': self._predict_peak_hours(date)
+                'date': day_date.strftime('%Y-%m-%d'),
+                'day_of_week': day_date.strftime('%A'),
+                'risk_score': round(float(daily_risk[day]), 3),
+                'risk_level': self._categorize_risk(daily_risk[day]),
+                'expected_fraud_volume': int(round(daily_fraud[day])),
+                'expected_transactions': int(round(daily_volume[day])),
+                'peak_hours': (peak_hours[day].tolist() if self.forecaster.fitted
+                               else self._predict_peak_hours(day_date))
             })
         
         return timeline
     
+    def _refresh_forecaster(self):
+        """Fit the forecaster on complete hours added to the store since the last refresh"""
+        if self.store is None:
+            return
+        current_hour = int(time.time() // 3600)
+        self.forecaster.refresh(self.store.hourly_series(since_hour=self.forecaster.last_hour), current_hour)
+    
     def _predict_targeted_sectors(self) -> List[Dict]:
         """Predict which sectors will be targeted"""
         return [
@@ -222,41 +252,10 @@ class FraudPatternPredictor:
         ]
     
     def _predict_geographic_hotspots(self) -> List[Dict]:
-        """Predict geographic fraud hotspots"""
-        return [
-            {
-                'region': 'Eastern Europe',
-                'country_codes': ['RO', 'BG', 'UA'],
-                'risk_score': 0.87,
-                'trend': 'INCREASING',
-                'primary_fraud_types': ['Card fraud', 'Identity theft'],
-                'estimated_attacks': 23000
-            },
-            {
-                'region': 'Southeast Asia',
-                'country_codes': ['VN', 'PH', 'ID'],
-                'risk_score': 0.73,
-                'trend': 'STABLE',
-                'primary_fraud_types': ['Mobile fraud', 'App fraud'],
-                'estimated_attacks': 18500
-            },
-            {
-                'region': 'West Africa',
-                'country_codes': ['NG', 'GH', 'CI'],
-                'risk_score': 0.79,
-                'trend': 'INCREASING',
-                'primary_fraud_types': ['Romance scams', 'BEC'],
-                'estimated_attacks': 12300
-            },
-            {
-                'region': 'South America',
-                'country_codes': ['BR', 'AR', 'CO'],
-                'risk_score': 0.64,
-                'trend': 'DECREASING',
-                'primary_fraud_types': ['Credit card fraud', 'Digital wallet'],
-                'estimated_attacks': 15600
-            }
-        ]
+        """Ranked clusters of recent high-risk transaction locations"""
+        if self.hotspots is None:
+            return []
+        return self.hotspots.hotspots(self.top_hotspots)
     
     def _predict_vulnerabilities(self) -> List[Dict]:
         """Predict system vulnerabilities that will be exploited"""
@@ -338,12 +337,3 @@ class FraudPatternPredictor:
             return 'HIGH'
         else:
             return 'CRITICAL'
-    
-    def _load_historical_patterns(self) -> Dict:
-        """Load historical fraud patterns"""
-        # Simulated historical data
-        return {
-            'patterns': [],
-            'trends': [],
-            'seasonality': {}
-        }
@@ -0,0 +1,299 @@
+"""
+Geo Hotspots - Incremental grid-based density clustering of high-risk transaction locations
+Cells hold exponentially decayed counts; dense neighbouring cells are joined into ranked hotspots
+"""
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+# Forward neighbours; with their mirror images these cover all 8 surrounding cells
+NEIGHBOUR_OFFSETS = ((0, 1), (1, -1), (1, 0), (1, 1))
+# Landmark is moved forward before decay factors can overflow float64
+MAX_EXPONENT = 512
+MAX_LABELS = 1024
+
+
+def transaction_location(transaction: Dict) -> Optional[tuple]:
+    """(lat, lon) from a 'location' dict or latitude/longitude fields, or None"""
+    location = transaction.get('location')
+    if isinstance(location, dict):
+        lat, lon = location.get('lat'), location.get('lon', location.get('lng'))
+    else:
+        lat, lon = transaction.get('latitude'), transaction.get('longitude')
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+class HotspotDetector:
+    """
+    Decayed density grid over high-risk transactions.
+
+    The globe is split into ``cell_degrees`` cells. Each cell keeps
+    forward-decayed sums (weights grow as 2^(t / half_life) from a
+    landmark, so no per-cell decay is needed on update): event weight at
+    ``half_life_hours`` and at the shorter ``trend_half_life_hours``,
+    latitude, longitude (as cos/sin, so clusters may cross the
+    antimeridian) and risk sums, plus the last fraud type and country seen.
+
+    Cost per event: one dict lookup and eight array writes, O(1). When all
+    ``max_cells`` slots are used, the lightest eighth is evicted in one
+    O(max_cells) pass, and the landmark is moved every few hundred short
+    half-lives with one more pass, so both amortize to O(1).
+
+    Memory: arrays of ``max_cells`` entries (six float64, two int16 and
+    an int64 key; 60 bytes per cell) plus ~100 bytes per occupied cell for
+    the key -> slot dict. The default 65536 cells is roughly 10 MB.
+
+    Clustering happens at query time: cells whose decayed weight reaches
+    ``min_cell_weight`` are dense, and 8-connected dense cells form one
+    hotspot (connected components on the sparse adjacency, O(n log n)).
+    """
+
+    def __init__(self, cell_degrees: float = 0.5, half_life_hours: float = 24.0,
+                 trend_half_life_hours: float = 3.0, risk_threshold: float = 0.75,
+                 min_cell_weight: float = 3.0, max_cells: int = 65536):
+        self.cell_degrees = cell_degrees
+        self.rows = int(math.ceil(180.0 / cell_degrees)) + 1
+        self.cols = int(math.ceil(360.0 / cell_degrees))
+        self.half_life = half_life_hours * 3600.0
+        self.trend_half_life = trend_half_life_hours * 3600.0
+        self.risk_threshold = risk_threshold
+        self.min_cell_weight = min_cell_weight
+        self.max_cells = max_cells
+
+        self._weight = np.zeros(max_cells)
+        self._trend_weight = np.zeros(max_cells)
+        self._lat_sum = np.zeros(max_cells)
+        self._lon_cos = np.zeros(max_cells)
+        self._lon_sin = np.zeros(max_cells)
+        self._risk_sum = np.zeros(max_cells)
+        self._fraud_type = np.full(max_cells, -1, dtype=np.int16)
+        self._country = np.full(max_cells, -1, dtype=np.int16)
+        self._keys = np.full(max_cells, -1, dtype=np.int64)
+        self._slots = {}  # cell key -> slot
+        self._free = list(range(max_cells - 1, -1, -1))
+        self._labels = {'fraud_type': [], 'country': []}
+        self._label_codes = {'fraud_type': {}, 'country': {}}
+        self._landmark = None
+        self._first_event = None
+        self._lock = threading.Lock()
+        self.events = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def observe(self, transaction: Dict, result: Dict, now: Optional[float] = None) -> bool:
+        """Fold one scored transaction in; only high-risk ones with a location count"""
+        risk_score = float(result.get('risk_score', 0.0))
+        if risk_score < self.risk_threshold:
+            return False
+        location = transaction_location(transaction)
+        if location is None:
+            return False
+        lat, lon = location
+        now = time.time() if now is None else now
+        fraud_type = transaction.get('fraud_type') or transaction.get('merchant_category')
+        country = transaction.get('country')
+
+        with self._lock:
+            if self._landmark is None:
+                self._landmark = self._first_event = now
+            elif (now - self._landmark) / self.trend_half_life > MAX_EXPONENT:
+                self._move_landmark(now)
+            key = self._cell_key(lat, lon)
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._new_slot(key, now)
+
+            age = now - self._landmark
+            weight = 2.0 ** (age / self.half_life)
+            self._weight[slot] += weight
+            self._trend_weight[slot] += 2.0 ** (age / self.trend_half_life)
+            self._lat_sum[slot] += weight * lat
+            self._lon_cos[slot] += weight * math.cos(math.radians(lon))
+            self._lon_sin[slot] += weight * math.sin(math.radians(lon))
+            self._risk_sum[slot] += weight * risk_score
+            if fraud_type:
+                self._fraud_type[slot] = self._label_code('fraud_type', fraud_type)
+            if country:
+                self._country[slot] = self._label_code('country', country)
+            self.events += 1
+        return True
+
+    def hotspots(self, top_n: int = 10, now: Optional[float] = None) -> List[Dict]:
+        """Hotspots ranked by decayed volume x mean risk"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._slots:
+                return []
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            age = now - self._landmark
+            weight = self._weight[slots] * 2.0 ** (-age / self.half_life)
+            dense = weight >= self.min_cell_weight
+            slots, weight = slots[dense], weight[dense]
+            if not len(slots):
+                return []
+            trend_weight = self._trend_weight[slots] * 2.0 ** (-age / self.trend_half_life)
+            raw_weight = self._weight[slots]
+            lat_sum, risk_sum = self._lat_sum[slots], self._risk_sum[slots]
+            lon_cos, lon_sin = self._lon_cos[slots], self._lon_sin[slots]
+            observed = max(now - self._first_event, 1.0)
+            keys = self._keys[slots]
+            fraud_types = self._fraud_type[slots]
+            countries = self._country[slots]
+            labels = {name: list(values) for name, values in self._labels.items()}
+
+        n_clusters, cluster = self._label_cells(keys)
+        volume = np.bincount(cluster, weights=weight, minlength=n_clusters)
+        raw = np.bincount(cluster, weights=raw_weight, minlength=n_clusters)
+        trend_volume = np.bincount(cluster, weights=trend_weight, minlength=n_clusters)
+        lat = np.bincount(cluster, weights=lat_sum, minlength=n_clusters) / raw
+        lon = np.degrees(np.arctan2(np.bincount(cluster, weights=lon_sin, minlength=n_clusters),
+                                    np.bincount(cluster, weights=lon_cos, minlength=n_clusters)))
+        risk = np.bincount(cluster, weights=risk_sum, minlength=n_clusters) / raw
+        cells = np.bincount(cluster, minlength=n_clusters)
+        # Event rate over the short half-life against the long one. Each decayed volume is
+        # divided by the share of its steady state reachable since the first event, so a
+        # constant rate reads 1.0 even while the long window is still filling up.
+        trend_fill = 1.0 - 2.0 ** (-observed / self.trend_half_life)
+        fill = 1.0 - 2.0 ** (-observed / self.half_life)
+        rate_ratio = (trend_volume / trend_fill / self.trend_half_life) / (volume / fill / self.half_life)
+
+        ranked = np.argsort(-(volume * risk), kind='stable')[:top_n]
+        hotspots = []
+        for rank, c in enumerate(ranked, start=1):
+            members = np.flatnonzero(cluster == c)
+            members = members[np.argsort(-weight[members], kind='stable')]
+            rows, cols = np.divmod(keys[members], self.cols)
+            if cols.min() == 0 and cols.max() == self.cols - 1:
+                # Crosses the antimeridian: report bounds west to east, with west > east
+                cols = np.where(cols < self.cols // 2, cols + self.cols, cols)
+            west = cols.min() * self.cell_degrees - 180.0
+            east = (cols.max() + 1) * self.cell_degrees - 180.0
+            hotspots.append({
+                'rank': rank,
+                'region': f'{lat[c]:.2f}, {lon[c]:.2f}',
+                'centroid': {'lat': round(float(lat[c]), 4), 'lon': round(float(lon[c]), 4)},
+                'bounds': {
+                    'lat': [float(rows.min() * self.cell_degrees - 90.0),
+                            float((rows.max() + 1) * self.cell_degrees - 90.0)],
+                    'lon': [float(west), float(east - 360.0 if east > 180.0 else east)]
+                },
+                'cells': int(cells[c]),
+                'volume': round(float(volume[c]), 2),
+                'risk_score': round(float(risk[c]), 3),
+                'trend': self._trend_label(rate_ratio[c]),
+                'trend_ratio': round(float(rate_ratio[c]), 3),
+                'estimated_attacks': int(round(volume[c] * 86400.0 / (self.half_life / math.log(2)))),
+                'country_codes': self._top_labels(labels['country'], countries[members]),
+                'primary_fraud_types': self._top_labels(labels['fraud_type'], fraud_types[members])
+            })
+        return hotspots
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'events': self.events,
+                'cells': len(self._slots),
+                'max_cells': self.max_cells,
+                'evictions': self.evictions,
+                'cell_degrees': self.cell_degrees,
+                'memory_bytes': sum(a.nbytes for a in (self._weight, self._trend_weight, self._lat_sum,
+                                                       self._lon_cos, self._lon_sin, self._risk_sum,
+                                                       self._fraud_type, self._country, self._keys))
+            }
+
+    def _label_cells(self, keys: np.ndarray):
+        """Connected components of dense cells under 8-neighbour adjacency (longitude wraps)"""
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        rows, cols = np.divmod(keys, self.cols)
+        sources, targets = [], []
+        for d_row, d_col in NEIGHBOUR_OFFSETS:
+            neighbour = (rows + d_row) * self.cols + (cols + d_col) % self.cols
+            position = np.minimum(np.searchsorted(sorted_keys, neighbour), len(keys) - 1)
+            hit = sorted_keys[position] == neighbour
+            sources.append(np.flatnonzero(hit))
+            targets.append(order[position[hit]])
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        adjacency = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)),
+                               shape=(len(keys), len(keys)))
+        return connected_components(adjacency, directed=False)
+
+    def _trend_label(self, ratio: float) -> str:
+        if ratio > 1.25:
+            return 'INCREASING'
+        if ratio < 0.8:
+            return 'DECREASING'
+        return 'STABLE'
+
+    def _top_labels(self, labels: List[str], codes: np.ndarray, limit: int = 3) -> List[str]:
+        """Distinct labels of the heaviest cells first"""
+        seen = []
+        for code in codes:
+            if code >= 0 and labels[code] not in seen:
+                seen.append(labels[code])
+                if len(seen) == limit:
+                    break
+        return seen
+
+    def _cell_key(self, lat: float, lon: float) -> int:
+        row = int((lat + 90.0) // self.cell_degrees)
+        col = int((lon + 180.0) // self.cell_degrees) % self.cols
+        return row * self.cols + col
+
+    def _new_slot(self, key: int, now: float) -> int:
+        if not self._free:
+            self._evict(now)
+        slot = self._free.pop()
+        for array in (self._weight, self._trend_weight, self._lat_sum, self._lon_cos, self._lon_sin,
+                      self._risk_sum):
+            array[slot] = 0.0
+        self._fraud_type[slot] = -1
+        self._country[slot] = -1
+        self._keys[slot] = key
+        self._slots[key] = slot
+        return slot
+
+    def _evict(self, now: float):
+        """Free the lightest eighth of the cells in one pass"""
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        n = max(1, len(slots) // 8)
+        lightest = slots[np.argpartition(self._weight[slots], n - 1)[:n]]
+        for slot in lightest.tolist():
+            del self._slots[int(self._keys[slot])]
+            self._keys[slot] = -1
+            self._free.append(slot)
+        self.evictions += n
+
+    def _move_landmark(self, now: float):
+        """Rescale every sum to a new landmark so forward-decay factors stay finite"""
+        age = now - self._landmark
+        scale = 2.0 ** (-age / self.half_life)
+        for array in (self._weight, self._lat_sum, self._lon_cos, self._lon_sin, self._risk_sum):
+            array *= scale
+        self._trend_weight *= 2.0 ** (-age / self.trend_half_life)
+        self._landmark = now
+
+    def _label_code(self, kind: str, value) -> int:
+        codes = self._label_codes[kind]
+        value = str(value)
+        code = codes.get(value)
+        if code is None:
+            if len(codes) >= MAX_LABELS:
+                return -1
+            code = codes[value] = len(self._labels[kind])
+            self._labels[kind].append(value)
+        return code
@@ -0,0 +1,333 @@
+"""
+Model Refresher - Periodic continued training of the served ensemble from newly labeled cases
+Candidates are validated on a holdout, swapped in with one reference assignment and rolled back if they regress
+"""
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+from models import MODEL_POINTER
+
+# lgb.train takes the round count as an argument; a stored alias would override it
+LIGHTGBM_ROUND_ALIASES = {'num_iterations', 'num_iteration', 'n_iter', 'num_tree', 'num_trees', 'num_round',
+                          'num_rounds', 'num_boost_round', 'n_estimators', 'max_iter'}
+
+
+def ensemble_metrics(ensemble, models: Dict, X_scaled: np.ndarray, y: np.ndarray) -> Optional[Dict]:
+    """ROC-AUC and average precision of the weighted ensemble over scaled cases, None without both outcomes"""
+    if len(np.unique(y)) < 2:
+        return None
+    view = copy.copy(ensemble)
+    view.models = models
+    scores = view.get_risk_scores(None, view.predict_proba_matrix(X_scaled, scaled=True))
+    return {
+        'roc_auc': round(float(roc_auc_score(y, scores)), 5),
+        'average_precision': round(float(average_precision_score(y, scores)), 5),
+        'cases': int(len(y))
+    }
+
+
+class ModelRefresher:
+    """
+    Continues training the served ensemble every ``interval_seconds``.
+
+    New labeled cases are the rows appended to the case index since the
+    last refresh (``POST /api/cases``). They are held in the serving
+    scaler's space, so the scaler never changes and only members are
+    refreshed:
+    - XGBoost, LightGBM, GradientBoosting: ``boost_rounds`` more rounds
+      on the new cases plus a replay sample of older ones, while each
+      stays under ``max_trees``
+    - RandomForest: its oldest ``forest_trees`` trees are replaced by
+      trees grown on the same window
+    - LogisticRegression: warm-started lbfgs on the window
+    - SVM: carried over unchanged
+    None of these members has ``partial_fit``.
+
+    The newest ``holdout_fraction`` of new cases, plus a replay holdout,
+    validates the candidate against the live members. A candidate is
+    swapped in only if neither ROC-AUC nor average precision drops by
+    more than ``max_metric_drop``. The previous members are kept until
+    the next refresh. That refresh first scores both versions on its new
+    cases, which neither has seen, and rolls back if the live version
+    regressed.
+
+    Every swap or rollback calls ``on_swap`` (e.g. to drop cached
+    explanations) and saves the served members to
+    ``model_path/versions/<n>/``. The ``CURRENT`` pointer is switched only
+    after that directory is complete, so processes loading from model_path
+    never see a mix of versions. The newest ``keep_versions`` are kept.
+    """
+
+    def __init__(self, ensemble, case_index, model_path: Optional[str] = None, interval_seconds: float = 86400,
+                 min_new_cases: int = 200, holdout_fraction: float = 0.3, replay_ratio: float = 1.0,
+                 boost_rounds: int = 20, forest_trees: int = 10, max_trees: int = 1000,
+                 max_metric_drop: float = 0.005, n_threads: int = 1, max_replay_cases: int = 50000,
+                 history_size: int = 20, on_swap: Optional[Callable[[], None]] = None, keep_versions: int = 3):
+        self.ensemble = ensemble
+        self.case_index = case_index
+        self.model_path = model_path
+        self.interval_seconds = interval_seconds
+        self.min_new_cases = min_new_cases
+        self.holdout_fraction = holdout_fraction
+        self.replay_ratio = replay_ratio
+        self.boost_rounds = boost_rounds
+        self.forest_trees = forest_trees
+        self.max_trees = max_trees
+        self.max_metric_drop = max_metric_drop
+        self.n_threads = n_threads
+        self.max_replay_cases = max_replay_cases
+        self.on_swap = on_swap
+        self.keep_versions = keep_versions
+        self.version = 0
+        self.watermark = None      # cases with arrival numbers below this have been used by a refresh
+        self.history = deque(maxlen=history_size)
+        self._previous = None      # members replaced by the last swap, kept for rollback
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._rng = np.random.default_rng()
+        self._load_state()
+
+    def start(self):
+        """Refresh from a daemon thread every interval_seconds"""
+        if self._thread is not None or self.interval_seconds <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='model-refresh', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def refresh(self, force: bool = False) -> Dict:
+        """One refresh cycle: rollback check, continued training, validation and swap"""
+        with self._lock:
+            started = time.perf_counter()
+            result = {'started_at': datetime.now().isoformat()}
+            try:
+                self._refresh(result, force)
+            except Exception as e:
+                result['status'] = 'failed'
+                result['error'] = str(e)
+                print(f"Model refresh failed: {e}")
+            result['version'] = self.version
+            result['seconds'] = round(time.perf_counter() - started, 3)
+            self.history.append(result)
+            self._save_state()
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'interval_seconds': self.interval_seconds,
+            'watermark': self.watermark,
+            'pending_cases': max(len(self.case_index) - (self.watermark or 0), 0),
+            'rollback_available': self._previous is not None,
+            'history': list(self.history)
+        }
+
+    def _refresh(self, result: Dict, force: bool):
+        rows = len(self.case_index)
+        if self.watermark is None or self.watermark > rows:
+            # First run, or the index was rebuilt: everything after the build is new
+            self.watermark = self.case_index.built_rows
+        new_rows = np.arange(self.watermark, rows)
+        result['new_cases'] = len(new_rows)
+        if len(new_rows) < self.min_new_cases and not (force and len(new_rows)):
+            result['status'] = 'skipped'
+            result['reason'] = f'{len(new_rows)} new labeled cases, need {self.min_new_cases}'
+            return
+
+        X_new, y_new = self.case_index.labeled_vectors(new_rows)
+
+        # Neither the live nor the previous members have seen these cases
+        if self._previous is not None:
+            live = ensemble_metrics(self.ensemble, self.ensemble.models, X_new, y_new)
+            previous = ensemble_metrics(self.ensemble, self._previous, X_new, y_new)
+            if live is not None and previous is not None:
+                result['rollback_check'] = {'live': live, 'previous': previous}
+                if self._regressed(live, previous):
+                    self._serve(self._previous)
+                    result['rolled_back'] = True
+                self._previous = None
+
+        cut = int(round(len(new_rows) * (1 - self.holdout_fraction)))
+        X_replay, y_replay, X_replay_holdout, y_replay_holdout = self._replay(len(new_rows))
+        X_holdout = np.vstack([X_new[cut:], X_replay_holdout])
+        y_holdout = np.concatenate([y_new[cut:], y_replay_holdout])
+        if cut == 0 or len(np.unique(y_holdout)) < 2:
+            result['status'] = 'skipped'
+            result['reason'] = 'holdout needs both outcomes and some training cases'
+            return
+        X_train = np.vstack([X_new[:cut], X_replay])
+        y_train = np.concatenate([y_new[:cut], y_replay])
+
+        candidate, members = self._continue_training(X_train, y_train)
+        result['members'] = members
+        result['training_cases'] = len(y_train)
+        current = ensemble_metrics(self.ensemble, self.ensemble.models, X_holdout, y_holdout)
+        proposed = ensemble_metrics(self.ensemble, candidate, X_holdout, y_holdout)
+        result['validation'] = {'current': current, 'candidate': proposed}
+        self.watermark = rows
+
+        if self._regressed(proposed, current):
+            result['status'] = 'rejected'
+            return
+        self._previous = self._serve(candidate)
+        result['status'] = 'swapped'
+
+    def _serve(self, models: Dict) -> Dict:
+        """Swap members in as a new version and return the ones they replace"""
+        previous = self.ensemble.swap_models(models)
+        self.version += 1
+        if self.on_swap is not None:
+            self.on_swap()
+        self._persist()
+        return previous
+
+    def _regressed(self, metrics: Dict, baseline: Dict) -> bool:
+        return any(metrics[name] < baseline[name] - self.max_metric_drop
+                   for name in ('roc_auc', 'average_precision'))
+
+    def _replay(self, n_new: int):
+        """Disjoint train and holdout samples of the cases before the watermark"""
+        n = min(int(n_new * self.replay_ratio), self.max_replay_cases, self.watermark // 2)
+        if n <= 0:
+            X, y = np.empty((0, self.case_index.dim), dtype=np.float32), np.empty(0, dtype=np.int8)
+            return X, y, X, y
+        rows = self._rng.choice(self.watermark, size=2 * n, replace=False)
+        X, y = self.case_index.labeled_vectors(rows)
+        split = self._rng.permutation(2 * n)
+        return X[split[:n]], y[split[:n]], X[split[n:]], y[split[n:]]
+
+    def _continue_training(self, X: np.ndarray, y: np.ndarray):
+        """New member dict (same names and order); the live members are not modified"""
+        from threadpoolctl import threadpool_limits
+
+        candidate = {}
+        members = {}
+        with threadpool_limits(limits=self.n_threads):
+            for name, model in self.ensemble.models.items():
+                start = time.perf_counter()
+                candidate[name], members[name] = self._continue_member(name, model, X, y)
+                members[name]['seconds'] = round(time.perf_counter() - start, 3)
+        return candidate, members
+
+    def _continue_member(self, name: str, model, X: np.ndarray, y: np.ndarray):
+        if name == 'xgboost':
+            trees = model.get_booster().num_boosted_rounds()
+            if trees + self.boost_rounds > self.max_trees:
+                return model, {'action': 'kept', 'trees': trees, 'reason': 'max_trees'}
+            updated = type(model)(**model.get_params())
+            updated.set_params(n_estimators=self.boost_rounds, n_jobs=self.n_threads)
+            updated.fit(X, y, xgb_model=model.get_booster())
+            updated.set_params(n_jobs=model.get_params()['n_jobs'])
+            return updated, {'action': 'boosted', 'trees': updated.get_booster().num_boosted_rounds()}
+
+        if name == 'lightgbm':
+            trees = model.booster_.current_iteration()
+            if trees + self.boost_rounds > self.max_trees:
+                return model, {'action': 'kept', 'trees': trees, 'reason': 'max_trees'}
+            if hasattr(model, 'get_params'):
+                updated = type(model)(**model.get_params())
+                updated.set_params(n_estimators=self.boost_rounds, n_jobs=self.n_threads)
+                updated.fit(X, y, init_model=model.booster_)
+                updated.set_params(n_jobs=model.get_params()['n_jobs'])
+            else:
+                # LightGBMBooster from out-of-core training
+                import lightgbm as lgb
+                params = {k: v for k, v in model.booster_.params.items() if k not in LIGHTGBM_ROUND_ALIASES}
+                params.update(num_threads=self.n_threads, verbose=-1)
+                updated = type(model)(lgb.train(params, lgb.Dataset(X, label=y), self.boost_rounds,
+                                                init_model=model.booster_))
+            return updated, {'action': 'boosted', 'trees': updated.booster_.current_iteration()}
+
+        if name == 'gradient_boosting':
+            trees = model.n_estimators_
+            if trees + self.boost_rounds > self.max_trees:
+                return model, {'action': 'kept', 'trees': trees, 'reason': 'max_trees'}
+            updated = copy.deepcopy(model)
+            updated.set_params(warm_start=True, n_estimators=trees + self.boost_rounds)
+            updated.fit(X, y)
+            updated.set_params(warm_start=False)
+            return updated, {'action': 'boosted', 'trees': int(updated.n_estimators_)}
+
+        if name == 'random_forest':
+            trees = len(model.estimators_)
+            replace = min(self.forest_trees, trees)
+            updated = copy.deepcopy(model)
+            n_jobs = updated.n_jobs
+            updated.set_params(warm_start=True, n_estimators=trees + replace, n_jobs=self.n_threads)
+            updated.fit(X, y)
+            updated.estimators_ = updated.estimators_[replace:]
+            updated.set_params(warm_start=False, n_estimators=trees, n_jobs=n_jobs)
+            return updated, {'action': 'replaced_trees', 'trees': trees, 'replaced': replace}
+
+        if name == 'logistic_regression':
+            updated = copy.deepcopy(model)
+            updated.set_params(warm_start=True)
+            updated.fit(X, y)
+            updated.set_params(warm_start=False)
+            return updated, {'action': 'warm_started'}
+
+        return model, {'action': 'kept'}
+
+    # ==================== Persistence ====================
+    def _persist(self):
+        """Save the served members as a new version directory, then point model_path at it"""
+        if not self.model_path:
+            return
+        versions = os.path.join(self.model_path, 'versions')
+        name = f'{self.version:06d}'
+        staging = os.path.join(versions, f'.{name}.tmp')
+        shutil.rmtree(staging, ignore_errors=True)
+        self.ensemble.save_models(staging)
+        shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+        os.rename(staging, os.path.join(versions, name))
+
+        pointer = os.path.join(self.model_path, MODEL_POINTER)
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(f'versions/{name}\n')
+        os.replace(pointer + '.tmp', pointer)
+
+        # Readers that resolved an older pointer may still be loading it
+        for old in sorted(v for v in os.listdir(versions) if v.isdigit())[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(versions, old), ignore_errors=True)
+
+    def _state_path(self) -> Optional[str]:
+        return os.path.join(self.model_path, 'refresh_state.json') if self.model_path else None
+
+    def _save_state(self):
+        path = self._state_path()
+        if path is None:
+            return
+        os.makedirs(self.model_path, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'version': self.version, 'watermark': self.watermark, 'history': list(self.history)},
+                      f, default=str)
+        os.replace(path + '.tmp', path)
+
+    def _load_state(self):
+        path = self._state_path()
+        if path is None or not os.path.exists(path):
+            return
+        with open(path) as f:
+            state = json.load(f)
+        self.version = state.get('version', 0)
+        self.watermark = state.get('watermark')
+        self.history.extend(state.get('history', []))
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.refresh()
@@ -6,6 +6,9 @@ Combines multiple algorithms for robust predictions
 import numpy as np
 import pickle
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
@@ -14,6 +17,183 @@ import lightgbm as lgb
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 import joblib
+import json
+from datetime import datetime
+from joblib import Parallel, delayed
+from sklearn.metrics import roc_auc_score
+from feature_attribution import EnsembleAttributor
+
+
+def _member_aucs(detector, X_scaled, y):
+    """ROC-AUC of every member, then of the weighted ensemble"""
+    weights = np.array([detector.model_weights[name] for name in detector.models])
+    probabilities = detector.predict_proba_matrix(X_scaled, scaled=True)
+    return np.array(
+        [roc_auc_score(y, probabilities[:, i]) for i in range(probabilities.shape[1])] +
+        [roc_auc_score(y, probabilities @ weights)]
+    )
+
+
+def _permutation_drops(detector, X_scaled, y, baseline_auc, feature, n_repeats, seed):
+    """
+    AUC drop of every member and of the ensemble when one feature is shuffled
+    Returns an (n_repeats, n_models + 1) array; the last column is the ensemble
+    """
+    rng = np.random.default_rng(seed + feature)
+    drops = np.empty((n_repeats, len(baseline_auc)))
+    X_permuted = X_scaled.copy()
+    for repeat in range(n_repeats):
+        X_permuted[:, feature] = rng.permutation(X_scaled[:, feature])
+        drops[repeat] = baseline_auc - _member_aucs(detector, X_permuted, y)
+    return drops
+
+
+# Members that can use more than one thread, and the parameter that sets it.
+# The others (GradientBoosting, LogisticRegression with lbfgs, libsvm SVC) fit on one core.
+THREADED_MEMBERS = {'xgboost': 'n_jobs', 'lightgbm': 'n_jobs', 'random_forest': 'n_jobs'}
+
+# Longest-running members first, so a pool smaller than the ensemble stays busy
+TRAINING_ORDER = ['svm', 'gradient_boosting', 'random_forest', 'xgboost', 'lightgbm', 'logistic_regression']
+
+
+def _thread_budgets(names, n_jobs):
+    """
+    Threads per member when all are fitted at once: one for each
+    single-threaded member, the rest of the cores split across the others
+    
+    Threaded members get more than one thread only once every
+    single-threaded member has its core. With fewer cores than members the
+    pool runs at most n_jobs members at a time, so every member gets one
+    thread. Either way no more than n_jobs threads are busy at once.
+    """
+    threaded = [name for name in names if name in THREADED_MEMBERS]
+    budgets = {name: 1 for name in names}
+    spare = n_jobs - (len(names) - len(threaded))
+    if threaded and spare > len(threaded):
+        for i, name in enumerate(threaded):
+            budgets[name] = spare // len(threaded) + (1 if i < spare % len(threaded) else 0)
+    
+    concurrent = sorted(budgets.values(), reverse=True)[:min(n_jobs, len(names))]
+    assert sum(concurrent) <= n_jobs, f'thread budgets {budgets} exceed {n_jobs} cores'
+    return budgets
+
+
+def _fit_member(name, model, X, y, n_threads):
+    """
+    Fit one member under a thread budget (runs in a pool worker)
+    The member's own thread setting is restored afterwards so serving is unaffected
+    """
+    from threadpoolctl import threadpool_limits
+
+    param = THREADED_MEMBERS.get(name)
+    original = model.get_params()[param] if param else None
+    if param:
+        model.set_params(**{param: n_threads})
+    start = time.perf_counter()
+    with threadpool_limits(limits=n_threads):
+        model.fit(X, y)
+    seconds = time.perf_counter() - start
+    if param:
+        model.set_params(**{param: original})
+    return name, model, seconds
+
+
+# Member constructors, in ensemble order
+MODEL_CLASSES = {
+    'xgboost': xgb.XGBClassifier,
+    'lightgbm': lgb.LGBMClassifier,
+    'random_forest': RandomForestClassifier,
+    'gradient_boosting': GradientBoostingClassifier,
+    'logistic_regression': LogisticRegression,
+    'svm': SVC
+}
+
+# Constructor arguments per member; hyperparameters.json from
+# ml-models/hyperparameter_search.py overrides them member by member
+DEFAULT_HYPERPARAMETERS = {
+    'xgboost': {
+        'n_estimators': 100,
+        'max_depth': 7,
+        'learning_rate': 0.1,
+        'random_state': 42,
+        'scale_pos_weight': 10  # Handle class imbalance
+    },
+    'lightgbm': {
+        'n_estimators': 100,
+        'max_depth': 7,
+        'learning_rate': 0.1,
+        'random_state': 42,
+        'is_unbalance': True
+    },
+    'random_forest': {
+        'n_estimators': 100,
+        'max_depth': 15,
+        'random_state': 42,
+        'class_weight': 'balanced'
+    },
+    'gradient_boosting': {
+        'n_estimators': 100,
+        'max_depth': 5,
+        'learning_rate': 0.1,
+        'random_state': 42
+    },
+    'logistic_regression': {
+        'max_iter': 1000,
+        'random_state': 42,
+        'class_weight': 'balanced'
+    },
+    'svm': {
+        'kernel': 'rbf',
+        'probability': True,
+        'random_state': 42,
+        'class_weight': 'balanced'
+    }
+}
+
+
+def load_hyperparameters(path='models/hyperparameters.json'):
+    """Per-member overrides saved by the hyperparameter search, {} if there are none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('members', {})
+
+
+# Refreshed members are saved to versions/<n>/ under the model path; this file
+# names the served version and is replaced atomically after the directory is complete
+MODEL_POINTER = 'CURRENT'
+
+
+def resolve_model_path(path='models/'):
+    """Directory holding the served models: the version named by the pointer, else path itself"""
+    pointer = os.path.join(path, MODEL_POINTER)
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            version = f.read().strip()
+        if version:
+            return os.path.join(path, version)
+    return path
+
+
+class LightGBMBooster:
+    """
+    LightGBM member trained with lgb.train (e.g. from a binary dataset file)
+    Exposes the LGBMClassifier methods the ensemble and attributor call
+    """
+    
+    classes_ = np.array([0, 1])
+    
+    def __init__(self, booster):
+        self.booster_ = booster
+    
+    def predict_proba(self, X):
+        p = self.booster_.predict(X)
+        return np.column_stack([1 - p, p])
+    
+    def predict(self, X, pred_contrib=False):
+        if pred_contrib:
+            return self.booster_.predict(X, pred_contrib=True)
+        return (self.booster_.predict(X) > 0.5).astype(int)
 
 
 class FraudDetectionEnsemble:
@@ -27,13 +207,18 @@ class FraudDetectionEnsemble:
     - SVM
     """
     
-    def __init__(self, model_path='models/'):
+    def __init__(self, model_path='models/', use_pca=False, hyperparameters=None):
         self.model_path = model_path
+        self.hyperparameters = hyperparameters or {}
         self.models = {}
         self.scaler = StandardScaler()
-        self.pca = PCA(n_components=15)
+        # No member reads the PCA projection; it is only fitted and saved when enabled
+        self.pca = PCA(n_components=15) if use_pca else None
+        self.training_report = None
         self.ensemble = None
         self.feature_importance = None
+        self.model_source = None  # Directory the members were loaded from
+        self.attributor = EnsembleAttributor()
         self.model_weights = {
             'xgboost': 0.3,
             'lightgbm': 0.3,
@@ -46,141 +231,90 @@ class FraudDetectionEnsemble:
     
     def _initialize_models(self):
         """Initialize all base models"""
-        # XGBoost
-        self.models['xgboost'] = xgb.XGBClassifier(
-            n_estimators=100,
-            max_depth=7,
-            learning_rate=0.1,
-            random_state=42,
-            scale_pos_weight=10  # Handle class imbalance
-        )
-        
-        # LightGBM
-        self.models['lightgbm'] = lgb.LGBMClassifier(
-            n_estimators=100,
-            max_depth=7,
-            learning_rate=0.1,
-            random_state=42,
-            is_unbalance=True
-        )
-        
-        # Random Forest
-        self.models['random_forest'] = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=15,
-            random_state=42,
-            class_weight='balanced'
-        )
-        
-        # Gradient Boosting
-        self.models['gradient_boosting'] = GradientBoostingClassifier(
-            n_estimators=100,
-            max_depth=5,
-            learning_rate=0.1,
-            random_state=42
-        )
+        for name, model_class in MODEL_CLASSES.items():
+            params = {**DEFAULT_HYPERPARAMETERS[name], **self.hyperparameters.get(name, {})}
+            self.models[name] = model_class(**params)
+    
+    def train(self, X_train, y_train, n_jobs=-1):
+        """
+        Train all models concurrently in a process pool
         
-        # Logistic Regression
-        self.models['logistic_regression'] = LogisticRegression(
-            max_iter=1000,
-            random_state=42,
-            class_weight='balanced'
-        )
+        Each member gets a thread budget (see _thread_budgets) so the pool
+        does not oversubscribe the machine. n_jobs is the total core budget
+        (-1 = all cores); n_jobs=1 fits the members one after another in
+        this process. Returns wall-clock and per-member training seconds.
+        """
+        start = time.perf_counter()
+        n_jobs = (os.cpu_count() or 1) if n_jobs in (None, -1) else max(1, n_jobs)
         
-        # SVM
-        self.models['svm'] = SVC(
-            kernel='rbf',
-            probability=True,
-            random_state=42,
-            class_weight='balanced'
-        )
-    
-    def train(self, X_train, y_train):
-        """Train all models"""
         # Scale features
         X_scaled = self.scaler.fit_transform(X_train)
-        X_pca = self.pca.fit_transform(X_scaled)
+        if self.pca is not None:
+            self.pca.fit(X_scaled)
         
-        # Train each model
-        for name, model in self.models.items():
-            print(f"Training {name}...")
-            model.fit(X_scaled, y_train)
-            print(f"{name} trained successfully")
+        names = sorted(self.models, key=lambda name: TRAINING_ORDER.index(name)
+                       if name in TRAINING_ORDER else len(TRAINING_ORDER))
+        budgets = _thread_budgets(names, n_jobs)
+        member_seconds = {}
+        
+        if n_jobs == 1:
+            for name in names:
+                print(f"Training {name}...")
+                _, self.models[name], member_seconds[name] = _fit_member(
+                    name, self.models[name], X_scaled, y_train, budgets[name])
+                print(f"{name} trained successfully in {member_seconds[name]:.2f}s")
+        else:
+            # Spawned workers: forking after OpenMP use in the parent can hang boosters
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(names)),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(_fit_member, name, self.models[name], X_scaled, y_train, budgets[name])
+                    for name in names
+                ]
+                print(f"Training {', '.join(names)} in parallel on {n_jobs} cores...")
+                for future in as_completed(futures):
+                    name, self.models[name], member_seconds[name] = future.result()
+                    print(f"{name} trained successfully in {member_seconds[name]:.2f}s "
+                          f"({budgets[name]} thread{'s' if budgets[name] > 1 else ''})")
         
-        # Store feature importance from tree-based models
-        if hasattr(self.models['xgboost'], 'feature_importances_'):
-            self.feature_importance = self.models['xgboost'].feature_importances_
+        # Gain-based importance is free once the members are fitted
+        self.feature_importance = {'gain': self._gain_importance(X_train.shape[1])}
         
-        print("All models trained successfully!")
+        wall_seconds = time.perf_counter() - start
+        self.training_report = {
+            'wall_seconds': round(wall_seconds, 3),
+            'member_seconds': {name: round(member_seconds[name], 3) for name in names},
+            'member_threads': budgets,
+            'n_jobs': n_jobs,
+            'samples': int(len(X_train))
+        }
+        print(f"All models trained successfully in {wall_seconds:.2f}s "
+              f"(members sum to {sum(member_seconds.values()):.2f}s)")
+        return self.training_report
     
     def predict(self, features):
         """
         Make predictions using ensemble voting
         Returns 1 for fraud, 0 for legitimate
         """
-        features_scaled = self.scaler.transform([features]).reshape(1, -1)
-        
-        predictions = {}
-        for name, model in self.models.items():
-            pred = model.predict(features_scaled)[0]
-            predictions[name] = pred
-        
-        # Weighted voting
-        weighted_sum = sum(predictions[name] * self.model_weights[name] 
-                          for name in predictions)
-        
-        return 1 if weighted_sum > 0.5 else 0
+        return int(self.predict_batch(np.asarray(features).reshape(1, -1))[0])
     
     def get_risk_score(self, features):
         """
         Get fraud risk score (0-1)
         """
-        features_scaled = self.scaler.transform([features]).reshape(1, -1)
-        
-        probabilities = []
-        for name, model in self.models.items():
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(features_scaled)[0][1]
-            else:
-                # For SVM, use decision_function
-                decision = model.decision_function(features_scaled)[0]
-                proba = 1 / (1 + np.exp(-decision))  # Sigmoid conversion
-            
-            probabilities.append(proba * self.model_weights[name])
-        
-        risk_score = np.sum(probabilities)
-        return min(max(risk_score, 0), 1)  # Clamp between 0 and 1
+        return self.get_risk_scores(np.asarray(features).reshape(1, -1))[0]
     
     def get_confidence(self, features):
         """Get confidence level of prediction"""
-        features_scaled = self.scaler.transform([features]).reshape(1, -1)
-        
-        probabilities = []
-        for name, model in self.models.items():
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(features_scaled)[0][1]
-            else:
-                decision = model.decision_function(features_scaled)[0]
-                proba = 1 / (1 + np.exp(-decision))
-            probabilities.append(proba)
-        
-        # Confidence is inversely related to variance in predictions
-        variance = np.var(probabilities)
-        confidence = 1 - variance
-        return min(max(confidence, 0), 1)
+        return self.get_confidences(np.asarray(features).reshape(1, -1))[0]
     
     def get_model_contributions(self, features):
         """Get individual model contributions to prediction"""
-        features_scaled = self.scaler.transform([features]).reshape(1, -1)
+        probabilities = self.predict_proba_matrix(np.asarray(features).reshape(1, -1))[0]
         
         contributions = {}
-        for name, model in self.models.items():
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(features_scaled)[0][1]
-            else:
-                decision = model.decision_function(features_scaled)[0]
-                proba = 1 / (1 + np.exp(-decision))
-            
+        for proba, name in zip(probabilities, self.models):
             contributions[name] = {
                 'probability': float(proba),
                 'weight': self.model_weights[name],
@@ -189,14 +323,121 @@ class FraudDetectionEnsemble:
         
         return contributions
     
+    # ==================== Batch Scoring ====================
+    def predict_proba_matrix(self, X, scaled=False):
+        """
+        Get fraud probabilities from every model for a feature matrix
+        Returns an (n_samples, n_models) array, columns in self.models order
+        """
+        X_scaled = X if scaled else self.scaler.transform(X)
+        
+        probabilities = np.empty((len(X_scaled), len(self.models)))
+        for i, (name, model) in enumerate(self.models.items()):
+            if hasattr(model, 'predict_proba'):
+                probabilities[:, i] = model.predict_proba(X_scaled)[:, 1]
+            else:
+                # For SVM, use decision_function
+                decision = model.decision_function(X_scaled)
+                probabilities[:, i] = 1 / (1 + np.exp(-decision))  # Sigmoid conversion
+        
+        return probabilities
+    
+    def predict_batch(self, X):
+        """Weighted-vote fraud predictions (0/1) for a feature matrix"""
+        X_scaled = self.scaler.transform(X)
+        
+        weighted_sum = np.zeros(len(X_scaled))
+        for name, model in self.models.items():
+            weighted_sum += model.predict(X_scaled) * self.model_weights[name]
+        
+        return (weighted_sum > 0.5).astype(int)
+    
+    def get_risk_scores(self, X, probabilities=None):
+        """Weighted-average risk scores (0-1) for a feature matrix"""
+        if probabilities is None:
+            probabilities = self.predict_proba_matrix(X)
+        weights = np.array([self.model_weights[name] for name in self.models])
+        return np.clip(probabilities @ weights, 0, 1)
+    
+    def get_confidences(self, X, probabilities=None):
+        """Confidence per row, inversely related to variance across models"""
+        if probabilities is None:
+            probabilities = self.predict_proba_matrix(X)
+        return np.clip(1 - np.var(probabilities, axis=1), 0, 1)
+    
+    def get_feature_attributions(self, X, probabilities=None):
+        """
+        Per-feature contributions to the risk score for a feature matrix
+        Returns 'values' (n_samples, n_features) and 'base_value' (n_samples,)
+        """
+        X_scaled = self.scaler.transform(X)
+        if probabilities is None:
+            probabilities = self.predict_proba_matrix(X_scaled, scaled=True)
+        return self.attributor.explain(self.models, self.model_weights, X_scaled, probabilities)
+    
+    # ==================== Global Feature Importance ====================
+    def compute_feature_importance(self, X, y, feature_names=None, n_repeats=5, n_jobs=-1, random_state=42):
+        """
+        Compute global gain- and permutation-based importance on held-out data
+        
+        Permutation importance is the ROC-AUC drop when one feature is
+        shuffled, for every member and for the weighted ensemble; features
+        are evaluated in parallel. The result is saved with the models.
+        """
+        X_scaled = self.scaler.transform(X)
+        n_features = X_scaled.shape[1]
+        names = list(self.models)
+        baseline_auc = _member_aucs(self, X_scaled, y)
+        
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_permutation_drops)(self, X_scaled, y, baseline_auc, feature, n_repeats, random_state)
+            for feature in range(n_features)
+        )
+        drops = np.stack(results, axis=1)  # (n_repeats, n_features, n_models + 1)
+        mean_drops = drops.mean(axis=0)
+        
+        self.feature_importance = {
+            'features': list(feature_names) if feature_names is not None else [f'f{i}' for i in range(n_features)],
+            'gain': self._gain_importance(n_features),
+            'permutation': {
+                'metric': 'roc_auc_drop',
+                'n_repeats': n_repeats,
+                'n_samples': len(X_scaled),
+                'baseline_auc': {name: float(baseline_auc[i]) for i, name in enumerate(names + ['ensemble'])},
+                'ensemble': mean_drops[:, -1].tolist(),
+                'ensemble_std': drops[:, :, -1].std(axis=0).tolist(),
+                'members': {name: mean_drops[:, i].tolist() for i, name in enumerate(names)}
+            },
+            'computed_at': datetime.now().isoformat()
+        }
+        return self.feature_importance
+    
+    def _gain_importance(self, n_features):
+        """Normalized split-gain importance per member, combined with model_weights"""
+        members = {}
+        for name, model in self.models.items():
+            if name == 'xgboost':
+                scores = model.get_booster().get_score(importance_type='gain')
+                values = np.array([scores.get(f'f{i}', 0.0) for i in range(n_features)])
+            elif name == 'lightgbm':
+                values = model.booster_.feature_importance(importance_type='gain')
+            elif hasattr(model, 'feature_importances_'):
+                values = model.feature_importances_
+            elif hasattr(model, 'coef_'):
+                values = np.abs(model.coef_[0])  # Inputs are standardized
+            else:
+                continue  # RBF SVM has no gain-style importance
+            values = np.asarray(values, dtype=np.float64)
+            members[name] = (values / values.sum() if values.sum() > 0 else values).tolist()
+        
+        total_weight = sum(self.model_weights[name] for name in members)
+        ensemble = sum(np.array(values) * self.model_weights[name] / total_weight
+                       for name, values in members.items())
+        return {'ensemble': np.asarray(ensemble).tolist(), 'members': members}
+    
     def get_feature_importance(self):
-        """Get feature importance scores"""
-        if self.feature_importance is not None:
-            return {
-                'values': self.feature_importance.tolist(),
-                'method': 'XGBoost Gain'
-            }
-        return {}
+        """Get precomputed global feature importance"""
+        return self.feature_importance or {}
     
     def get_model_info(self):
         """Get information about all models"""
@@ -208,25 +449,56 @@ class FraudDetectionEnsemble:
             for model_name, model in self.models.items()
         }
     
+    def swap_models(self, models):
+        """
+        Serve a new member dict (same names and order) and return the previous one
+        One reference assignment: calls already iterating the old dict finish on it
+        """
+        previous = self.models
+        self.attributor = EnsembleAttributor()  # Its tables are keyed by member object
+        self.models = models
+        if hasattr(self.scaler, 'n_features_in_'):
+            # Permutation drops were measured on the old members; recompute them on demand
+            importance = {'gain': self._gain_importance(self.scaler.n_features_in_)}
+            if self.feature_importance and 'features' in self.feature_importance:
+                importance = {'features': self.feature_importance['features'], **importance}
+            self.feature_importance = importance
+        return previous
+    
     def is_loaded(self):
         """Check if models are properly loaded"""
         return len(self.models) > 0
     
     def save_models(self, path='models/'):
-        """Save trained models"""
+        """Save trained models (models saved at the root supersede refreshed versions)"""
         os.makedirs(path, exist_ok=True)
         for name, model in self.models.items():
             joblib.dump(model, f'{path}/{name}_model.pkl')
         joblib.dump(self.scaler, f'{path}/scaler.pkl')
-        joblib.dump(self.pca, f'{path}/pca.pkl')
+        if self.pca is not None:
+            joblib.dump(self.pca, f'{path}/pca.pkl')
+        if self.feature_importance:
+            with open(f'{path}/feature_importance.json', 'w') as f:
+                json.dump(self.feature_importance, f)
+        if self.training_report:
+            with open(f'{path}/training_report.json', 'w') as f:
+                json.dump(self.training_report, f)
+        if os.path.exists(os.path.join(path, MODEL_POINTER)):
+            os.remove(os.path.join(path, MODEL_POINTER))
     
     def load_models(self, path='models/'):
-        """Load pre-trained models"""
+        """Load pre-trained models (the served version if the refresher has saved one)"""
         try:
+            path = resolve_model_path(path)
             for name in self.models.keys():
                 self.models[name] = joblib.load(f'{path}/{name}_model.pkl')
             self.scaler = joblib.load(f'{path}/scaler.pkl')
-            self.pca = joblib.load(f'{path}/pca.pkl')
+            if os.path.exists(f'{path}/pca.pkl'):
+                self.pca = joblib.load(f'{path}/pca.pkl')
+            if os.path.exists(f'{path}/feature_importance.json'):
+                with open(f'{path}/feature_importance.json') as f:
+                    self.feature_importance = json.load(f)
+            self.model_source = path
             return True
         except:
             return False
@@ -0,0 +1,119 @@
+"""
+Pattern Cache - Precomputed /api/predict-patterns payloads with ETags
+A background thread recomputes the usual horizons when the predictor's data version changes
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+
+class PatternForecastCache:
+    """
+    Serialized prediction payloads keyed by horizon (days).
+
+    Each entry holds the encoded JSON body, its ETag, the predictor data
+    version it was built from and an expiry. The horizons in ``horizons``
+    are rebuilt off the request path: every ``refresh_seconds`` a daemon
+    thread checks ``predictor.data_version()`` and rebuilds entries whose
+    version changed or that would expire before the next two checks. Other
+    horizons are built on first request and kept in a small LRU.
+    """
+
+    def __init__(self, predictor, horizons: Sequence[int] = (7, 30, 90), ttl_seconds: float = 900,
+                 refresh_seconds: float = 60, max_entries: int = 32):
+        self.predictor = predictor
+        self.horizons = tuple(horizons)
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self.max_entries = max(max_entries, len(self.horizons))
+        self._entries = OrderedDict()  # days -> {'body', 'etag', 'version', 'expires'}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'builds': 0, 'build_errors': 0}
+
+    def start(self):
+        """Build the usual horizons now, then keep them fresh from a daemon thread"""
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name='pattern-forecast', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def get(self, days: int) -> Dict:
+        """Cached entry for a horizon, building it inline only if nothing usable is cached"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(days)
+            if entry is not None and entry['expires'] > now:
+                self._entries.move_to_end(days)
+                self._stats['hits'] += 1
+                return entry
+            self._stats['misses'] += 1
+        return self._build(days)
+
+    def not_modified(self, entry: Dict, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header already names this entry's ETag"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        matched = '*' in tags or entry['etag'] in tags
+        if matched:
+            with self._lock:
+                self._stats['not_modified'] += 1
+        return matched
+
+    def refresh(self, force: bool = False):
+        """Rebuild the usual horizons whose data version changed or that are about to expire"""
+        version = self.predictor.data_version()
+        deadline = time.monotonic() + 2 * self.refresh_seconds
+        for days in self.horizons:
+            with self._lock:
+                entry = self._entries.get(days)
+            if force or entry is None or entry['version'] != version or entry['expires'] <= deadline:
+                try:
+                    self._build(days)
+                except Exception as e:
+                    with self._lock:
+                        self._stats['build_errors'] += 1
+                    print(f"Pattern forecast for {days} days failed: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'horizons': list(self.horizons),
+                    'ttl_seconds': self.ttl_seconds}
+
+    def _build(self, days: int) -> Dict:
+        # One build at a time: the predictor's sections are cheap but not free
+        with self._build_lock:
+            version = self.predictor.data_version()
+            predictions = self.predictor.predict_emerging_patterns(days)
+            body = json.dumps({'success': True, 'predictions': predictions}, default=str).encode()
+            entry = {
+                'body': body,
+                'etag': '"' + hashlib.sha1(body).hexdigest() + '"',
+                'version': version,
+                'built_at': time.time(),
+                'expires': time.monotonic() + self.ttl_seconds
+            }
+        with self._lock:
+            self._entries[days] = entry
+            self._entries.move_to_end(days)
+            self._stats['builds'] += 1
+            while len(self._entries) > self.max_entries:
+                oldest = next(day for day in self._entries if day not in self.horizons)
+                del self._entries[oldest]
+        return entry
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
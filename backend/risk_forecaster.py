@@ -0,0 +1,159 @@
+"""
+Risk Forecaster - Hour-of-week seasonal plus trend forecasts of scored transaction series
+Fitted incrementally from the transaction store's hourly rollups; forecasts are one vectorized expression
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from transaction_store import ROLLUP_FIELDS
+
+
+HOURS_PER_WEEK = 168
+# Epoch hour 0 is Thursday 00:00 UTC; shifting by three days makes Monday 00:00 slot 0
+WEEK_OFFSET = 72
+
+TOTAL = ROLLUP_FIELDS.index('total')
+FRAUD = ROLLUP_FIELDS.index('fraud')
+RISK_SUM = ROLLUP_FIELDS.index('risk_sum')
+
+
+def hour_of_week(hours):
+    """Slot 0-167 (Monday 00:00 first) of epoch hours"""
+    return (np.asarray(hours, dtype=np.int64) + WEEK_OFFSET) % HOURS_PER_WEEK
+
+
+class SeasonalTrendSeries:
+    """
+    Additive damped-trend Holt-Winters model with a 168-hour season.
+
+    State is a level, a per-hour trend and one seasonal offset per
+    hour-of-week, so memory is fixed and each observation is an O(1)
+    update. The trend is damped by ``phi`` per hour, which keeps long
+    horizons bounded: a year ahead the trend contributes at most
+    trend * phi / (1 - phi).
+    """
+
+    def __init__(self, alpha: float = 0.05, beta: float = 0.005, gamma: float = 0.2,
+                 phi: float = 0.995, initial_level: float = 0.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.level = initial_level
+        self.trend = 0.0
+        self.season = np.zeros(HOURS_PER_WEEK)
+        self.last_hour = None
+        self.observations = 0
+
+    def update(self, hour: int, value: float):
+        """Fold one hourly value in; hours at or before the last one are ignored"""
+        slot = (hour + WEEK_OFFSET) % HOURS_PER_WEEK
+        if self.last_hour is None:
+            self.level = value - self.season[slot]
+        else:
+            gap = hour - self.last_hour
+            if gap <= 0:
+                return
+            # Carry level and trend across hours with no observation
+            if gap > 1:
+                self.level += self.trend * self._damped(gap - 1)
+                self.trend *= self.phi ** (gap - 1)
+            previous = self.level
+            self.level = (self.alpha * (value - self.season[slot]) +
+                          (1 - self.alpha) * (previous + self.phi * self.trend))
+            self.trend = self.beta * (self.level - previous) + (1 - self.beta) * self.phi * self.trend
+        self.season[slot] = self.gamma * (value - self.level) + (1 - self.gamma) * self.season[slot]
+        self.last_hour = hour
+        self.observations += 1
+
+    def forecast(self, hours: np.ndarray) -> np.ndarray:
+        """Forecast for an array of epoch hours"""
+        hours = np.asarray(hours, dtype=np.int64)
+        ahead = np.maximum(hours - (self.last_hour if self.last_hour is not None else hours), 0)
+        return self.level + self.trend * self._damped(ahead) + self.season[hour_of_week(hours)]
+
+    def _damped(self, steps):
+        """phi + phi^2 + ... + phi^steps"""
+        if self.phi == 1.0:
+            return np.asarray(steps, dtype=np.float64)
+        return self.phi * (1 - self.phi ** np.asarray(steps, dtype=np.float64)) / (1 - self.phi)
+
+
+class RiskForecaster:
+    """
+    Hourly forecasts of average risk score, fraud count and transaction volume.
+
+    ``refresh`` folds in every complete hour after the last one fitted, so
+    repeated calls only cost the new hours. Count series treat hours with
+    no transactions as zero, unless the gap exceeds ``max_gap_hours``
+    (downtime or a gap in the data), in which case level and trend are
+    carried across instead. Average risk is undefined for empty hours and
+    is always carried across.
+    """
+
+    def __init__(self, base_risk: float = 0.15, max_gap_hours: int = 24 * 7):
+        self.max_gap_hours = max_gap_hours
+        self.series = {
+            'risk': SeasonalTrendSeries(initial_level=base_risk),
+            'fraud': SeasonalTrendSeries(),
+            'volume': SeasonalTrendSeries()
+        }
+        self.last_hour = None
+        self._lock = threading.Lock()
+
+    @property
+    def fitted(self) -> bool:
+        return self.last_hour is not None
+
+    def refresh(self, hourly: Dict[int, np.ndarray], current_hour: Optional[int] = None):
+        """Fit the complete hours (before current_hour) of store.hourly_series() not seen yet"""
+        with self._lock:
+            for hour in sorted(hourly):
+                if current_hour is not None and hour >= current_hour:
+                    break
+                if self.last_hour is not None and hour <= self.last_hour:
+                    continue
+                counters = hourly[hour]
+                total = float(counters[TOTAL])
+                if total <= 0:
+                    continue
+                if self.last_hour is not None and 1 < hour - self.last_hour <= self.max_gap_hours:
+                    for empty in range(self.last_hour + 1, hour):
+                        self.series['fraud'].update(empty, 0.0)
+                        self.series['volume'].update(empty, 0.0)
+                self.series['risk'].update(hour, float(counters[RISK_SUM]) / total)
+                self.series['fraud'].update(hour, float(counters[FRAUD]))
+                self.series['volume'].update(hour, total)
+                self.last_hour = hour
+
+    def forecast(self, start_hour: int, hours: int) -> Dict[str, np.ndarray]:
+        """Hourly forecasts for epoch hours start_hour .. start_hour + hours - 1"""
+        index = np.arange(start_hour, start_hour + hours, dtype=np.int64)
+        with self._lock:
+            risk = self.series['risk'].forecast(index)
+            fraud = self.series['fraud'].forecast(index)
+            volume = self.series['volume'].forecast(index)
+        return {
+            'hour': index,
+            'risk': np.clip(risk, 0.0, 1.0),
+            'fraud': np.maximum(fraud, 0.0),
+            'volume': np.maximum(volume, 0.0)
+        }
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                'fitted_hours': self.series['volume'].observations,
+                'last_hour': (datetime.fromtimestamp(self.last_hour * 3600).isoformat()
+                              if self.last_hour is not None else None),
+                'series': {
+                    name: {
+                        'level': round(float(s.level), 4),
+                        'trend_per_day': round(float(s.trend * s._damped(24)), 4)
+                    }
+                    for name, s in self.series.items()
+                }
+            }
@@ -0,0 +1,317 @@
+"""
+Bulk Scoring Jobs - Asynchronous rescoring of large uploads in a process pool
+Inputs are spooled to disk in chunks; finished chunks survive worker crashes
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from batch_scoring import score_chunk, result_rows
+
+MAX_CHUNK_ATTEMPTS = 3
+
+# Per-process model state for pool workers
+_worker = {}
+
+
+def _init_worker(model_path: str):
+    """Load the trained ensemble once per worker process"""
+    from threadpoolctl import threadpool_limits
+    from data_processor import TransactionProcessor
+
+    # One thread per worker: the pool already fans out across cores
+    threadpool_limits(limits=1)
+
+    _worker['model_path'] = model_path
+    _worker['detector'] = _load_detector(model_path)
+    _worker['processor'] = TransactionProcessor()
+
+
+def _load_detector(model_path: str):
+    from models import FraudDetectionEnsemble
+
+    detector = FraudDetectionEnsemble()
+    if not detector.load_models(model_path):
+        raise RuntimeError(f'No trained models found in {model_path}')
+    return detector
+
+
+def _score_chunk_file(input_path: str, output_path: str) -> Dict:
+    """Score one spooled chunk and atomically write its results"""
+    from models import resolve_model_path
+
+    if 'detector' not in _worker:
+        raise RuntimeError('Scoring worker has no models loaded')
+
+    with open(input_path) as f:
+        transactions = [json.loads(line) for line in f if line.strip()]
+
+    # The model refresher switched the served version since this worker loaded it
+    if resolve_model_path(_worker['model_path']) != _worker['detector'].model_source:
+        _worker['detector'] = _load_detector(_worker['model_path'])
+
+    detector = _worker['detector']
+    scores = score_chunk(detector, _worker['processor'], transactions)
+    rows = result_rows(scores, list(detector.models), include_models=True)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    os.replace(tmp_path, output_path)
+
+    return {'rows': len(rows), 'fraud': int(scores['is_fraud'].sum())}
+
+
+class ScoringJobManager:
+    """
+    Submit, track and resume bulk-scoring jobs.
+
+    Each job lives in its own directory: job.json (manifest), input/ (spooled
+    NDJSON chunks) and results/ (one NDJSON file per finished chunk, written
+    atomically). A chunk counts as finished once its result file exists, so
+    a restarted server or a crashed worker resumes from the last finished
+    chunk instead of starting over.
+    """
+
+    def __init__(self, jobs_dir: str = './data/jobs/', model_path: str = './models/',
+                 max_workers: Optional[int] = None, chunk_rows: int = 10000):
+        self.jobs_dir = jobs_dir
+        self.model_path = model_path
+        self.max_workers = max_workers or os.cpu_count()
+        self.chunk_rows = chunk_rows
+        self.jobs = {}
+        self._inflight = {}  # (job_id, chunk) -> future
+        self._attempts = {}
+        self._executor = None
+        self._lock = threading.RLock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    # ==================== Public API ====================
+    def submit(self, chunks: Iterable[List[Dict]], source: str = 'upload') -> str:
+        """Spool chunks of transactions to disk and queue them for scoring"""
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = self._job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, 'input'))
+        os.makedirs(os.path.join(job_dir, 'results'))
+
+        chunk_sizes = []
+        pending = []
+        for chunk in chunks:
+            pending.extend(chunk)
+            while len(pending) >= self.chunk_rows:
+                chunk_sizes.append(self._spool(job_id, len(chunk_sizes), pending[:self.chunk_rows]))
+                pending = pending[self.chunk_rows:]
+        if pending:
+            chunk_sizes.append(self._spool(job_id, len(chunk_sizes), pending))
+
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'source': source,
+            'created_at': datetime.now().isoformat(),
+            'total_chunks': len(chunk_sizes),
+            'total_rows': sum(chunk_sizes),
+            'chunk_sizes': chunk_sizes,
+            'chunks': {},
+            'error': None
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            self._save(job)
+            self._schedule(job_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Get progress and throughput for a job"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+
+            rows_scored = sum(c['rows'] for c in job['chunks'].values())
+            status = {
+                key: job[key] for key in
+                ('job_id', 'status', 'source', 'created_at', 'total_chunks', 'total_rows', 'error')
+            }
+            status.update({
+                'completed_chunks': len(job['chunks']),
+                'rows_scored': rows_scored,
+                'fraud_detected': sum(c['fraud'] for c in job['chunks'].values()),
+                'progress': rows_scored / job['total_rows'] if job['total_rows'] else 1.0,
+                'finished_at': job.get('finished_at')
+            })
+
+            run = job.get('run')
+            if run:
+                end = run.get('finished') or time.time()
+                elapsed = max(end - run['started'], 1e-9)
+                status['elapsed_seconds'] = round(elapsed, 3)
+                status['rows_per_second'] = round((rows_scored - run['rows_at_start']) / elapsed, 1)
+            return status
+
+    def result_path(self, job_id: str) -> Optional[str]:
+        """Path of the merged NDJSON results for a completed job"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'completed':
+                return None
+        return os.path.join(self._job_dir(job_id), 'results.ndjson')
+
+    def resume(self):
+        """Reload manifests and reschedule every unfinished job"""
+        with self._lock:
+            for job_id in os.listdir(self.jobs_dir):
+                manifest = os.path.join(self._job_dir(job_id), 'job.json')
+                if not os.path.exists(manifest):
+                    continue
+                with open(manifest) as f:
+                    job = json.load(f)
+                job['chunks'] = {int(k): v for k, v in job['chunks'].items()}
+                job.pop('run', None)
+                self.jobs[job_id] = job
+                if job['status'] in ('queued', 'running'):
+                    self._schedule(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    # ==================== Scheduling ====================
+    def _schedule(self, job_id: str):
+        """Submit every chunk that has neither a result nor a running task"""
+        job = self.jobs[job_id]
+        results_dir = os.path.join(self._job_dir(job_id), 'results')
+
+        for index in range(job['total_chunks']):
+            if index in job['chunks'] or (job_id, index) in self._inflight:
+                continue
+            output_path = os.path.join(results_dir, f'chunk_{index:06d}.ndjson')
+            if os.path.exists(output_path):
+                # Finished before a restart but never recorded in the manifest
+                job['chunks'][index] = self._count_results(output_path)
+                continue
+
+            executor = self._get_executor()
+            future = executor.submit(
+                _score_chunk_file,
+                os.path.join(self._job_dir(job_id), 'input', f'chunk_{index:06d}.ndjson'),
+                output_path
+            )
+            self._inflight[(job_id, index)] = future
+            future.add_done_callback(
+                lambda f, index=index: self._on_chunk_done(job_id, index, executor, f)
+            )
+
+        if job['status'] == 'queued' or 'run' not in job:
+            job['status'] = 'running'
+            job['run'] = {
+                'started': time.time(),
+                'rows_at_start': sum(c['rows'] for c in job['chunks'].values())
+            }
+        self._save(job)
+        self._maybe_finish(job)
+
+    def _on_chunk_done(self, job_id: str, index: int, executor, future):
+        """Record a finished chunk, or recover from a failed one"""
+        with self._lock:
+            self._inflight.pop((job_id, index), None)
+            job = self.jobs[job_id]
+            if job['status'] != 'running':
+                return
+
+            try:
+                job['chunks'][index] = future.result()
+            except BrokenProcessPool as e:
+                # A worker died; replace the pool once and resubmit what's unfinished
+                if executor is self._executor:
+                    self._executor = None
+                if not self._record_attempt(job, index, f'Scoring worker crashed: {e}'):
+                    return
+                self._schedule(job_id)
+                return
+            except Exception as e:
+                if not self._record_attempt(job, index, str(e)):
+                    return
+                self._schedule(job_id)
+                return
+
+            self._save(job)
+            self._maybe_finish(job)
+
+    def _record_attempt(self, job: Dict, index: int, error: str) -> bool:
+        """Count a failed attempt; fail the job once a chunk exhausts its retries"""
+        key = (job['job_id'], index)
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+        if self._attempts[key] < MAX_CHUNK_ATTEMPTS:
+            return True
+
+        job['status'] = 'failed'
+        job['error'] = f'Chunk {index}: {error}'
+        job['finished_at'] = datetime.now().isoformat()
+        self._save(job)
+        return False
+
+    def _maybe_finish(self, job: Dict):
+        """Merge chunk results once every chunk is done"""
+        if job['status'] != 'running' or len(job['chunks']) < job['total_chunks']:
+            return
+
+        job_dir = self._job_dir(job['job_id'])
+        merged_path = os.path.join(job_dir, 'results.ndjson')
+        with open(merged_path + '.tmp', 'wb') as merged:
+            for index in range(job['total_chunks']):
+                with open(os.path.join(job_dir, 'results', f'chunk_{index:06d}.ndjson'), 'rb') as f:
+                    shutil.copyfileobj(f, merged)
+        os.replace(merged_path + '.tmp', merged_path)
+
+        job['status'] = 'completed'
+        job['finished_at'] = datetime.now().isoformat()
+        job['run']['finished'] = time.time()
+        self._save(job)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Spawned workers: forking after OpenMP use in the parent can hang boosters
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_path,)
+            )
+        return self._executor
+
+    # ==================== Storage ====================
+    def _spool(self, job_id: str, index: int, transactions: List[Dict]) -> int:
+        path = os.path.join(self._job_dir(job_id), 'input', f'chunk_{index:06d}.ndjson')
+        with open(path, 'w') as f:
+            for transaction in transactions:
+                f.write(json.dumps(transaction) + '\n')
+        return len(transactions)
+
+    def _count_results(self, path: str) -> Dict:
+        rows = fraud = 0
+        with open(path) as f:
+            for line in f:
+                rows += 1
+                fraud += json.loads(line)['is_fraud']
+        return {'rows': rows, 'fraud': fraud}
+
+    def _save(self, job: Dict):
+        path = os.path.join(self._job_dir(job['job_id']), 'job.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job, f)
+        os.replace(path + '.tmp', path)
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
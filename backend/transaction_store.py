@@ -0,0 +1,443 @@
+"""
+Scored Transaction Store - Columnar on-disk log of every scored decision
+Keeps hourly and daily rollups current so reports never rescan the log
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+DECISIONS = ['APPROVE', 'REVIEW', 'BLOCK']
+
+# Rollup counter layout: one float64 slot per aggregate
+ROLLUP_FIELDS = [
+    'total', 'fraud', 'approve', 'review', 'block',
+    'amount_total', 'amount_blocked', 'risk_sum'
+]
+
+
+class ScoredTransactionStore:
+    """
+    Append-only columnar store for scored transactions.
+
+    Each column is a flat binary file read back through ``np.memmap``, so
+    scans touch only the columns a query needs. Categorical columns are
+    dictionary-encoded to int16 codes. Rollups are kept per hour and per
+    day as fixed-layout counter lists and updated on every append.
+
+    Rollups are saved as one file per day, holding the day and its hours,
+    and a flush rewrites only the days its rows touched. Hourly buckets
+    older than ``hourly_retention_days`` are dropped; daily buckets are
+    kept, so older ranges are still answered from rollups when they are
+    day-aligned.
+    """
+
+    COLUMNS = {
+        'timestamp': np.float64,
+        'risk_score': np.float32,
+        'amount': np.float32,
+        'decision': np.int8,
+        'is_fraud': np.int8,
+        'fraud_type': np.int16,
+        'merchant_category': np.int16
+    }
+    CATEGORICAL = ('fraud_type', 'merchant_category')
+
+    def __init__(self, path: str = './data/scored/', flush_rows: int = 1024, hourly_retention_days: int = 90):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.hourly_retention_days = hourly_retention_days
+        self._lock = threading.RLock()
+        self._buffer = {name: [] for name in self.COLUMNS}
+        self._dictionaries = {name: [] for name in self.CATEGORICAL}
+        self._codes = {name: {} for name in self.CATEGORICAL}
+        self.hourly = {}  # epoch hour -> {'counters': [ROLLUP_FIELDS], 'fraud_types': {code: count}}
+        self.daily = {}   # epoch day  -> same layout
+        self._dirty_days = set()  # days whose rollup files are behind the in-memory buckets
+        self._hourly_cutoff = self._retention_cutoff()  # no hourly buckets before this epoch hour
+        self._persisted_rows = 0
+        self._trimmed = False
+        os.makedirs(os.path.join(path, 'rollups'), exist_ok=True)
+        self._load()
+
+    # ==================== Ingestion ====================
+    def append(self, transaction: Dict, result: Dict):
+        """Append one scored decision and fold it into the rollups"""
+        row = {
+            'timestamp': self._resolve_timestamp(transaction.get('timestamp')),
+            'risk_score': float(result.get('risk_score', 0.0)),
+            'amount': float(transaction.get('amount', 0) or 0),
+            'decision': DECISIONS.index(result.get('recommendation', 'APPROVE')),
+            'is_fraud': 1 if result.get('is_fraud') else 0,
+            'fraud_type': self._encode(
+                'fraud_type',
+                transaction.get('fraud_type') or transaction.get('merchant_category', 'unknown')
+            ),
+            'merchant_category': self._encode(
+                'merchant_category', transaction.get('merchant_category', 'unknown')
+            )
+        }
+
+        with self._lock:
+            for name, value in row.items():
+                self._buffer[name].append(value)
+            self._update_rollups(row)
+            if len(self._buffer['timestamp']) >= self.flush_rows:
+                self.flush()
+
+    def flush(self):
+        """
+        Write buffered rows to the column files and persist rollups
+        Does nothing without pending rows: the rollups only change on append, and
+        an idle instance (e.g. a stale copy in another process) must not touch the files
+        """
+        with self._lock:
+            pending = len(self._buffer['timestamp'])
+            if not pending:
+                return
+            if not self._trimmed:
+                self._trim_columns()
+                self._trimmed = True
+            for name, dtype in self.COLUMNS.items():
+                with open(self._column_path(name), 'ab') as f:
+                    f.write(np.asarray(self._buffer[name], dtype=dtype).tobytes())
+                self._buffer[name] = []
+            self._persisted_rows += pending
+
+            cutoff = self._retention_cutoff()
+            if cutoff > self._hourly_cutoff:
+                self._hourly_cutoff = cutoff
+                self._prune_hourly()
+            self._save_rollups()
+            self._save_metadata()
+
+    def __len__(self):
+        return self._persisted_rows + len(self._buffer['timestamp'])
+
+    # ==================== Queries ====================
+    def summarize(self, date_range: Optional[Dict] = None, filters: Optional[Dict] = None,
+                  top_n: int = 3) -> Dict:
+        """
+        Summarize decisions in a date range.
+
+        Hour-aligned ranges without filters are answered from the rollups;
+        ad-hoc filters, sub-hour bounds or partial days older than the
+        hourly retention fall back to a column scan.
+        """
+        start, end = self._parse_range(date_range or {})
+
+        with self._lock:
+            if not filters and self._rollups_cover(start) and self._rollups_cover(end):
+                counters, fraud_types = self._summarize_rollups(start, end)
+                source = 'rollup'
+            else:
+                counters, fraud_types = self._summarize_scan(start, end, filters or {})
+                source = 'scan'
+
+            top_types = sorted(fraud_types.items(), key=lambda x: x[1], reverse=True)[:top_n]
+            top_fraud_types = [
+                {'type': self._dictionaries['fraud_type'][code], 'count': int(count)}
+                for code, count in top_types
+            ]
+
+        total = int(counters[0])
+        fraud = int(counters[1])
+        return {
+            'summary': {
+                'total_transactions': total,
+                'fraud_detected': fraud,
+                'fraud_rate': round(fraud / total * 100, 2) if total else 0.0,
+                'amount_saved': f'${counters[6]:,.0f}',
+                'average_risk_score': round(float(counters[7]) / total, 4) if total else 0.0
+            },
+            'decisions': {
+                'APPROVE': int(counters[2]),
+                'REVIEW': int(counters[3]),
+                'BLOCK': int(counters[4])
+            },
+            'top_fraud_types': top_fraud_types,
+            'source': source
+        }
+
+    def hourly_series(self, since_hour: Optional[int] = None) -> Dict[int, np.ndarray]:
+        """Snapshot of the retained hourly rollup counters keyed by epoch hour, optionally only after since_hour"""
+        with self._lock:
+            return {hour: np.array(bucket['counters']) for hour, bucket in self.hourly.items()
+                    if since_hour is None or hour > since_hour}
+
+    def read_columns(self, names: List[str]) -> Dict[str, np.ndarray]:
+        """Read whole columns (persisted rows plus the in-memory buffer)"""
+        with self._lock:
+            columns = {}
+            for name in names:
+                persisted = self._open_column(name)
+                buffered = np.asarray(self._buffer[name], dtype=self.COLUMNS[name])
+                columns[name] = np.concatenate([persisted, buffered]) if len(buffered) else persisted
+            return columns
+
+    # ==================== Internals ====================
+    def _summarize_rollups(self, start: Optional[float], end: Optional[float]):
+        """Sum rollup buckets, using whole days where possible"""
+        counters = np.zeros(len(ROLLUP_FIELDS))
+        fraud_types = {}
+
+        if start is None and end is None:
+            buckets = self.daily.values()
+        else:
+            # Open starts begin at the first day: early hours may be past retention
+            first_hour = int(start // 3600) if start is not None else min(self.daily, default=0) * 24
+            last_hour = int(end // 3600) if end is not None else max(self.hourly, default=-1) + 1
+            buckets = []
+            hour = first_hour
+            while hour < last_hour:
+                # Jump a whole day at a time once aligned to a day boundary
+                if hour % 24 == 0 and hour + 24 <= last_hour:
+                    bucket = self.daily.get(hour // 24)
+                    hour += 24
+                else:
+                    bucket = self.hourly.get(hour)
+                    hour += 1
+                if bucket is not None:
+                    buckets.append(bucket)
+
+        for bucket in buckets:
+            counters += np.asarray(bucket['counters'])
+            for code, count in bucket['fraud_types'].items():
+                fraud_types[code] = fraud_types.get(code, 0) + count
+
+        return counters, fraud_types
+
+    def _summarize_scan(self, start: Optional[float], end: Optional[float], filters: Dict):
+        """Answer a query by scanning the columns it needs"""
+        columns = self.read_columns(list(self.COLUMNS))
+        mask = np.ones(len(columns['timestamp']), dtype=bool)
+
+        if start is not None:
+            mask &= columns['timestamp'] >= start
+        if end is not None:
+            mask &= columns['timestamp'] < end
+        if 'merchant_category' in filters:
+            code = self._codes['merchant_category'].get(filters['merchant_category'], -1)
+            mask &= columns['merchant_category'] == code
+        if 'decision' in filters:
+            mask &= columns['decision'] == DECISIONS.index(filters['decision'])
+        if 'min_amount' in filters:
+            mask &= columns['amount'] >= float(filters['min_amount'])
+        if 'max_amount' in filters:
+            mask &= columns['amount'] <= float(filters['max_amount'])
+        if 'min_risk' in filters:
+            mask &= columns['risk_score'] >= float(filters['min_risk'])
+
+        decision = columns['decision'][mask]
+        is_fraud = columns['is_fraud'][mask].astype(bool)
+        amount = columns['amount'][mask].astype(np.float64)
+        blocked = decision == 2
+
+        counters = np.array([
+            mask.sum(), is_fraud.sum(),
+            (decision == 0).sum(), (decision == 1).sum(), blocked.sum(),
+            amount.sum(), amount[blocked].sum(),
+            columns['risk_score'][mask].astype(np.float64).sum()
+        ], dtype=np.float64)
+
+        codes, counts = np.unique(columns['fraud_type'][mask][is_fraud], return_counts=True)
+        return counters, dict(zip(codes.tolist(), counts.tolist()))
+
+    def _update_rollups(self, row: Dict):
+        """Fold a row into its hourly and daily buckets"""
+        blocked = row['decision'] == 2
+        hour = int(row['timestamp'] // 3600)
+        self._dirty_days.add(hour // 24)
+        for rollup, key in ((self.hourly, hour), (self.daily, hour // 24)):
+            if rollup is self.hourly and hour < self._hourly_cutoff:
+                continue
+            bucket = rollup.get(key)
+            if bucket is None:
+                bucket = rollup[key] = {'counters': [0.0] * len(ROLLUP_FIELDS), 'fraud_types': {}}
+            counters = bucket['counters']
+            counters[0] += 1
+            counters[1] += row['is_fraud']
+            counters[2 + row['decision']] += 1
+            counters[5] += row['amount']
+            if blocked:
+                counters[6] += row['amount']
+            counters[7] += row['risk_score']
+            if row['is_fraud']:
+                code = row['fraud_type']
+                bucket['fraud_types'][code] = bucket['fraud_types'].get(code, 0) + 1
+
+    def _encode(self, column: str, value) -> int:
+        """Dictionary-encode a categorical value"""
+        value = str(value)
+        with self._lock:
+            code = self._codes[column].get(value)
+            if code is None:
+                code = len(self._dictionaries[column])
+                self._dictionaries[column].append(value)
+                self._codes[column][value] = code
+            return code
+
+    def _resolve_timestamp(self, timestamp) -> float:
+        """Convert a transaction timestamp to epoch seconds (now if missing)"""
+        if isinstance(timestamp, datetime):
+            return timestamp.timestamp()
+        if isinstance(timestamp, str):
+            try:
+                return datetime.fromisoformat(timestamp).timestamp()
+            except ValueError:
+                pass
+        return datetime.now().timestamp()
+
+    def _parse_range(self, date_range: Dict):
+        """Parse {'start', 'end'} ISO bounds; a date-only end is inclusive"""
+        start = date_range.get('start')
+        end = date_range.get('end')
+        start_ts = datetime.fromisoformat(start).timestamp() if start else None
+        end_ts = None
+        if end:
+            end_dt = datetime.fromisoformat(end)
+            if len(end) <= 10:
+                end_dt += timedelta(days=1)
+            end_ts = end_dt.timestamp()
+        return start_ts, end_ts
+
+    def _rollups_cover(self, ts: Optional[float]) -> bool:
+        """Whether a range bound falls on a day, or on a retained hour"""
+        if ts is None or ts % 86400 == 0:
+            return True
+        return ts % 3600 == 0 and ts // 86400 * 24 >= self._hourly_cutoff
+
+    def _retention_cutoff(self) -> int:
+        # Wall clock rather than the newest row, so a future-dated timestamp cannot prune everything
+        return int(time.time() // 3600) - self.hourly_retention_days * 24
+
+    def _prune_hourly(self):
+        """Drop hourly buckets before the cutoff; their days are rewritten without them"""
+        for hour in [hour for hour in self.hourly if hour < self._hourly_cutoff]:
+            del self.hourly[hour]
+            self._dirty_days.add(hour // 24)
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f'{name}.bin')
+
+    def _open_column(self, name: str) -> np.ndarray:
+        """Memory-map a persisted column"""
+        if self._persisted_rows == 0:
+            return np.empty(0, dtype=self.COLUMNS[name])
+        return np.memmap(self._column_path(name), dtype=self.COLUMNS[name], mode='r',
+                         shape=(self._persisted_rows,))
+
+    def _save_metadata(self):
+        """Persist the row count and dictionaries next to the columns"""
+        metadata = {
+            'rows': self._persisted_rows,
+            'dictionaries': self._dictionaries
+        }
+        tmp_path = os.path.join(self.path, 'metadata.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, os.path.join(self.path, 'metadata.json'))
+
+    def _rollup_path(self, day: int) -> str:
+        return os.path.join(self.path, 'rollups', f'{day}.json')
+
+    def _save_rollups(self):
+        """Rewrite the rollup file of each day changed since the last flush"""
+        for day in self._dirty_days:
+            if day not in self.daily:
+                # Every row of the day was trimmed
+                if os.path.exists(self._rollup_path(day)):
+                    os.remove(self._rollup_path(day))
+                continue
+            hours = {str(hour): self._serialize_bucket(self.hourly[hour])
+                     for hour in range(day * 24, day * 24 + 24) if hour in self.hourly}
+            rollup = {
+                'rows': self._persisted_rows,
+                'daily': self._serialize_bucket(self.daily[day]),
+                'hourly': hours
+            }
+            tmp_path = self._rollup_path(day) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(rollup, f)
+            os.replace(tmp_path, self._rollup_path(day))
+        self._dirty_days = set()
+
+    def _load(self):
+        """Load dictionaries and rollups, trimming any torn column writes"""
+        metadata_path = os.path.join(self.path, 'metadata.json')
+        if not os.path.exists(metadata_path):
+            return
+
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+
+        self._dictionaries = metadata['dictionaries']
+        self._codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in self._dictionaries.items()
+        }
+        # Rows written after the last metadata save are not in the rollups;
+        # they are trimmed on the first flush so read-only openers never truncate
+        self._persisted_rows = metadata['rows']
+
+        if 'daily' in metadata:
+            # Written when all rollups lived in the metadata; moved to day files on the next flush
+            self.hourly = {int(k): self._deserialize_bucket(v) for k, v in metadata['hourly'].items()}
+            self.daily = {int(k): self._deserialize_bucket(v) for k, v in metadata['daily'].items()}
+            self._dirty_days = set(self.daily)
+
+        ahead = set()
+        for name in os.listdir(os.path.join(self.path, 'rollups')):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.path, 'rollups', name)) as f:
+                rollup = json.load(f)
+            day = int(name[:-len('.json')])
+            if rollup['rows'] > self._persisted_rows:
+                ahead.add(day)
+            self.daily[day] = self._deserialize_bucket(rollup['daily'])
+            self.hourly.update({int(k): self._deserialize_bucket(v) for k, v in rollup['hourly'].items()})
+
+        # A flush that stopped before its metadata save left these days counting rows that
+        # will be trimmed; recount them from the committed rows
+        if ahead:
+            self._recount_days(ahead)
+        self._prune_hourly()
+
+    def _recount_days(self, days: set):
+        """Rebuild the rollups of some days from the persisted columns"""
+        for day in days:
+            self.daily.pop(day, None)
+        self.hourly = {hour: bucket for hour, bucket in self.hourly.items() if hour // 24 not in days}
+        columns = {name: self._open_column(name) for name in self.COLUMNS}
+        row_days = (columns['timestamp'] // 3600).astype(np.int64) // 24
+        for i in np.flatnonzero(np.isin(row_days, list(days))):
+            self._update_rollups({name: columns[name][i].item() for name in self.COLUMNS})
+        self._dirty_days |= days
+
+    def _trim_columns(self):
+        """Drop column bytes beyond the rows recorded in the metadata"""
+        for name, dtype in self.COLUMNS.items():
+            path = self._column_path(name)
+            if os.path.exists(path):
+                size = self._persisted_rows * np.dtype(dtype).itemsize
+                if os.path.getsize(path) > size:
+                    with open(path, 'r+b') as f:
+                        f.truncate(size)
+
+    def _serialize_bucket(self, bucket: Dict) -> Dict:
+        return {
+            'counters': bucket['counters'],
+            'fraud_types': {str(k): v for k, v in bucket['fraud_types'].items()}
+        }
+
+    def _deserialize_bucket(self, data: Dict) -> Dict:
+        return {
+            'counters': [float(v) for v in data['counters']],
+            'fraud_types': {int(k): v for k, v in data['fraud_types'].items()}
+        }
@@ -0,0 +1,283 @@
+"""
+Performance benchmarks for the fraud detection backend
+Run from ml-models/, e.g.: python benchmark.py ingest --size-mb 1024
+                          python benchmark.py attributions --batch-sizes 1,100,1000
+                          python benchmark.py biometrics --sessions 1000000
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from werkzeug.test import create_environ
+
+sys.path.insert(0, '../backend')
+
+MERCHANT_CATEGORIES = ['retail', 'travel', 'food', 'gambling', 'cryptocurrency', 'money_transfer']
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_transaction(i):
+    """Generate one synthetic transaction"""
+    return {
+        'transaction_id': f'TXN{i:010d}',
+        'amount': round(random.uniform(5, 5000), 2),
+        'merchant_id': f'MER{random.randint(1, 5000)}',
+        'merchant_category': random.choice(MERCHANT_CATEGORIES),
+        'user_id': f'USR{random.randint(1, 100000)}',
+        'device_id': f'DEV{random.randint(1, 200000)}',
+        'location': {'lat': round(random.uniform(-60, 60), 4), 'lon': round(random.uniform(-180, 180), 4)},
+        'timestamp': f'2026-01-{random.randint(1, 28):02d}T{random.randint(0, 23):02d}:00:00',
+        'account_created': '2024-01-01T00:00:00',
+        'mcc_code': random.choice(['5411', '7995', '6051', '5814'])
+    }
+
+
+class SyntheticNDJSONStream(io.RawIOBase):
+    """Readable stream producing NDJSON transactions up to a byte budget, generated lazily"""
+
+    def __init__(self, size_bytes):
+        self.remaining = size_bytes
+        self.pending = bytearray()
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self.pending) < len(buffer) and self.remaining > 0:
+            line = (json.dumps(synthetic_transaction(self.rows)) + '\n').encode()
+            if len(line) > self.remaining:
+                line = b'\n' * self.remaining  # Pad to the exact size with blank lines
+            else:
+                self.rows += 1
+            self.remaining -= len(line)
+            self.pending += line
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        del self.pending[:n]
+        return n
+
+
+def benchmark_ingest(args):
+    """Stream an NDJSON body of the requested size through /api/batch-predict"""
+    os.environ.setdefault('SCORED_STORE_PATH', tempfile.mkdtemp(prefix='bench_store_'))
+    import app
+
+    if not app.fraud_detector.load_models(args.model_path):
+        sys.exit(f'No trained models found in {args.model_path}; run train_model.py first')
+
+    size_bytes = args.size_mb * 1024 * 1024
+    stream = SyntheticNDJSONStream(size_bytes)
+    environ = create_environ('/api/batch-predict', method='POST',
+                             content_type='application/x-ndjson')
+    environ['wsgi.input'] = stream
+    environ['CONTENT_LENGTH'] = str(size_bytes)
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    last_line = b''
+    for block in app.app(environ, lambda status, headers: None):
+        if block:
+            last_line = block.rstrip(b'\n').rsplit(b'\n', 1)[-1]
+    elapsed = time.perf_counter() - start
+
+    summary = json.loads(last_line)
+    print(f'Body size:        {args.size_mb} MB')
+    print(f'Rows scored:      {summary.get("total", 0)}')
+    print(f'Elapsed:          {elapsed:.1f} s ({summary.get("total", 0) / elapsed:,.0f} rows/s)')
+    print(f'Peak RSS:         {peak_rss_mb():.0f} MB (before request: {baseline_rss:.0f} MB)')
+
+
+def benchmark_attributions(args):
+    """Per-row latency of ensemble feature attributions at several batch sizes"""
+    import numpy as np
+    from models import FraudDetectionEnsemble
+    from data_processor import TransactionProcessor
+
+    detector = FraudDetectionEnsemble()
+    if not detector.load_models(args.model_path):
+        sys.exit(f'No trained models found in {args.model_path}; run train_model.py first')
+    processor = TransactionProcessor()
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    X = processor.extract_features_batch([synthetic_transaction(i) for i in range(max(batch_sizes))])
+    X_scaled = detector.scaler.transform(X)
+    detector.get_feature_attributions(X[:10])  # Warm up path tables
+
+    print(f'{"batch":>7} {"ensemble ms/row":>16}   per member ms/row')
+    for size in batch_sizes:
+        timings = {}
+        for name in detector.attributor.SUPPORTED_MEMBERS:
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                detector.attributor.member_contributions(name, detector.models[name], X_scaled[:size])
+            timings[name] = (time.perf_counter() - start) / args.repeats / size * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            detector.get_feature_attributions(X[:size])
+        total = (time.perf_counter() - start) / args.repeats / size * 1000
+
+        members = '  '.join(f'{name}={ms:.3f}' for name, ms in timings.items())
+        print(f'{size:>7} {total:>16.3f}   {members}')
+
+
+def benchmark_cases(args):
+    """Build a similar-case index of clustered vectors and time top-k queries"""
+    import numpy as np
+    from case_index import CaseIndex
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((200, 15)) * 3
+    vectors = (centers[rng.integers(0, 200, args.rows)] + rng.standard_normal((args.rows, 15))).astype(np.float32)
+    outcomes = rng.random(args.rows) < 0.02
+
+    index = CaseIndex(tempfile.mkdtemp(prefix='bench_cases_'), nprobe=args.nprobe)
+    start = time.perf_counter()
+    index.build(vectors, outcomes)
+    print(f'Built {len(index):,} cases into {index.nlist} lists in {time.perf_counter() - start:.1f}s')
+
+    index = CaseIndex(index.path, nprobe=args.nprobe)  # Reopen memory-mapped
+    queries = vectors[rng.choice(args.rows, args.queries)] + rng.standard_normal((args.queries, 15)).astype(np.float32) * 0.3
+    index.search(queries[0], k=args.k)
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, k=args.k)
+    elapsed = time.perf_counter() - start
+    print(f'Top-{args.k} search: {elapsed / args.queries * 1000:.3f} ms/query (nprobe={args.nprobe})')
+
+    start = time.perf_counter()
+    index.append(queries, np.ones(len(queries)))
+    print(f'Appended {len(queries)} cases in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+
+def synthetic_biometric_columns(n, rng):
+    """Columnar behavioral sessions with some missing values and sections"""
+    import numpy as np
+
+    def sometimes(values, missing=0.1):
+        values = values.astype(np.float64)
+        values[rng.random(n) < missing] = np.nan
+        return values
+
+    columns = {
+        'user_id': [f'USR{u}' for u in rng.integers(0, 100000, n)],
+        'device_fingerprint': [f'{d:016x}' for d in rng.integers(0, 200000, n)],
+        'typing_avg_time': sometimes(rng.gamma(9, 18, n)),
+        'typing_variance': sometimes(rng.gamma(4, 10, n)),
+        'typing_rhythm_score': sometimes(rng.random(n)),
+        'mouse_speed': sometimes(rng.gamma(3, 400, n)),
+        'mouse_curvature': sometimes(rng.random(n)),
+        'mouse_pauses': sometimes(rng.integers(0, 30, n)),
+        'device_vpn_detected': sometimes(rng.random(n) < 0.1),
+        'device_tor_detected': sometimes(rng.random(n) < 0.02),
+        'device_emulator_detected': sometimes(rng.random(n) < 0.02),
+        'session_duration': sometimes(rng.gamma(2, 60, n)),
+        'session_pages_visited': sometimes(rng.integers(0, 12, n)),
+        'session_direct_to_payment': sometimes(rng.random(n) < 0.1),
+        'session_failed_logins': sometimes(rng.integers(0, 4, n))
+    }
+    # Drop whole sections from some sessions
+    for section in ('typing', 'mouse', 'session'):
+        missing = rng.random(n) < 0.05
+        for name, values in columns.items():
+            if name.startswith(f'{section}_'):
+                values[missing] = np.nan
+    return columns
+
+
+def biometric_session(columns, i):
+    """Row i of the columnar data as an analyze_behavioral_patterns payload"""
+    import numpy as np
+    from behavioral_biometrics import SECTION_PREFIXES, BATCH_COLUMNS
+
+    session = {'user_id': columns['user_id'][i]}
+    for section, prefix in SECTION_PREFIXES.items():
+        data = {field: float(columns[f'{prefix}_{field}'][i]) for field in BATCH_COLUMNS[prefix]
+                if f'{prefix}_{field}' in columns and not np.isnan(columns[f'{prefix}_{field}'][i])}
+        if section == 'device_data':
+            data['fingerprint'] = columns['device_fingerprint'][i]
+        if data:
+            session[section] = data
+    return session
+
+
+def benchmark_biometrics(args):
+    """Columnar batch biometric scoring against the per-session analyzer"""
+    import numpy as np
+    from behavioral_biometrics import BiometricAnalyzer
+    from device_registry import DeviceRegistry
+
+    rng = np.random.default_rng(0)
+    columns = synthetic_biometric_columns(args.sessions, rng)
+    analyzer = BiometricAnalyzer(device_registry=DeviceRegistry(registers_log2=22))
+    # Per-session payloads carry raw device attributes; score the same fingerprint in both paths
+    analyzer._generate_device_fingerprint = lambda device_data: device_data.get('fingerprint', '')
+
+    start = time.perf_counter()
+    results = analyzer.analyze_batch(columns)
+    batch_elapsed = time.perf_counter() - start
+
+    sample = rng.choice(args.sessions, min(args.sample, args.sessions), replace=False)
+    sessions = [biometric_session(columns, i) for i in sample]
+    start = time.perf_counter()
+    single = [analyzer.analyze_behavioral_patterns(session) for session in sessions]
+    single_elapsed = time.perf_counter() - start
+
+    scores = np.array([result['biometric_risk_score'] for result in single])
+    levels = np.array([result['risk_level'] for result in single])
+    matches = np.array_equal(scores, results['biometric_risk_score'][sample]) and \
+        np.array_equal(levels, results['risk_level'][sample])
+
+    batch_rate = args.sessions / batch_elapsed
+    single_rate = len(sample) / single_elapsed
+    print(f'Batch:       {args.sessions:,} sessions in {batch_elapsed:.2f} s ({batch_rate:,.0f} sessions/s)')
+    print(f'Per session: {len(sample):,} sessions in {single_elapsed:.2f} s ({single_rate:,.0f} sessions/s)')
+    print(f'Speedup:     {batch_rate / single_rate:.0f}x')
+    print(f'Results identical on the sample: {matches}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fraud detection performance benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Streaming NDJSON ingestion via /api/batch-predict')
+    ingest.add_argument('--size-mb', type=int, default=1024)
+    ingest.add_argument('--model-path', default='models/')
+    ingest.set_defaults(func=benchmark_ingest)
+
+    attributions = subparsers.add_parser('attributions', help='Feature attribution latency per row')
+    attributions.add_argument('--batch-sizes', default='1,100,1000')
+    attributions.add_argument('--repeats', type=int, default=5)
+    attributions.add_argument('--model-path', default='models/')
+    attributions.set_defaults(func=benchmark_attributions)
+
+    cases = subparsers.add_parser('cases', help='Similar-case index search latency')
+    cases.add_argument('--rows', type=int, default=3000000)
+    cases.add_argument('--queries', type=int, default=1000)
+    cases.add_argument('--nprobe', type=int, default=8)
+    cases.add_argument('-k', type=int, default=3)
+    cases.set_defaults(func=benchmark_cases)
+
+    biometrics = subparsers.add_parser('biometrics', help='Columnar batch biometric analysis throughput')
+    biometrics.add_argument('--sessions', type=int, default=1000000)
+    biometrics.add_argument('--sample', type=int, default=20000, help='sessions scored one at a time for comparison')
+    biometrics.set_defaults(func=benchmark_biometrics)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
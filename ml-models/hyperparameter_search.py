@@ -0,0 +1,359 @@
+"""
+Hyperparameter Search - Hyperband over the ensemble members' hyperparameters
+Maximizes validation ROC-AUC of the weighted ensemble subject to a p99 single-row scoring latency budget;
+the chosen configuration is reported on a test split that took no part in the search
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../backend'))
+
+from config import Config
+from models import DEFAULT_HYPERPARAMETERS, THREADED_MEMBERS, FraudDetectionEnsemble
+
+# Sampled per member: ('int' | 'log_int', low, high), ('uniform' | 'log', low, high) or ('choice', options)
+SEARCH_SPACE = {
+    'xgboost': {
+        'n_estimators': ('log_int', 50, 600),
+        'max_depth': ('int', 3, 10),
+        'learning_rate': ('log', 0.02, 0.3),
+        'min_child_weight': ('log', 1, 20),
+        'subsample': ('uniform', 0.6, 1.0),
+        'colsample_bytree': ('uniform', 0.5, 1.0),
+        'scale_pos_weight': ('log', 1, 20)
+    },
+    'lightgbm': {
+        'n_estimators': ('log_int', 50, 600),
+        'num_leaves': ('log_int', 15, 255),
+        'max_depth': ('choice', [-1, 5, 7, 10]),
+        'learning_rate': ('log', 0.02, 0.3),
+        'min_child_samples': ('log_int', 5, 100),
+        'colsample_bytree': ('uniform', 0.5, 1.0)
+    },
+    'random_forest': {
+        'n_estimators': ('log_int', 20, 300),
+        'max_depth': ('choice', [8, 12, 15, 20, None]),
+        'min_samples_leaf': ('log_int', 1, 20),
+        'max_features': ('choice', ['sqrt', 0.3, 0.6])
+    },
+    'gradient_boosting': {
+        'n_estimators': ('log_int', 50, 400),
+        'max_depth': ('int', 2, 6),
+        'learning_rate': ('log', 0.02, 0.3),
+        'subsample': ('uniform', 0.6, 1.0)
+    },
+    'logistic_regression': {
+        'C': ('log', 1e-3, 100)
+    },
+    'svm': {
+        'C': ('log', 0.1, 100),
+        'gamma': ('choice', ['scale', 0.01, 0.03, 0.1])
+    }
+}
+
+# Members whose n_estimators is the round/tree budget scaled down on early rungs
+ROUND_MEMBERS = ('xgboost', 'lightgbm', 'gradient_boosting', 'random_forest')
+EARLY_STOPPING_ROUNDS = 20
+MIN_TRIAL_ROWS = 500
+LATENCY_SAMPLES = 300
+
+# Per-process search data for pool workers
+_worker = {}
+
+
+def _sample(spec, rng):
+    kind = spec[0]
+    if kind == 'choice':
+        return spec[1][rng.integers(len(spec[1]))]
+    if kind == 'int':
+        return int(rng.integers(spec[1], spec[2] + 1))
+    if kind == 'log_int':
+        return int(round(math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2])))))
+    if kind == 'log':
+        return float(math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2]))))
+    return float(rng.uniform(spec[1], spec[2]))
+
+
+def sample_config(rng):
+    """One random configuration: per-member overrides of DEFAULT_HYPERPARAMETERS"""
+    return {name: {param: _sample(spec, rng) for param, spec in space.items()}
+            for name, space in SEARCH_SPACE.items()}
+
+
+def _init_worker(data):
+    from threadpoolctl import threadpool_limits
+
+    # One core per trial, as a serving worker would score
+    threadpool_limits(limits=1)
+    # eval_X/eval_y replace eval_set only from LightGBM 4.6; requirements allow 4.0
+    warnings.filterwarnings('ignore', message=".*'eval_set' is deprecated")
+    _worker.update(data)
+
+
+def _budgeted(config, budget):
+    """Copy of config with every round/tree count scaled to the budget"""
+    scaled = {name: dict(params) for name, params in config.items()}
+    for name in ROUND_MEMBERS:
+        rounds = scaled.get(name, {}).get('n_estimators', DEFAULT_HYPERPARAMETERS[name]['n_estimators'])
+        scaled.setdefault(name, {})['n_estimators'] = max(10, int(math.ceil(rounds * budget)))
+    return scaled
+
+
+def _fit(name, model, X, y, X_stop, y_stop):
+    """Fit one member single-threaded, boosters early-stopped on X_stop; returns rounds kept"""
+    param = THREADED_MEMBERS.get(name)
+    original = model.get_params()[param] if param else None
+    if param:
+        model.set_params(**{param: 1})
+
+    if name == 'xgboost':
+        model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS, eval_metric='auc')
+        model.fit(X, y, eval_set=[(X_stop, y_stop)], verbose=False)
+        rounds = model.best_iteration + 1
+        model.set_params(early_stopping_rounds=None)
+    elif name == 'lightgbm':
+        import lightgbm as lgb
+        model.set_params(verbose=-1)
+        model.fit(X, y, eval_set=[(X_stop, y_stop)], eval_metric='auc',
+                  callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        rounds = model.best_iteration_ or model.n_estimators
+    elif name == 'gradient_boosting':
+        # No eval_set: stops on its own 10% validation split
+        model.set_params(n_iter_no_change=EARLY_STOPPING_ROUNDS, validation_fraction=0.1)
+        model.fit(X, y)
+        rounds = int(model.n_estimators_)
+        if rounds < model.n_estimators:
+            # Stopped early: the last EARLY_STOPPING_ROUNDS stages did not improve, so drop them
+            rounds = max(1, rounds - EARLY_STOPPING_ROUNDS)
+            model.estimators_ = model.estimators_[:rounds]
+            model.train_score_ = model.train_score_[:rounds]
+            model.n_estimators_ = rounds
+    else:
+        model.fit(X, y)
+        rounds = getattr(model, 'n_estimators', None)
+
+    if param:
+        model.set_params(**{param: original})
+    return rounds
+
+
+def evaluate_trial(trial_id, config, budget, seed):
+    """
+    Train one ensemble on a budget fraction of the rows and of each member's rounds
+    Returns validation ROC-AUC, p99 single-row scoring latency and the rounds early stopping kept;
+    full-budget trials also report test ROC-AUC, which selection never reads
+    """
+    start = time.perf_counter()
+    X, y = _worker['X_train'], _worker['y_train']
+    if budget < 1:
+        rows = max(MIN_TRIAL_ROWS, int(len(y) * budget))
+        if rows < len(y):
+            X, _, y, _ = train_test_split(X, y, train_size=rows, stratify=y, random_state=seed)
+
+    ensemble = FraudDetectionEnsemble(hyperparameters=_budgeted(config, budget))
+    X_scaled = ensemble.scaler.fit_transform(X)
+    X_stop = ensemble.scaler.transform(_worker['X_stop'])
+    rounds = {name: _fit(name, model, X_scaled, y, X_stop, _worker['y_stop'])
+              for name, model in ensemble.models.items()}
+
+    scores = ensemble.get_risk_scores(_worker['X_val'])
+    latencies = np.empty(LATENCY_SAMPLES)
+    rows = _worker['X_val'][:LATENCY_SAMPLES]
+    ensemble.get_risk_scores(rows[:1])  # Warm-up
+    for i in range(LATENCY_SAMPLES):
+        row = rows[i % len(rows)].reshape(1, -1)
+        tick = time.perf_counter()
+        ensemble.get_risk_scores(row)
+        latencies[i] = time.perf_counter() - tick
+
+    result = {
+        'budget': round(budget, 4),
+        'roc_auc': float(roc_auc_score(_worker['y_val'], scores)),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'rounds': rounds,
+        'rows': int(len(y)),
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+    if budget >= 1:
+        result['test_roc_auc'] = float(roc_auc_score(_worker['y_test'],
+                                                     ensemble.get_risk_scores(_worker['X_test'])))
+    return trial_id, result
+
+
+class HyperbandSearch:
+    """
+    Hyperband: successive-halving brackets of random configurations.
+
+    A trial at budget b trains on a fraction b of the rows with every
+    member's n_estimators scaled by b. XGBoost and LightGBM early-stop on
+    a separate split; gradient boosting on its own validation fraction. Each
+    rung keeps the best 1/eta by validation ROC-AUC and runs them at eta
+    times the budget. Trials in a rung run in parallel, one core each.
+
+    A trial over the p99 latency budget is dropped at any rung: more rows
+    and rounds only make members larger. Only results at full budget can
+    win, so the chosen configuration's latency was measured as trained.
+    The defaults are always evaluated at full budget as the baseline.
+
+    Selection reads only validation ROC-AUC, so that score is biased
+    upwards for the winner. A stratified test split, used by nothing else,
+    gives the ROC-AUC reported for the winner and the baseline.
+    """
+
+    def __init__(self, p99_budget_ms, eta=3, min_budget=1 / 27, workers=None, seed=42):
+        self.p99_budget_ms = p99_budget_ms
+        self.eta = eta
+        self.min_budget = min_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = np.random.default_rng(seed)
+        self.trials = {}   # trial_id -> {'config', 'results': [per-rung results]}
+
+    def brackets(self):
+        """(configs, starting budget) per bracket, most aggressive first"""
+        s_max = int(round(math.log(1 / self.min_budget, self.eta)))
+        return [(int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s)), self.eta ** -s)
+                for s in range(s_max, -1, -1)]
+
+    def run(self, X, y, max_brackets=None):
+        start = time.perf_counter()
+        # train 60% / early stopping 10% / validation 15% / test 15%
+        X, X_test, y, y_test = train_test_split(X, y, test_size=0.15, stratify=y, random_state=42)
+        X_train, X_rest, y_train, y_rest = train_test_split(X, y, test_size=0.25 / 0.85, stratify=y,
+                                                            random_state=42)
+        X_stop, X_val, y_stop, y_val = train_test_split(X_rest, y_rest, test_size=0.6, stratify=y_rest,
+                                                        random_state=42)
+        data = {'X_train': X_train, 'y_train': y_train, 'X_stop': X_stop, 'y_stop': y_stop,
+                'X_val': X_val, 'y_val': y_val, 'X_test': X_test, 'y_test': y_test}
+
+        brackets = self.brackets()[:max_brackets] if max_brackets else self.brackets()
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(data,)) as pool:
+            self._rung(pool, [self._new_trial({})], 1.0)  # Baseline: the current defaults
+            for n_configs, budget in brackets:
+                trials = [self._new_trial(sample_config(self.rng)) for _ in range(n_configs)]
+                print(f"Bracket: {n_configs} configurations from budget {budget:.3f}")
+                self._successive_halving(pool, trials, budget)
+
+        return self._summary(time.perf_counter() - start, len(y_train))
+
+    def _new_trial(self, config):
+        trial_id = len(self.trials)
+        self.trials[trial_id] = {'config': config, 'results': []}
+        return trial_id
+
+    def _successive_halving(self, pool, trials, budget):
+        while trials:
+            results = self._rung(pool, trials, budget)
+            feasible = [t for t in trials if results[t]['p99_ms'] <= self.p99_budget_ms]
+            best = max((results[t]['roc_auc'] for t in feasible), default=float('nan'))
+            print(f"   budget {budget:.3f}: {len(trials)} trials, {len(feasible)} within "
+                  f"{self.p99_budget_ms:g} ms p99, best ROC-AUC {best:.4f}")
+            if budget >= 1:
+                return
+            keep = max(1, len(trials) // self.eta)
+            trials = sorted(feasible, key=lambda t: -results[t]['roc_auc'])[:keep]
+            budget = min(1.0, budget * self.eta)
+
+    def _rung(self, pool, trials, budget):
+        futures = [pool.submit(evaluate_trial, t, self.trials[t]['config'], budget,
+                               int(self.rng.integers(2 ** 31))) for t in trials]
+        results = {}
+        for future in futures:
+            trial_id, result = future.result()
+            self.trials[trial_id]['results'].append(result)
+            results[trial_id] = result
+        return results
+
+    def _final(self, trial_id):
+        """Configuration as trained at full budget, with the rounds early stopping kept"""
+        result = self.trials[trial_id]['results'][-1]
+        members = {name: dict(params) for name, params in self.trials[trial_id]['config'].items()}
+        for name in ('xgboost', 'lightgbm', 'gradient_boosting'):
+            members.setdefault(name, {})['n_estimators'] = int(result['rounds'][name])
+        return members
+
+    def _summary(self, seconds, train_rows):
+        finished = {t: trial['results'][-1] for t, trial in self.trials.items()
+                    if trial['results'] and trial['results'][-1]['budget'] >= 1}
+        feasible = [t for t, result in finished.items() if result['p99_ms'] <= self.p99_budget_ms]
+        best = max(feasible, key=lambda t: finished[t]['roc_auc'], default=None)
+        return {
+            'members': self._final(best) if best is not None else None,
+            'search': {
+                'roc_auc': finished[best]['test_roc_auc'] if best is not None else None,
+                'validation_roc_auc': finished[best]['roc_auc'] if best is not None else None,
+                'p99_ms': finished[best]['p99_ms'] if best is not None else None,
+                'p99_budget_ms': self.p99_budget_ms,
+                'baseline': finished.get(0),
+                'trials': len(self.trials),
+                'evaluations': sum(len(trial['results']) for trial in self.trials.values()),
+                'full_budget_trials': len(finished),
+                'feasible_full_budget_trials': len(feasible),
+                'train_rows': train_rows,
+                'eta': self.eta,
+                'min_budget': self.min_budget,
+                'workers': self.workers,
+                'seconds': round(seconds, 1),
+                'created_at': datetime.now().isoformat()
+            }
+        }
+
+
+def load_search_data(args):
+    """Feature matrix sample from --data, or the synthetic training set"""
+    if args.data:
+        from training_data import build_feature_matrix
+        matrix = build_feature_matrix(args.data, os.path.join(args.work_dir, 'features'),
+                                      label_field=args.label_field)
+        return matrix.sample(args.max_rows)
+    from train_model import generate_synthetic_data
+    return generate_synthetic_data(n_samples=10000)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hyperband search over the ensemble hyperparameters')
+    parser.add_argument('--data', help='Labeled transactions file; synthetic data if omitted')
+    parser.add_argument('--work-dir', default='data/training/')
+    parser.add_argument('--label-field', default='is_fraud')
+    parser.add_argument('--max-rows', type=int, default=200000, help='Stratified sample searched over')
+    parser.add_argument('--p99-ms', type=float, default=Config.SCORING_P99_BUDGET_MS,
+                        help='p99 single-row ensemble scoring latency budget')
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--min-budget', type=float, default=1 / 27)
+    parser.add_argument('--brackets', type=int, help='Run only the N most aggressive brackets')
+    parser.add_argument('--workers', type=int, help='Parallel trials (default: all cores)')
+    parser.add_argument('--output', default='models/hyperparameters.json')
+    args = parser.parse_args()
+
+    X, y = load_search_data(args)
+    print(f"Searching on {len(y):,} rows ({int(np.sum(y)):,} fraud), p99 budget {args.p99_ms:g} ms")
+    search = HyperbandSearch(args.p99_ms, args.eta, args.min_budget, args.workers)
+    result = search.run(X, y, args.brackets)
+    summary = result['search']
+
+    baseline = summary['baseline']
+    print(f"\nDefaults: test ROC-AUC {baseline['test_roc_auc']:.4f}, p99 {baseline['p99_ms']:.2f} ms")
+    if result['members'] is None:
+        print(f"No configuration met the {args.p99_ms:g} ms p99 budget; {args.output} not written")
+        sys.exit(1)
+    print(f"Best:     test ROC-AUC {summary['roc_auc']:.4f} (validation {summary['validation_roc_auc']:.4f}), "
+          f"p99 {summary['p99_ms']:.2f} ms "
+          f"({summary['trials']} configurations, {summary['evaluations']} trials, {summary['seconds']:.0f}s)")
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved: {args.output} (used by train_model.py)")
@@ -0,0 +1,168 @@
+"""
+Offline bulk scorer
+Scores a JSON/NDJSON/CSV/Parquet transaction file with the trained ensemble
+and writes decisions to Parquet, without the Flask server.
+
+Usage:
+    python score_file.py transactions.ndjson --output decisions.parquet
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../backend'))
+
+from batch_scoring import score_chunk
+from config import Config
+from stream_ingest import iter_ndjson_chunks, iter_csv_chunks, iter_json_array_chunks
+
+FORMATS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet'
+}
+
+# Per-process model state for pool workers
+_worker = {}
+
+
+def init_worker(model_path):
+    """Load the trained ensemble once per worker process"""
+    from threadpoolctl import threadpool_limits
+    from models import FraudDetectionEnsemble
+    from data_processor import TransactionProcessor
+
+    # One thread per worker: the pool already fans out across cores
+    threadpool_limits(limits=1)
+
+    detector = FraudDetectionEnsemble()
+    if not detector.load_models(model_path):
+        raise RuntimeError(f'No trained models found in {model_path}')
+    _worker['detector'] = detector
+    _worker['processor'] = TransactionProcessor()
+
+
+def score_rows(transactions):
+    """Score one chunk in a worker process"""
+    return score_chunk(_worker['detector'], _worker['processor'], transactions)
+
+
+def iter_file_chunks(path, file_format, chunk_rows):
+    """Stream a transaction file in chunks of rows"""
+    if file_format == 'parquet':
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pylist()
+        return
+
+    readers = {'json': iter_json_array_chunks, 'ndjson': iter_ndjson_chunks, 'csv': iter_csv_chunks}
+    with open(path, 'rb') as f:
+        yield from readers[file_format](f, chunk_rows)
+
+
+def scored_chunks(chunks, workers, model_path):
+    """
+    Score chunks across a process pool, yielding results in input order.
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    for files larger than RAM.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker, initargs=(model_path,)) as executor:
+        inflight = deque()
+        for chunk in chunks:
+            inflight.append(executor.submit(score_rows, chunk))
+            if len(inflight) >= 2 * workers:
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+
+def build_schema(model_names):
+    return pa.schema(
+        [
+            ('transaction_id', pa.string()),
+            ('is_fraud', pa.bool_()),
+            ('risk_score', pa.float64()),
+            ('recommendation', pa.string())
+        ] + [(f'prob_{name}', pa.float64()) for name in model_names]
+    )
+
+
+def to_table(scores, schema, model_names):
+    columns = {
+        'transaction_id': [None if t is None else str(t) for t in scores['transaction_id']],
+        'is_fraud': scores['is_fraud'],
+        'risk_score': scores['risk_score'],
+        'recommendation': scores['recommendation']
+    }
+    for i, name in enumerate(model_names):
+        columns[f'prob_{name}'] = scores['model_probabilities'][:, i]
+    return pa.table(columns, schema=schema)
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of the largest worker, in MB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a transaction file offline')
+    parser.add_argument('input', help='JSON, NDJSON, CSV or Parquet transaction file')
+    parser.add_argument('--output', '-o', help='Output Parquet file (default: <input>.scored.parquet)')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                        help='Input format (default: from file extension)')
+    parser.add_argument('--model-path', default=Config.ML_MODEL_PATH)
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    file_format = args.format or FORMATS.get(os.path.splitext(args.input)[1].lower())
+    if file_format is None:
+        sys.exit(f'Cannot infer format of {args.input}; pass --format')
+    output = args.output or f'{os.path.splitext(args.input)[0]}.scored.parquet'
+
+    from models import FraudDetectionEnsemble
+    model_names = list(FraudDetectionEnsemble().models)
+    schema = build_schema(model_names)
+
+    print(f'Scoring {args.input} ({file_format}) with {args.workers} workers...')
+    start = time.perf_counter()
+    rows = 0
+    fraud = 0
+
+    with pq.ParquetWriter(output, schema) as writer:
+        chunks = iter_file_chunks(args.input, file_format, args.chunk_rows)
+        for scores in scored_chunks(chunks, args.workers, args.model_path):
+            writer.write_table(to_table(scores, schema, model_names))
+            rows += len(scores['risk_score'])
+            fraud += int(scores['is_fraud'].sum())
+            elapsed = time.perf_counter() - start
+            print(f'   {rows:,} rows  ({rows / elapsed:,.0f} rows/s)', end='\r', flush=True)
+
+    elapsed = time.perf_counter() - start
+    own_rss, worker_rss = peak_rss_mb()
+    print()
+    print(f'Scored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)')
+    print(f'Fraud detected: {fraud:,}')
+    print(f'Peak RSS: {own_rss:.0f} MB (main), {worker_rss:.0f} MB (largest worker)')
+    print(f'Decisions written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -25,8 +25,7 @@ def check_models_exist():
         'gradient_boosting_model.pkl',
         'logistic_regression_model.pkl',
         'svm_model.pkl',
-        'scaler.pkl',
-        'pca.pkl'
+        'scaler.pkl'
     ]
     
     missing = []
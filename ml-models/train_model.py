@@ -3,23 +3,40 @@ Model training and evaluation script
 Trains the ensemble fraud detection model on transaction data
 """
 
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split, StratifiedKFold
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
+from sklearn.metrics import (classification_report, confusion_matrix, roc_auc_score, roc_curve,
+                             average_precision_score, precision_recall_fscore_support)
 from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 import seaborn as sns
 import sys
 sys.path.insert(0, '../backend')
 
-from models import FraudDetectionEnsemble
+from models import FraudDetectionEnsemble, load_hyperparameters
 from data_processor import TransactionProcessor
+from case_index import CaseIndex
+from training_data import build_feature_matrix, train_out_of_core, peak_rss_mb
 
 # Configuration
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
 N_FOLDS = 5
+# Written by hyperparameter_search.py; defaults from models.py when absent
+HYPERPARAMETERS_FILE = 'models/hyperparameters.json'
+# Out-of-core runs: rows scored per evaluation batch and in-memory sample sizes
+EVAL_BATCH_ROWS = 200000
+IMPORTANCE_SAMPLE_ROWS = 100000
+CASE_INDEX_SAMPLE_ROWS = 1000000
 
 
 def generate_synthetic_data(n_samples=10000):
@@ -43,11 +60,67 @@ def generate_synthetic_data(n_samples=10000):
     return X, y
 
 
+def evaluate_predictions(y_true, y_pred, y_proba):
+    """Threshold and ranking metrics for one evaluation set"""
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        y_true, y_pred, average='binary', zero_division=0
+    )
+    return {
+        'accuracy': float(np.mean(y_pred == y_true)),
+        'roc_auc': float(roc_auc_score(y_true, y_proba)),
+        'average_precision': float(average_precision_score(y_true, y_proba)),
+        'precision': float(precision),
+        'recall': float(recall),
+        'f1': float(f1)
+    }
+
+
+def run_cv_fold(fold, X, y, train_idx, val_idx, n_jobs=1):
+    """Train a fresh ensemble on one fold and score its validation rows as one matrix"""
+    start = time.perf_counter()
+    ensemble = FraudDetectionEnsemble(hyperparameters=load_hyperparameters(HYPERPARAMETERS_FILE))
+    with contextlib.redirect_stdout(io.StringIO()):
+        ensemble.train(X[train_idx], y[train_idx], n_jobs=n_jobs)
+    
+    X_val, y_val = X[val_idx], y[val_idx]
+    y_pred = ensemble.predict_batch(X_val)
+    y_proba = ensemble.get_risk_scores(X_val)
+    metrics = evaluate_predictions(y_val, y_pred, y_proba)
+    metrics['seconds'] = time.perf_counter() - start
+    return fold, metrics
+
+
+def cross_validate(X, y, n_folds=N_FOLDS, workers=None):
+    """
+    Stratified k-fold CV with every fold in its own spawned worker process
+    Cores left over after one worker per fold go to each fold's member training
+    """
+    cores = os.cpu_count() or 1
+    workers = workers or min(n_folds, cores)
+    fold_jobs = max(1, cores // workers)
+    skf = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    splits = list(skf.split(X, y))
+    
+    results = {}
+    if workers == 1:
+        for fold, (train_idx, val_idx) in enumerate(splits):
+            results[fold] = run_cv_fold(fold, X, y, train_idx, val_idx, fold_jobs)[1]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(run_cv_fold, fold, X, y, train_idx, val_idx, fold_jobs)
+                       for fold, (train_idx, val_idx) in enumerate(splits)]
+            for future in futures:
+                fold, metrics = future.result()
+                results[fold] = metrics
+    return [results[fold] for fold in range(n_folds)]
+
+
 def train_ensemble_model():
     """Train the ensemble model"""
     print("=" * 60)
     print("FRAUD DETECTION ENSEMBLE MODEL TRAINING")
     print("=" * 60)
+    run_start = time.perf_counter()
     
     # Generate synthetic data
     print("\n1. Generating synthetic transaction data...")
@@ -66,43 +139,40 @@ def train_ensemble_model():
     
     # Initialize and train ensemble
     print("\n3. Training ensemble models...")
-    ensemble = FraudDetectionEnsemble()
-    ensemble.train(X_train, y_train)
+    ensemble = FraudDetectionEnsemble(hyperparameters=load_hyperparameters(HYPERPARAMETERS_FILE))
+    report = ensemble.train(X_train, y_train)
+    for name, seconds in sorted(report['member_seconds'].items(), key=lambda item: -item[1]):
+        print(f"   - {name}: {seconds:.2f}s ({report['member_threads'][name]} threads)")
+    print(f"   Wall clock: {report['wall_seconds']:.2f}s on {report['n_jobs']} cores")
     
-    # Cross-validation
+    # Cross-validation: each fold trains its own ensemble, in parallel
     print("\n4. Performing cross-validation...")
-    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=RANDOM_STATE)
-    cv_scores = []
-    
-    for fold, (train_idx, val_idx) in enumerate(skf.split(X_train, y_train)):
-        X_cv_train = X_train[train_idx]
-        y_cv_train = y_train[train_idx]
-        X_cv_val = X_train[val_idx]
-        y_cv_val = y_train[val_idx]
-        
-        # Train on fold
-        ensemble.train(X_cv_train, y_cv_train)
-        
-        # Evaluate
-        predictions = np.array([ensemble.predict(x) for x in X_cv_val])
-        accuracy = np.mean(predictions == y_cv_val)
-        cv_scores.append(accuracy)
-        print(f"   Fold {fold+1}/{N_FOLDS}: Accuracy = {accuracy:.4f}")
-    
-    print(f"   Average CV Accuracy: {np.mean(cv_scores):.4f} (+/- {np.std(cv_scores):.4f})")
-    
-    # Test set evaluation
+    cv_start = time.perf_counter()
+    cv_metrics = cross_validate(X_train, y_train)
+    for fold, metrics in enumerate(cv_metrics):
+        print(f"   Fold {fold+1}/{N_FOLDS}: Accuracy = {metrics['accuracy']:.4f}, "
+              f"ROC-AUC = {metrics['roc_auc']:.4f}, PR-AUC = {metrics['average_precision']:.4f}, "
+              f"Precision = {metrics['precision']:.4f}, Recall = {metrics['recall']:.4f} "
+              f"({metrics['seconds']:.1f}s)")
+    for metric in ('accuracy', 'roc_auc', 'average_precision', 'precision', 'recall', 'f1'):
+        values = [metrics[metric] for metrics in cv_metrics]
+        print(f"   Average CV {metric}: {np.mean(values):.4f} (+/- {np.std(values):.4f})")
+    print(f"   Cross-validation wall clock: {time.perf_counter() - cv_start:.1f}s")
+    
+    # Test set evaluation, scored as one matrix
     print("\n5. Evaluating on test set...")
-    y_pred = np.array([ensemble.predict(x) for x in X_test])
-    y_proba = np.array([ensemble.get_risk_score(x) for x in X_test])
+    probabilities = ensemble.predict_proba_matrix(X_test)
+    y_pred = ensemble.predict_batch(X_test)
+    y_proba = ensemble.get_risk_scores(X_test, probabilities)
+    test_metrics = evaluate_predictions(y_test, y_pred, y_proba)
     
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred, 
                               target_names=['Legitimate', 'Fraud']))
     
-    # ROC-AUC
-    roc_auc = roc_auc_score(y_test, y_proba)
-    print(f"\nROC-AUC Score: {roc_auc:.4f}")
+    # ROC-AUC and precision-recall
+    print(f"\nROC-AUC Score: {test_metrics['roc_auc']:.4f}")
+    print(f"PR-AUC (average precision): {test_metrics['average_precision']:.4f}")
     
     # Confusion Matrix
     cm = confusion_matrix(y_test, y_pred)
@@ -115,15 +185,32 @@ def train_ensemble_model():
     print(f"  - False Negatives: {fn}")
     print(f"  - True Positives: {tp}")
     
+    # Global feature importance, stored with the models for /api/model-stats
+    print("\n6. Computing global feature importance...")
+    importance = ensemble.compute_feature_importance(
+        X_test, y_test, feature_names=TransactionProcessor().get_feature_names()
+    )
+    top = np.argsort(importance['permutation']['ensemble'])[::-1][:5]
+    for i in top:
+        print(f"   - {importance['features'][i]}: AUC drop {importance['permutation']['ensemble'][i]:.4f}, "
+              f"gain {importance['gain']['ensemble'][i]:.3f}")
+    
     # Save models
-    print("\n6. Saving trained models...")
+    print("\n7. Saving trained models...")
     ensemble.save_models('models/')
     print("   Models saved successfully!")
     
+    # Index labeled training cases for similar-case lookups
+    case_index = CaseIndex('models/case_index/')
+    case_index.build(ensemble.scaler.transform(X_train), y_train,
+                     case_ids=[f'TRAIN_{i:07d}' for i in range(len(X_train))])
+    print(f"   Similar-case index built: {len(case_index)} cases")
+    
     # Generate visualizations
-    print("\n7. Generating visualizations...")
+    print("\n8. Generating visualizations...")
     generate_visualizations(y_test, y_pred, y_proba, cm)
     
+    print(f"\nTotal time: {time.perf_counter() - run_start:.1f}s")
     print("\n" + "=" * 60)
     print("TRAINING COMPLETE!")
     print("=" * 60)
@@ -131,6 +218,94 @@ def train_ensemble_model():
     return ensemble, (X_train, X_test, y_train, y_test)
 
 
+def train_from_file(source, work_dir='data/training/', chunk_rows=50000, label_field='is_fraud',
+                    test_fraction=TEST_SIZE):
+    """
+    Train the ensemble on a labeled transaction file without loading it into memory
+    Rows are assumed to be in time order; the last test_fraction is held out
+    """
+    print("=" * 60)
+    print("FRAUD DETECTION ENSEMBLE MODEL TRAINING (OUT-OF-CORE)")
+    print("=" * 60)
+    run_start = time.perf_counter()
+    
+    print(f"\n1. Extracting features from {source}...")
+    matrix = build_feature_matrix(source, os.path.join(work_dir, 'features'), chunk_rows=chunk_rows,
+                                  label_field=label_field)
+    fraud = int(np.count_nonzero(matrix.y))
+    print(f"   - Total samples: {len(matrix):,}")
+    print(f"   - Fraud cases: {fraud:,} ({fraud/len(matrix)*100:.2f}%)")
+    print(f"   - Feature matrix: {matrix.X.nbytes / 1024**2:,.1f} MB on disk")
+    print(f"   Extraction wall clock: {time.perf_counter() - run_start:.1f}s")
+    
+    print("\n2. Splitting data into train/test sets (time-ordered)...")
+    train, test = matrix.split(test_fraction)
+    print(f"   - Training set: {len(train):,} samples")
+    print(f"   - Test set: {len(test):,} samples")
+    
+    print("\n3. Training ensemble models...")
+    ensemble = FraudDetectionEnsemble(hyperparameters=load_hyperparameters(HYPERPARAMETERS_FILE))
+    report = train_out_of_core(ensemble, train, work_dir)
+    for name, seconds in sorted(report['member_seconds'].items(), key=lambda item: -item[1]):
+        print(f"   - {name}: {seconds:.2f}s on {report['member_rows'][name]:,} rows "
+              f"({report['member_threads'][name]} threads)")
+    print(f"   Wall clock: {report['wall_seconds']:.2f}s on {report['n_jobs']} cores")
+    
+    # Fold-level CV would retrain every member k times over the full history
+    print("\n4. Skipping cross-validation for file-based training (time-ordered holdout only)")
+    
+    print("\n5. Evaluating on test set...")
+    y_test = np.asarray(test.y)
+    y_pred = np.empty(len(test), dtype=int)
+    y_proba = np.empty(len(test))
+    for i, (X, _) in enumerate(test.batches(EVAL_BATCH_ROWS)):
+        rows = slice(i * EVAL_BATCH_ROWS, i * EVAL_BATCH_ROWS + len(X))
+        probabilities = ensemble.predict_proba_matrix(np.asarray(X))
+        y_pred[rows] = ensemble.predict_batch(np.asarray(X))
+        y_proba[rows] = ensemble.get_risk_scores(np.asarray(X), probabilities)
+    test_metrics = evaluate_predictions(y_test, y_pred, y_proba)
+    
+    print("\nClassification Report:")
+    print(classification_report(y_test, y_pred, 
+                              target_names=['Legitimate', 'Fraud']))
+    print(f"\nROC-AUC Score: {test_metrics['roc_auc']:.4f}")
+    print(f"PR-AUC (average precision): {test_metrics['average_precision']:.4f}")
+    cm = confusion_matrix(y_test, y_pred)
+    print(f"\nConfusion Matrix:")
+    print(cm)
+    
+    print("\n6. Computing global feature importance...")
+    X_sample, y_sample = test.sample(IMPORTANCE_SAMPLE_ROWS)
+    importance = ensemble.compute_feature_importance(X_sample, y_sample, feature_names=matrix.feature_names)
+    top = np.argsort(importance['permutation']['ensemble'])[::-1][:5]
+    for i in top:
+        print(f"   - {importance['features'][i]}: AUC drop {importance['permutation']['ensemble'][i]:.4f}, "
+              f"gain {importance['gain']['ensemble'][i]:.3f}")
+    
+    print("\n7. Saving trained models...")
+    ensemble.save_models('models/')
+    print("   Models saved successfully!")
+    
+    X_sample, y_sample = train.sample(CASE_INDEX_SAMPLE_ROWS)
+    case_index = CaseIndex('models/case_index/')
+    case_index.build(ensemble.scaler.transform(X_sample), y_sample,
+                     case_ids=[f'TRAIN_{i:07d}' for i in range(len(y_sample))])
+    print(f"   Similar-case index built: {len(case_index):,} cases")
+    
+    print("\n8. Generating visualizations...")
+    generate_visualizations(y_test, y_pred, y_proba, cm)
+    
+    own_rss, children_rss = peak_rss_mb()
+    print(f"\nPeak RSS: {own_rss:,.1f} MB (trainer), "
+          f"{max(children_rss, report['peak_rss_mb']['largest_worker']):,.1f} MB (largest worker)")
+    print(f"Total time: {time.perf_counter() - run_start:.1f}s")
+    print("\n" + "=" * 60)
+    print("TRAINING COMPLETE!")
+    print("=" * 60)
+    
+    return ensemble, (train, test)
+
+
 def generate_visualizations(y_test, y_pred, y_proba, cm):
     """Generate evaluation visualizations"""
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
@@ -188,4 +363,18 @@ def generate_visualizations(y_test, y_pred, y_proba, cm):
 
 
 if __name__ == '__main__':
-    ensemble, data = train_ensemble_model()
+    parser = argparse.ArgumentParser(description='Train the fraud detection ensemble')
+    parser.add_argument('--data', help='Labeled transactions (.parquet, .ndjson, .jsonl, .csv, .json); '
+                                       'synthetic data if omitted')
+    parser.add_argument('--work-dir', default='data/training/',
+                        help='Directory for the feature memmaps and external-memory caches')
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--label-field', default='is_fraud')
+    parser.add_argument('--test-fraction', type=float, default=TEST_SIZE)
+    args = parser.parse_args()
+    
+    if args.data:
+        ensemble, data = train_from_file(args.data, args.work_dir, args.chunk_rows, args.label_field,
+                                         args.test_fraction)
+    else:
+        ensemble, data = train_ensemble_model()
@@ -0,0 +1,337 @@
+"""
+Training Data - Out-of-core labeled feature matrices
+Streams JSON/NDJSON/CSV/Parquet transactions through the batch feature extractor
+into memory-mapped float32 files, so the training set never has to fit in RAM
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../backend'))
+
+from score_file import FORMATS, iter_file_chunks
+
+FEATURES_FILE = 'features.f32'
+LABELS_FILE = 'labels.i8'
+META_FILE = 'meta.json'
+
+# Per-process feature extractor for pool workers
+_worker = {}
+
+
+class FeatureMatrix:
+    """
+    Labeled features on disk: float32 rows x features (C order) and int8 labels.
+
+    X and y are read-only memmaps over rows [start, stop), so slicing off a
+    test tail or iterating batches never loads the whole file. Pickles as
+    its path and row range; worker processes reopen the files.
+    """
+
+    def __init__(self, path, start=0, stop=None):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.path = path
+        self.feature_names = meta['feature_names']
+        self.n_features = len(self.feature_names)
+        self.start = start
+        self.stop = meta['rows'] if stop is None else min(stop, meta['rows'])
+        self.X = np.memmap(os.path.join(path, FEATURES_FILE), dtype=np.float32, mode='r',
+                           shape=(meta['rows'], self.n_features))[self.start:self.stop]
+        self.y = np.memmap(os.path.join(path, LABELS_FILE), dtype=np.int8, mode='r',
+                           shape=(meta['rows'],))[self.start:self.stop]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getstate__(self):
+        return {'path': self.path, 'start': self.start, 'stop': self.stop}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def split(self, test_fraction):
+        """(train, test) with the last test_fraction of rows held out, i.e. a time-ordered split"""
+        cut = self.start + int(round(len(self) * (1 - test_fraction)))
+        return FeatureMatrix(self.path, self.start, cut), FeatureMatrix(self.path, cut, self.stop)
+
+    def batches(self, batch_rows):
+        """(X, y) memmap slices of at most batch_rows rows"""
+        for i in range(0, len(self), batch_rows):
+            yield self.X[i:i + batch_rows], self.y[i:i + batch_rows]
+
+    def sample(self, max_rows, seed=42):
+        """In-memory stratified sample of at most max_rows rows (all rows if it fits)"""
+        if len(self) <= max_rows:
+            return np.array(self.X), np.array(self.y)
+        rng = np.random.default_rng(seed)
+        picked = []
+        for label in (0, 1):
+            rows = np.flatnonzero(self.y == label)
+            take = int(round(max_rows * len(rows) / len(self)))
+            picked.append(rng.choice(rows, size=min(take, len(rows)), replace=False))
+        rows = np.sort(np.concatenate(picked))  # Sorted reads stay sequential on disk
+        return np.asarray(self.X[rows]), np.asarray(self.y[rows])
+
+
+def _label(value):
+    """Fraud label from a bool, number or string field"""
+    if isinstance(value, str):
+        return 1 if value.strip().lower() in ('1', 'true', 'yes', 'fraud') else 0
+    return 1 if value else 0
+
+
+def _init_worker():
+    from threadpoolctl import threadpool_limits
+    from data_processor import TransactionProcessor
+
+    threadpool_limits(limits=1)
+    _worker['processor'] = TransactionProcessor()
+
+
+def _extract(chunk, label_field):
+    """Features and labels for one chunk (runs in a worker process)"""
+    X = _worker['processor'].extract_features_batch(chunk).astype(np.float32)
+    y = np.array([_label(t.get(label_field)) for t in chunk], dtype=np.int8)
+    return X, y
+
+
+def build_feature_matrix(source, path, chunk_rows=50000, label_field='is_fraud', file_format=None,
+                         workers=None):
+    """
+    Stream a labeled transaction file into a FeatureMatrix at path.
+
+    Chunks are featurized across a spawned process pool and appended in
+    input order; at most two chunks per worker are in flight, so memory is
+    bounded by chunk_rows, not by file size. Batch extraction does not
+    update per-user history, so workers give the same features as one
+    process would.
+    """
+    file_format = file_format or FORMATS.get(os.path.splitext(source)[1].lower())
+    if file_format is None:
+        raise ValueError(f'Cannot infer format of {source}; pass file_format')
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, META_FILE)):
+        os.remove(os.path.join(path, META_FILE))
+
+    from data_processor import TransactionProcessor
+    feature_names = TransactionProcessor().get_feature_names()
+    rows = 0
+    context = multiprocessing.get_context('spawn')
+    with open(os.path.join(path, FEATURES_FILE), 'wb') as features, \
+            open(os.path.join(path, LABELS_FILE), 'wb') as labels, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        inflight = deque()
+
+        def write(future):
+            nonlocal rows
+            X, y = future.result()
+            features.write(X.tobytes())
+            labels.write(y.tobytes())
+            rows += len(y)
+
+        for chunk in iter_file_chunks(source, file_format, chunk_rows):
+            inflight.append(pool.submit(_extract, chunk, label_field))
+            if len(inflight) >= 2 * workers:
+                write(inflight.popleft())
+        while inflight:
+            write(inflight.popleft())
+
+    if rows == 0:
+        raise ValueError(f'No transactions in {source}')
+    # Metadata last: a matrix without it is an interrupted build
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump({'rows': rows, 'feature_names': feature_names, 'source': os.path.abspath(source),
+                   'label_field': label_field}, f)
+    return FeatureMatrix(path)
+
+
+# ==================== Out-of-core training ====================
+# Members with no streaming or external-memory mode are fitted on an
+# in-memory stratified sample of at most this many rows. SVC is O(n^2).
+SAMPLED_MEMBER_ROWS = {
+    'svm': 50_000,
+    'gradient_boosting': 1_000_000,
+    'random_forest': 2_000_000
+}
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its largest finished child, in MB"""
+    import resource
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def scale_matrix(scaler, matrix, path, batch_rows=100000):
+    """Fit scaler incrementally over matrix, then write the scaled rows as a new FeatureMatrix"""
+    for X, _ in matrix.batches(batch_rows):
+        scaler.partial_fit(X)
+
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, META_FILE)):
+        os.remove(os.path.join(path, META_FILE))
+    with open(os.path.join(path, FEATURES_FILE), 'wb') as features, \
+            open(os.path.join(path, LABELS_FILE), 'wb') as labels:
+        for X, y in matrix.batches(batch_rows):
+            features.write(scaler.transform(X).astype(np.float32).tobytes())
+            labels.write(np.asarray(y).tobytes())
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump({'rows': len(matrix), 'feature_names': matrix.feature_names, 'scaled': True}, f)
+    return FeatureMatrix(path)
+
+
+def _fit_xgboost(model, matrix, n_threads, work_dir, batch_rows):
+    """Hist trees over an external-memory quantile DMatrix fed batch by batch from the memmap"""
+    import xgboost as xgb
+
+    class BatchIter(xgb.DataIter):
+        def __init__(self):
+            self._i = 0
+            super().__init__(cache_prefix=os.path.join(work_dir, 'xgboost-cache'))
+
+        def next(self, input_data):
+            if self._i >= len(matrix):
+                return False
+            stop = self._i + batch_rows
+            input_data(data=np.asarray(matrix.X[self._i:stop]),
+                       label=np.asarray(matrix.y[self._i:stop], dtype=np.float32))
+            self._i = stop
+            return True
+
+        def reset(self):
+            self._i = 0
+
+    params = {k: v for k, v in model.get_xgb_params().items() if v is not None}
+    params.update(nthread=n_threads, tree_method='hist')
+    params.pop('n_jobs', None)
+    dtrain = xgb.ExtMemQuantileDMatrix(BatchIter(), max_bin=params.get('max_bin') or 256)
+    booster = xgb.train(params, dtrain, num_boost_round=model.n_estimators)
+    model.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+    return model
+
+
+def _fit_lightgbm(model, matrix, n_threads, work_dir, batch_rows):
+    """Bin the memmap once into a LightGBM binary dataset file, then train from that file"""
+    import lightgbm as lgb
+    from models import LightGBMBooster
+
+    class BatchSequence(lgb.Sequence):
+        batch_size = batch_rows
+
+        def __getitem__(self, index):
+            # Dataset construction samples rows as float64; one batch at a time is converted
+            return np.asarray(matrix.X[index], dtype=np.float64)
+
+        def __len__(self):
+            return len(matrix)
+
+    params = {k: v for k, v in model.get_params().items()
+              if v is not None and k not in ('importance_type', 'class_weight', 'n_estimators', 'n_jobs')}
+    params.update(objective='binary', num_threads=n_threads, verbose=-1)
+    binary_file = os.path.join(work_dir, 'lightgbm.bin')
+    if os.path.exists(binary_file):
+        os.remove(binary_file)
+    lgb.Dataset([BatchSequence()], label=np.asarray(matrix.y, dtype=np.float32),
+                params={'verbose': -1}).save_binary(binary_file)
+    booster = lgb.train(params, lgb.Dataset(binary_file, params={'verbose': -1}),
+                        num_boost_round=model.n_estimators)
+    return LightGBMBooster(booster)
+
+
+def _fit_member_out_of_core(name, model, matrix, n_threads, work_dir, batch_rows):
+    """Fit one member from a scaled FeatureMatrix (runs in a pool worker)"""
+    import time
+    from threadpoolctl import threadpool_limits
+
+    start = time.perf_counter()
+    rows = len(matrix)
+    with threadpool_limits(limits=n_threads):
+        if name == 'xgboost':
+            model = _fit_xgboost(model, matrix, n_threads, work_dir, batch_rows)
+        elif name == 'lightgbm':
+            model = _fit_lightgbm(model, matrix, n_threads, work_dir, batch_rows)
+        elif name in SAMPLED_MEMBER_ROWS:
+            X, y = matrix.sample(SAMPLED_MEMBER_ROWS[name])
+            rows = len(y)
+            if hasattr(model, 'n_jobs'):
+                model.set_params(n_jobs=n_threads)
+            model.fit(X, y)
+            if hasattr(model, 'n_jobs'):
+                model.set_params(n_jobs=None)
+        else:
+            # lbfgs reads the float32 memmap in place; no in-memory copy of X
+            model.fit(matrix.X, np.asarray(matrix.y))
+    return name, model, time.perf_counter() - start, rows, peak_rss_mb()[0]
+
+
+def train_out_of_core(ensemble, matrix, work_dir, n_jobs=-1, batch_rows=100000):
+    """
+    Train every ensemble member from an on-disk FeatureMatrix.
+
+    The scaler is fitted with partial_fit and the scaled rows are written
+    to a second memmap. Then, in a spawned process pool with the same
+    per-member thread budgets as FraudDetectionEnsemble.train:
+    - XGBoost trains from an external-memory quantile DMatrix
+    - LightGBM trains from a binary dataset file binned batch by batch
+    - LogisticRegression runs lbfgs directly over the memmap
+    - the rest fit on stratified samples capped by SAMPLED_MEMBER_ROWS
+    Returns the training report, including peak RSS of the parent and workers.
+    """
+    import time
+    from models import TRAINING_ORDER, _thread_budgets
+
+    start = time.perf_counter()
+    n_jobs = (os.cpu_count() or 1) if n_jobs in (None, -1) else max(1, n_jobs)
+    os.makedirs(work_dir, exist_ok=True)
+    scaled = scale_matrix(ensemble.scaler, matrix, os.path.join(work_dir, 'scaled'), batch_rows)
+    if ensemble.pca is not None:
+        ensemble.pca.fit(scaled.sample(SAMPLED_MEMBER_ROWS['gradient_boosting'])[0])
+    scaling_seconds = time.perf_counter() - start
+
+    names = sorted(ensemble.models, key=lambda name: TRAINING_ORDER.index(name)
+                   if name in TRAINING_ORDER else len(TRAINING_ORDER))
+    budgets = _thread_budgets(names, n_jobs)
+    results = {}
+    if n_jobs == 1:
+        for name in names:
+            results[name] = _fit_member_out_of_core(name, ensemble.models[name], scaled, 1, work_dir,
+                                                    batch_rows)[1:]
+            print(f"{name} trained successfully in {results[name][1]:.2f}s on {results[name][2]:,} rows")
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(names)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(_fit_member_out_of_core, name, ensemble.models[name], scaled,
+                                   budgets[name], work_dir, batch_rows) for name in names]
+            for future in futures:
+                name, *result = future.result()
+                results[name] = result
+                print(f"{name} trained successfully in {result[1]:.2f}s on {result[2]:,} rows")
+
+    for name, (model, _, _, _) in results.items():
+        ensemble.models[name] = model
+    ensemble.feature_importance = {'gain': ensemble._gain_importance(matrix.n_features)}
+
+    own_rss, children_rss = peak_rss_mb()
+    ensemble.training_report = {
+        'wall_seconds': round(time.perf_counter() - start, 3),
+        'scaling_seconds': round(scaling_seconds, 3),
+        'member_seconds': {name: round(results[name][1], 3) for name in names},
+        'member_rows': {name: int(results[name][2]) for name in names},
+        'member_threads': budgets,
+        'n_jobs': n_jobs,
+        'samples': len(matrix),
+        'peak_rss_mb': {
+            'parent': round(own_rss, 1),
+            'largest_worker': round(max([children_rss] + [results[name][3] for name in names]), 1)
+        }
+    }
+    return ensemble.training_report
@@ -0,0 +1,9 @@
+"""
+Test configuration - backend and ml-models modules are imported flat, as the app and scripts do
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'ml-models'))
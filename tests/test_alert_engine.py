@@ -0,0 +1,101 @@
+"""
+Streaming alert rules - bucketed window eviction and event-time windowing
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from alert_engine import (AlertRuleEngine, CategoryRiskSpikeRule, DeviceBlockBurstRule, SlidingWindow,
+                          event_time)
+
+T0 = 1_700_000_000.0
+
+
+def test_window_evicts_whole_buckets_after_window():
+    window = SlidingWindow(300, buckets=30)
+    for i in range(10):
+        window.add(T0 + i, 0.5, key=f'user{i}')
+    assert len(window) == 10
+    assert window.mean == pytest.approx(0.5)
+
+    window.add(T0 + 150, 1.0)
+    assert len(window) == 11
+
+    # The first ten have left the window; the event at +150 has not
+    window.add(T0 + 440, 1.0)
+    assert len(window) == 2
+    window.add(T0 + 1000, 0.25)
+    assert len(window) == 1
+    assert window.mean == pytest.approx(0.25)
+
+
+def test_window_memory_is_independent_of_event_rate():
+    window = SlidingWindow(300, buckets=30)
+    for i in range(100_000):
+        window.add(T0 + i * 0.003, 1.0, key=i % 50)
+    assert len(window._ids) == 30
+    assert len(window) == 100_000
+    assert abs(window.distinct - 50) <= 3
+
+
+def test_events_older_than_the_window_are_ignored():
+    window = SlidingWindow(300, buckets=30)
+    window.add(T0 + 1000)
+    window.add(T0)
+    assert len(window) == 1
+
+
+def test_distinct_keys_are_estimated():
+    window = SlidingWindow(300, buckets=30, key_bits=1024)
+    for i in range(200):
+        window.add(T0 + i, key=f'user{i % 100}')
+    assert abs(window.distinct - 100) <= 10
+
+
+def test_event_time_parses_transaction_timestamps():
+    assert event_time(T0) == T0
+    assert event_time(datetime.fromtimestamp(T0).isoformat()) == pytest.approx(T0)
+    assert abs(event_time(None) - datetime.now().timestamp()) < 5
+
+
+def test_historical_batch_is_windowed_by_event_time():
+    engine = AlertRuleEngine([DeviceBlockBurstRule(0.75, min_blocks=3, window_seconds=300)])
+    blocked = {'risk_score': 0.95, 'recommendation': 'BLOCK'}
+
+    # Three blocks an hour apart: a burst by arrival order, not by event time
+    for hour in range(3):
+        transaction = {'device_id': 'dev-1', 'user_id': 'u1',
+                       'timestamp': datetime.fromtimestamp(T0 + hour * 3600).isoformat()}
+        assert engine.process(transaction, blocked) == []
+
+    for minute in range(3):
+        transaction = {'device_id': 'dev-2', 'user_id': f'u{minute}',
+                       'timestamp': datetime.fromtimestamp(T0 + minute * 60).isoformat()}
+        alerts = engine.process(transaction, blocked)
+    assert len(alerts) == 1
+    assert alerts[0]['device_id'] == 'dev-2'
+    assert alerts[0]['affected_accounts'] == 3
+
+
+def test_future_timestamp_does_not_blind_live_windows():
+    rule = CategoryRiskSpikeRule(risk_threshold=0.6, spike_margin=0.2, window_seconds=300)
+    engine = AlertRuleEngine([rule], max_clock_skew=60)
+    scored = {'risk_score': 0.2, 'recommendation': 'APPROVE'}
+    future = datetime.now() + timedelta(days=3650)
+
+    engine.process({'merchant_category': 'crypto', 'timestamp': future.isoformat()}, scored)
+    for _ in range(5):
+        engine.process({'merchant_category': 'crypto', 'timestamp': datetime.now().isoformat()}, scored)
+    assert len(rule.windows['crypto']) == 6
+
+
+def test_category_spike_fires_once_per_window():
+    rule = CategoryRiskSpikeRule(risk_threshold=0.6, spike_margin=0.2, window_seconds=300, min_events=5)
+    fired = []
+    for i in range(200):
+        risk = 0.1 if i < 180 else 0.95
+        alert = rule.evaluate({'merchant_category': 'crypto', 'risk_score': risk, 'user_id': f'u{i}'},
+                              T0 + i * 10)
+        if alert:
+            fired.append(i)
+    assert len(fired) == 1
@@ -0,0 +1,22 @@
+"""
+Amount histogram - streaming percentiles in fixed memory
+"""
+import numpy as np
+
+from amount_histogram import AmountHistogram
+
+
+def test_amount_histogram_tracks_percentiles_in_fixed_memory():
+    rng = np.random.default_rng(0)
+    amounts = rng.lognormal(4.0, 1.2, 200_000)
+    histogram = AmountHistogram()
+    for chunk in np.array_split(amounts, 20):
+        histogram.add(chunk)
+
+    assert histogram.total == len(amounts)
+    assert histogram.counts.shape == AmountHistogram().counts.shape
+    for q in (0.5, 0.95, 0.99):
+        exact = np.percentile(amounts, q * 100)
+        assert abs(histogram.quantile(q) - exact) / exact < 0.05
+    p95 = histogram.quantile(0.95)
+    assert abs(histogram.count_above(p95) - np.sum(amounts > p95)) < 0.01 * len(amounts)
@@ -0,0 +1,58 @@
+"""
+Behavioral biometrics - batch analysis matches single sessions, and only verification updates baselines
+"""
+import numpy as np
+
+from behavioral_biometrics import BiometricAnalyzer
+from benchmark import biometric_session, synthetic_biometric_columns
+from biometric_profiles import BiometricProfileStore
+from device_registry import DeviceRegistry
+
+
+def test_batch_analysis_matches_single_sessions():
+    rng = np.random.default_rng(0)
+    n = 3000
+    columns = synthetic_biometric_columns(n, rng)
+    # A small user and device population, so profiles and shared devices come into play
+    columns['user_id'] = [f'USR{u}' for u in rng.integers(0, 40, n)]
+    columns['user_id'][:50] = [None] * 50
+    columns['device_fingerprint'] = [f'{d:016x}' for d in rng.integers(0, 60, n)]
+
+    analyzer = BiometricAnalyzer(BiometricProfileStore(min_sessions=3),
+                                 DeviceRegistry(registers_log2=16, farm_min_users=3))
+    # Per-session payloads carry the fingerprint itself; score the same one in both paths
+    analyzer._generate_device_fingerprint = lambda device_data: device_data.get('fingerprint', '')
+    for i in range(50, 500):
+        analyzer.record_verified_session(biometric_session(columns, i))
+
+    batch = analyzer.analyze_batch(columns)
+    single = [analyzer.analyze_behavioral_patterns(biometric_session(columns, i)) for i in range(n)]
+
+    assert np.isfinite(batch['profile_score']).sum() > n // 2
+    assert batch['device_farm'].any() and batch['is_known_device'].any()
+    assert np.array_equal(batch['biometric_risk_score'], [r['biometric_risk_score'] for r in single])
+    assert np.array_equal(batch['risk_level'], [r['risk_level'] for r in single])
+    assert np.array_equal(batch['confidence'], [r['confidence'] for r in single])
+    for section in ('typing', 'mouse', 'device', 'session'):
+        assert np.array_equal(batch[f'{section}_score'], [r[f'{section}_analysis']['score'] for r in single])
+    assert np.array_equal(batch['is_known_device'], [r['device_analysis']['is_known_device'] for r in single])
+    assert np.array_equal(batch['distinct_users'], [r['device_analysis']['distinct_users'] for r in single])
+
+
+def test_a_verified_flag_in_the_payload_changes_nothing():
+    rng = np.random.default_rng(1)
+    columns = synthetic_biometric_columns(1, rng)
+    columns['user_id'] = ['USR1']
+    columns['device_fingerprint'] = ['00000000000000aa']
+    analyzer = BiometricAnalyzer(BiometricProfileStore(min_sessions=1), DeviceRegistry(registers_log2=16))
+    analyzer._generate_device_fingerprint = lambda device_data: device_data.get('fingerprint', '')
+
+    session = {**biometric_session(columns, 0), 'verified': True}
+    analyzer.analyze_behavioral_patterns(session)
+    assert analyzer.user_profiles.sessions('USR1') == 0
+    assert not analyzer.device_registry.is_known('USR1', '00000000000000aa')
+
+    # Only the server-side verification path records the user and device
+    analyzer.record_verified_session(session)
+    assert analyzer.user_profiles.sessions('USR1') == 1
+    assert analyzer.device_registry.is_known('USR1', '00000000000000aa')
@@ -0,0 +1,41 @@
+"""
+Biometric sessions - server-generated ids bound to the connection that opened them
+"""
+import pytest
+
+from behavioral_biometrics import BiometricAnalyzer
+from biometric_profiles import BiometricProfileStore
+from biometric_sessions import BiometricSessionTracker
+from device_registry import DeviceRegistry
+
+
+@pytest.fixture
+def tracker():
+    analyzer = BiometricAnalyzer(BiometricProfileStore(min_sessions=1), DeviceRegistry(registers_log2=16))
+    return BiometricSessionTracker(analyzer)
+
+
+def test_sessions_answer_only_their_owner(tracker):
+    session_id = tracker.start('USR1', {'browser': 'Chrome'}, owner='sid-1')
+    typing = {'key_down': [0, 120, 260, 390], 'key_up': [80, 200, 330, 470]}
+
+    for call in (lambda: tracker.add_events(session_id, typing, owner='sid-2'),
+                 lambda: tracker.score(session_id, owner='sid-2'),
+                 lambda: tracker.end(session_id, owner='sid-2')):
+        with pytest.raises(KeyError):
+            call()
+
+    assert tracker.add_events(session_id, typing, owner='sid-1')['keystrokes'] == 4
+    # Server-side callers, such as the REST risk lookup, pass no owner
+    assert tracker.score(session_id)['biometric_risk_score'] >= 0
+    tracker.end(session_id, owner='sid-1')
+    assert len(tracker) == 0
+
+
+def test_ids_are_generated_and_ending_leaves_the_baseline_alone(tracker):
+    first = tracker.start('USR1', owner='sid-1')
+    second = tracker.start('USR1', owner='sid-1')
+    assert first != second and len(tracker) == 2
+
+    tracker.end(first, owner='sid-1')
+    assert tracker.analyzer.user_profiles.sessions('USR1') == 0
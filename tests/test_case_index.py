@@ -0,0 +1,105 @@
+"""
+Case index - compaction on append and arrival order across regrouping
+"""
+import threading
+
+import numpy as np
+
+from case_index import CaseIndex
+
+
+def _cases(rng, n, dim=8):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors, (vectors[:, 0] > 0).astype(np.int8)
+
+
+def test_appends_past_exact_rows_switch_to_ivf(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors, outcomes = _cases(rng, 600)
+    index = CaseIndex(str(tmp_path), exact_rows=1000)
+    index.build(vectors[:300], outcomes[:300])
+    for start in range(300, 600, 50):
+        index.append(vectors[start:start + 50], outcomes[start:start + 50])
+    assert index.nlist == 0
+
+    more, more_outcomes = _cases(rng, 400)
+    index.append(more, more_outcomes)
+    assert index.wait_for_compaction(timeout=30)
+    assert index.nlist > 0 and len(index) == 1000
+    assert sum(len(tail) for tail in index._tails) == 0
+    assert index.built_rows == 300
+
+    # Arrival numbers still address cases in the order they were added
+    X, y = index.labeled_vectors(np.arange(300, 1000))
+    assert np.array_equal(X, np.vstack([vectors[300:], more]))
+    assert np.array_equal(y, np.concatenate([outcomes[300:], more_outcomes]))
+
+    # Probing every list is exact
+    query = more[7]
+    hits = index.search(query, k=1, nprobe=index.nlist)
+    assert hits[0]['similarity'] == 1.0
+
+
+def test_tails_are_reclustered_once_they_outgrow_the_lists(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors, outcomes = _cases(rng, 1000)
+    index = CaseIndex(str(tmp_path), exact_rows=500, max_tail_fraction=0.25)
+    index.build(vectors, outcomes)
+    first_nlist = index.nlist
+
+    added, added_outcomes = _cases(rng, 260)
+    index.append(added[:200], added_outcomes[:200])
+    assert sum(len(tail) for tail in index._tails) == 200
+
+    index.append(added[200:], added_outcomes[200:])
+    assert index.wait_for_compaction(timeout=30)
+    assert sum(len(tail) for tail in index._tails) == 0
+    assert index.nlist >= first_nlist and index._sorted_rows == 1260
+
+    reopened = CaseIndex(str(tmp_path), exact_rows=500)
+    X, y = reopened.labeled_vectors(np.arange(1260))
+    assert np.array_equal(X, np.vstack([vectors, added]))
+    assert np.array_equal(y, np.concatenate([outcomes, added_outcomes]))
+    assert reopened.search(added[-1], k=1, nprobe=reopened.nlist)[0]['similarity'] == 1.0
+
+
+def test_appends_and_searches_proceed_while_compacting(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors, outcomes = _cases(rng, 1000)
+    index = CaseIndex(str(tmp_path), exact_rows=500, max_tail_fraction=0.25)
+    index.build(vectors, outcomes)
+    first_nlist = index.nlist
+
+    # Hold the compaction in its clustering step, outside the lock
+    clustering, release = threading.Event(), threading.Event()
+    kmeans = index._kmeans
+
+    def held_kmeans(*args, **kwargs):
+        clustering.set()
+        assert release.wait(timeout=30)
+        return kmeans(*args, **kwargs)
+
+    index._kmeans = held_kmeans
+    added, added_outcomes = _cases(rng, 400)
+    case_ids = [f'NEW{i}' for i in range(400)]
+    index.append(added[:300], added_outcomes[:300], case_ids[:300])
+    assert clustering.wait(timeout=30)
+
+    # The old lists and tails keep serving, and appends still land
+    assert index.search(added[5], k=1, nprobe=first_nlist)[0]['case_id'] == 'NEW5'
+    index.append(added[300:], added_outcomes[300:], case_ids[300:])
+    assert index.search(added[-1], k=1, nprobe=first_nlist)[0]['case_id'] == 'NEW399'
+    assert index._sorted_rows == 1000
+
+    release.set()
+    assert index.wait_for_compaction(timeout=30)
+    # Cases appended during the compaction become tails of the new lists
+    assert index._sorted_rows == 1300 and index.nlist != first_nlist
+    assert sum(len(tail) for tail in index._tails) == 100
+    assert index.search(added[-1], k=1, nprobe=index.nlist)[0]['case_id'] == 'NEW399'
+
+    reopened = CaseIndex(str(tmp_path), exact_rows=500)
+    X, y = reopened.labeled_vectors(np.arange(1400))
+    assert np.array_equal(X, np.vstack([vectors, added]))
+    assert np.array_equal(y, np.concatenate([outcomes, added_outcomes]))
+    assert sum(len(tail) for tail in reopened._tails) == 100
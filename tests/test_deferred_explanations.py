@@ -0,0 +1,57 @@
+"""
+Deferred explanations - bounded backlog and skipping forgotten tokens
+"""
+import threading
+
+from deferred_explanations import DeferredExplainer
+from explanation_cache import ExplanationCache
+
+
+class BlockingExplainer:
+    """Explainer that holds every job until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def explain_prediction(self, transaction, prediction, features):
+        self.started.set()
+        self.release.wait(5)
+        self.calls += 1
+        return {'summary': transaction['transaction_id']}
+
+
+def _submit(deferred, i):
+    return deferred.submit({'transaction_id': f'tx-{i}', 'amount': i}, {'risk_score': 0.9}, [float(i)])
+
+
+def test_submit_sheds_when_backlog_is_full():
+    explainer = BlockingExplainer()
+    deferred = DeferredExplainer(explainer, ExplanationCache(100, 60), max_workers=1, max_pending=3)
+
+    tokens = [_submit(deferred, i) for i in range(5)]
+    assert all(tokens[:3]) and tokens[3:] == [None, None]
+    assert deferred.stats()['pending'] == 3 and deferred.stats()['shed'] == 2
+
+    explainer.release.set()
+    deferred._executor.shutdown(wait=True)
+    assert deferred.stats()['pending'] == 0
+    assert all(deferred.get(token)['status'] == 'ready' for token in tokens[:3])
+
+
+def test_jobs_for_forgotten_tokens_are_skipped():
+    explainer = BlockingExplainer()
+    deferred = DeferredExplainer(explainer, ExplanationCache(100, 60), max_workers=1,
+                                 max_tokens=2, max_pending=10)
+
+    tokens = [_submit(deferred, 0)]
+    assert explainer.started.wait(5)
+    tokens += [_submit(deferred, i) for i in range(1, 5)]
+    explainer.release.set()
+    deferred._executor.shutdown(wait=True)
+
+    # Only the two newest tokens are still tracked; the first job was already running
+    assert deferred.get(tokens[0]) is None
+    assert explainer.calls == 3
+    assert deferred.stats() == {'pending': 0, 'max_pending': 10, 'shed': 0, 'skipped': 2, 'tokens': 2}
@@ -0,0 +1,55 @@
+"""
+Feature attributions - batch rows match single rows and add up to the scores
+"""
+import numpy as np
+import pytest
+
+from models import FraudDetectionEnsemble
+
+SMALL = {
+    'xgboost': {'n_estimators': 20},
+    'lightgbm': {'n_estimators': 20, 'verbose': -1},
+    'random_forest': {'n_estimators': 20},
+    'gradient_boosting': {'n_estimators': 20}
+}
+
+
+@pytest.fixture(scope='module')
+def ensemble():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 6))
+    y = (X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=500) > 1.0).astype(int)
+    detector = FraudDetectionEnsemble(hyperparameters=SMALL)
+    detector.train(X, y, n_jobs=1)
+    return detector, rng.normal(size=(40, 6))
+
+
+def test_batch_attributions_match_single_rows(ensemble):
+    detector, X = ensemble
+    batch = detector.get_feature_attributions(X)
+    for i in range(len(X)):
+        single = detector.get_feature_attributions(X[i:i + 1])
+        assert np.allclose(single['values'][0], batch['values'][i], atol=1e-9)
+        assert np.allclose(single['base_value'][0], batch['base_value'][i], atol=1e-9)
+
+
+def test_attributions_add_up_to_member_probabilities(ensemble):
+    detector, X = ensemble
+    X_scaled = detector.scaler.transform(X)
+    probabilities = detector.predict_proba_matrix(X_scaled, scaled=True)
+    attribution = detector.get_feature_attributions(X, probabilities)
+
+    members = attribution['members']
+    assert 'svm' not in members and len(members) == 5
+    weights = np.array([detector.model_weights[name] for name in members])
+    columns = [list(detector.models).index(name) for name in members]
+    expected = probabilities[:, columns] @ weights / weights.sum()
+    assert np.allclose(attribution['base_value'] + attribution['values'].sum(axis=1), expected, atol=1e-5)
+
+    for name in members:
+        contributions, bias = detector.attributor.member_contributions(name, detector.models[name], X_scaled)
+        # Random forest attributes probabilities; the other members attribute log-odds
+        native = detector.models[name].predict_proba(X_scaled)[:, 1]
+        if name != 'random_forest':
+            native = np.log(native / (1 - native))
+        assert np.allclose(contributions.sum(axis=1) + bias, native, atol=1e-4), name
@@ -0,0 +1,25 @@
+"""
+Hyperparameter search - rounds recorded for early-stopped members
+"""
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier
+
+from hyperparameter_search import EARLY_STOPPING_ROUNDS, _fit
+
+
+def test_gradient_boosting_keeps_rounds_before_the_patience_window():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 5))
+    y = (X[:, 0] + rng.normal(size=2000) > 1).astype(int)
+    model = GradientBoostingClassifier(n_estimators=400, random_state=0)
+    reference = GradientBoostingClassifier(n_estimators=400, random_state=0,
+                                           n_iter_no_change=EARLY_STOPPING_ROUNDS, validation_fraction=0.1)
+    fitted = reference.fit(X, y).n_estimators_
+    assert fitted < 400
+
+    rounds = _fit('gradient_boosting', model, X, y, None, None)
+    assert rounds == fitted - EARLY_STOPPING_ROUNDS
+    assert len(model.estimators_) == rounds
+    # The trimmed model scores like the fitted one at that stage
+    staged = list(reference.staged_predict_proba(X[:10]))[rounds - 1]
+    assert np.allclose(model.predict_proba(X[:10]), staged)
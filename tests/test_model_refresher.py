@@ -0,0 +1,91 @@
+"""
+Model refresher - swap, rollback and versioned persistence
+"""
+import os
+
+import numpy as np
+import pytest
+
+from case_index import CaseIndex
+from model_refresher import ModelRefresher
+from models import FraudDetectionEnsemble, MODEL_POINTER, resolve_model_path
+
+SMALL = {
+    'xgboost': {'n_estimators': 10},
+    'lightgbm': {'n_estimators': 10, 'verbose': -1},
+    'random_forest': {'n_estimators': 10},
+    'gradient_boosting': {'n_estimators': 10}
+}
+
+
+def _data(rng, n, n_features=6):
+    X = rng.normal(size=(n, n_features))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.5, size=n) > 1.0).astype(np.int8)
+    return X, y
+
+
+@pytest.fixture
+def trained(tmp_path):
+    rng = np.random.default_rng(0)
+    ensemble = FraudDetectionEnsemble(hyperparameters=SMALL)
+    X, y = _data(rng, 400)
+    ensemble.train(X, y, n_jobs=1)
+    ensemble.save_models(str(tmp_path / 'models'))
+
+    index = CaseIndex(str(tmp_path / 'cases'))
+    index.build(ensemble.scaler.transform(X).astype(np.float32), y)
+    return ensemble, index, rng
+
+
+def _label_cases(ensemble, index, rng, n=300):
+    X, y = _data(rng, n)
+    index.append(ensemble.scaler.transform(X), y)
+
+
+def test_swap_then_rollback_restores_and_persists_the_members(trained, tmp_path):
+    ensemble, index, rng = trained
+    model_path = str(tmp_path / 'models')
+    original = ensemble.models
+    original_gain = ensemble.feature_importance['gain']
+    swaps = []
+    refresher = ModelRefresher(ensemble, index, model_path, interval_seconds=0, min_new_cases=100,
+                               max_metric_drop=1.0, on_swap=lambda: swaps.append(refresher.version))
+
+    _label_cases(ensemble, index, rng)
+    result = refresher.refresh()
+    assert result['status'] == 'swapped', result
+    assert ensemble.models is not original and swaps == [1]
+    assert ensemble.feature_importance['gain'] != original_gain
+    assert resolve_model_path(model_path) == os.path.join(model_path, 'versions', '000001')
+
+    # Any live score counts as a regression now: the next refresh rolls back and rejects its candidate
+    refresher.max_metric_drop = -1.0
+    _label_cases(ensemble, index, rng)
+    result = refresher.refresh()
+    assert result['rolled_back'] and result['status'] == 'rejected', result
+    assert ensemble.models is original and swaps == [1, 2]
+    assert ensemble.feature_importance['gain'] == original_gain
+
+    # A fresh process loads the rolled-back members from the new version, all from one directory
+    reloaded = FraudDetectionEnsemble()
+    assert reloaded.load_models(model_path)
+    assert reloaded.model_source == os.path.join(model_path, 'versions', '000002')
+    X, _ = _data(rng, 50)
+    assert np.allclose(reloaded.get_risk_scores(X), ensemble.get_risk_scores(X))
+
+
+def test_old_versions_are_pruned_and_a_root_save_wins(trained, tmp_path):
+    ensemble, index, rng = trained
+    model_path = str(tmp_path / 'models')
+    refresher = ModelRefresher(ensemble, index, model_path, interval_seconds=0, min_new_cases=100,
+                               max_metric_drop=1.0, keep_versions=2)
+    for _ in range(3):
+        _label_cases(ensemble, index, rng, n=150)
+        assert refresher.refresh()['status'] == 'swapped'
+
+    assert sorted(os.listdir(os.path.join(model_path, 'versions'))) == ['000002', '000003']
+
+    # Retraining saves at the root, which supersedes the refreshed versions
+    ensemble.save_models(model_path)
+    assert not os.path.exists(os.path.join(model_path, MODEL_POINTER))
+    assert resolve_model_path(model_path) == model_path
@@ -0,0 +1,50 @@
+"""
+Pattern forecast cache - data versions stay put under steady hotspot traffic
+"""
+import time
+
+from fraud_predictor import FraudPatternPredictor
+from geo_hotspots import HotspotDetector
+from pattern_cache import PatternForecastCache
+
+NOW = 1_700_000_000.0
+
+
+def _observe(detector, lat, lon, n):
+    for _ in range(n):
+        detector.observe({'latitude': lat, 'longitude': lon, 'merchant_category': 'electronics'},
+                         {'risk_score': 0.9})
+
+
+def test_steady_hotspot_traffic_keeps_the_cached_payload(monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: NOW)
+    detector = HotspotDetector()
+    predictor = FraudPatternPredictor(hotspots=detector)
+    cache = PatternForecastCache(predictor, horizons=(7,))
+
+    _observe(detector, 40.7, -74.0, 20)
+    cache.refresh()
+    etag = cache.get(7)['etag']
+
+    # More events in the same hotspot move its volume, not its shape
+    _observe(detector, 40.7, -74.0, 50)
+    cache.refresh()
+    assert cache.stats()['builds'] == 1
+    assert cache.get(7)['etag'] == etag
+
+    # A new hotspot does change the payload
+    _observe(detector, 51.5, -0.1, 20)
+    cache.refresh()
+    assert cache.stats()['builds'] == 2
+
+
+def test_data_version_rolls_over_with_the_hour(monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    predictor = FraudPatternPredictor()
+
+    version = predictor.data_version()
+    clock[0] += 60
+    assert predictor.data_version() == version
+    clock[0] += 3600
+    assert predictor.data_version() != version
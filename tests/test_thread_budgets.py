@@ -0,0 +1,36 @@
+"""
+Thread budgets for concurrent member training
+"""
+import pytest
+
+from models import THREADED_MEMBERS, TRAINING_ORDER, _thread_budgets
+
+
+@pytest.mark.parametrize('n_jobs', range(1, 33))
+def test_concurrent_threads_never_exceed_n_jobs(n_jobs):
+    budgets = _thread_budgets(TRAINING_ORDER, n_jobs)
+
+    assert set(budgets) == set(TRAINING_ORDER)
+    assert min(budgets.values()) >= 1
+    # The training pool runs at most n_jobs members at a time
+    running = sorted(budgets.values(), reverse=True)[:min(n_jobs, len(TRAINING_ORDER))]
+    assert sum(running) <= n_jobs
+    if n_jobs >= len(TRAINING_ORDER):
+        assert sum(budgets.values()) == n_jobs
+
+
+def test_single_threaded_members_get_their_core_first():
+    names = TRAINING_ORDER
+    single = [name for name in names if name not in THREADED_MEMBERS]
+
+    # Six cores for six members: nothing spare for the threaded ones
+    assert _thread_budgets(names, len(names)) == {name: 1 for name in names}
+
+    budgets = _thread_budgets(names, 10)
+    assert all(budgets[name] == 1 for name in single)
+    assert sorted(budgets[name] for name in THREADED_MEMBERS) == [2, 2, 3]
+
+
+def test_members_without_threads_use_one_core_each():
+    names = ['svm', 'gradient_boosting', 'logistic_regression']
+    assert _thread_budgets(names, 16) == {name: 1 for name in names}
@@ -0,0 +1,134 @@
+"""
+Scored transaction store - persistence, reopen and rollups
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from transaction_store import ScoredTransactionStore, ROLLUP_FIELDS
+
+# Start of yesterday (UTC), inside the hourly retention
+HOUR = int(time.time()) // 86400 * 86400 - 86400
+DAY = HOUR // 86400
+
+
+def _append(store, n, start=HOUR, risk=0.9):
+    for i in range(n):
+        store.append(
+            {'timestamp': datetime.fromtimestamp(start + i * 60, timezone.utc).isoformat(), 'amount': 10.0 + i, 'merchant_category': 'electronics'},
+            {'risk_score': risk, 'recommendation': 'BLOCK' if risk > 0.8 else 'APPROVE', 'is_fraud': risk > 0.8}
+        )
+
+
+def test_flush_and_reopen_round_trip(tmp_path):
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(store, 50)
+    store.flush()
+
+    reopened = ScoredTransactionStore(str(tmp_path))
+    assert len(reopened) == 50
+    assert reopened.hourly == store.hourly
+    assert reopened.daily == store.daily
+    assert os.path.getsize(tmp_path / 'amount.bin') == 50 * 4
+
+
+def test_rollups_count_every_append(tmp_path):
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=7)
+    _append(store, 30, risk=0.9)
+    _append(store, 20, start=HOUR + 3600, risk=0.1)
+    counters = np.sum([bucket['counters'] for bucket in store.hourly.values()], axis=0)
+    assert counters[ROLLUP_FIELDS.index('total')] == 50
+    assert counters[ROLLUP_FIELDS.index('fraud')] == 30
+    assert counters[ROLLUP_FIELDS.index('block')] == 30
+
+
+def test_stale_instance_flush_leaves_files_alone(tmp_path):
+    stale = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    server = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(server, 20)
+    server.flush()
+    _append(server, 30, start=HOUR + 1800)
+    server.flush()
+
+    # e.g. a spawned worker's copy running its exit hook
+    stale.flush()
+
+    reopened = ScoredTransactionStore(str(tmp_path))
+    assert len(reopened) == 50
+    assert reopened.hourly == server.hourly
+    assert os.path.getsize(tmp_path / 'risk_score.bin') == 50 * 4
+
+
+def test_torn_write_is_trimmed_on_next_flush(tmp_path):
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(store, 10)
+    store.flush()
+    with open(tmp_path / 'amount.bin', 'ab') as f:
+        f.write(b'\0' * 12)  # Column bytes past the rows in the metadata
+
+    reopened = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(reopened, 5)
+    reopened.flush()
+    assert os.path.getsize(tmp_path / 'amount.bin') == 15 * 4
+    assert len(ScoredTransactionStore(str(tmp_path))) == 15
+
+
+def test_flush_rewrites_only_the_days_it_touched(tmp_path):
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(store, 10, start=HOUR - 86400)
+    _append(store, 10)
+    store.flush()
+    assert sorted(os.listdir(tmp_path / 'rollups')) == [f'{DAY - 1}.json', f'{DAY}.json']
+    metadata = json.loads((tmp_path / 'metadata.json').read_text())
+    assert 'hourly' not in metadata and 'daily' not in metadata
+
+    earlier = (tmp_path / 'rollups' / f'{DAY - 1}.json').read_text()
+    _append(store, 5, start=HOUR + 3600)
+    store.flush()
+    assert json.loads((tmp_path / 'rollups' / f'{DAY - 1}.json').read_text()) == json.loads(earlier)
+    assert json.loads((tmp_path / 'rollups' / f'{DAY}.json').read_text())['rows'] == 25
+
+    reopened = ScoredTransactionStore(str(tmp_path))
+    assert reopened.hourly == store.hourly and reopened.daily == store.daily
+
+
+def test_old_hours_are_dropped_but_days_still_summarize(tmp_path):
+    old = HOUR - 30 * 86400
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=1000, hourly_retention_days=7)
+    _append(store, 20, start=old)
+    _append(store, 10)
+    store.flush()
+
+    assert min(store.hourly) == HOUR // 3600
+    assert store.daily[old // 86400]['counters'][0] == 20
+    day = time.strftime('%Y-%m-%d', time.gmtime(old))
+    # Whole old days still come from the rollups; an hour inside one needs a scan
+    summary = store.summarize({'start': f'{day}T00:00:00+00:00', 'end': f'{day}T23:00:00+00:00'})
+    assert summary['source'] == 'scan' and summary['summary']['total_transactions'] == 20
+    next_day = time.strftime('%Y-%m-%d', time.gmtime(old + 86400))
+    summary = store.summarize({'start': f'{day}T00:00:00+00:00', 'end': f'{next_day}T00:00:00+00:00'})
+    assert summary['source'] == 'rollup' and summary['summary']['total_transactions'] == 20
+    assert store.summarize()['summary']['total_transactions'] == 30
+
+
+def test_rollups_ahead_of_the_metadata_are_recounted(tmp_path):
+    store = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    _append(store, 10)
+    store.flush()
+    committed = (tmp_path / 'metadata.json').read_text()
+    _append(store, 5, start=HOUR + 1800)
+    _append(store, 5, start=HOUR + 86400 * 2)
+    store.flush()
+    # As if the flush stopped after the rollup files, before the metadata save
+    (tmp_path / 'metadata.json').write_text(committed)
+
+    reopened = ScoredTransactionStore(str(tmp_path), flush_rows=1000)
+    assert reopened.daily[DAY]['counters'][0] == 10 and DAY + 2 not in reopened.daily
+    assert sum(bucket['counters'][0] for bucket in reopened.hourly.values()) == 10
+    reopened.flush()
+    _append(reopened, 1)
+    reopened.flush()
+    assert sorted(os.listdir(tmp_path / 'rollups')) == [f'{DAY}.json']